@@ -0,0 +1,149 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Measures the attendance aggregates of AttendanceAnalytics on a large database:
+# the first full aggregation, the incremental refresh after a collection, and the HR
+# reports read from the aggregates against the same reports computed by scanning the
+# raw punches. Punches simulate employees who punch four times a day at the clock of
+# their point, with some missing punches and late arrivals. Run from the project root:
+#   python -m benchmarks.bench_analytics --punches 10000000
+#   python -m benchmarks.bench_analytics --database /tmp/analytics.db   # Reuses the database
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from scripts.business_logic.attendance_analytics import AttendanceAnalytics
+from scripts.business_logic.attendance_store import AttendanceStore
+
+PUNCHES = ((8 * 3600, 1200), (12 * 3600, 900), (13 * 3600, 900), (17 * 3600, 1800))  # (mean second of the day, spread)
+MISSING = 0.03  # Share of employee-days with a missing punch
+
+def clock(seconds: int) -> str:
+    return f'{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+def day_batches(punches: int, users: int, devices: int, first_day: date, rng: random.Random):
+    """
+    Yields the rows of each day, in the order of `COLUMNS`, until `punches` rows were produced.
+    """
+    produced = 0
+    day = first_day
+    while produced < punches:
+        text = day.isoformat()
+        collected_at = f'{(day + timedelta(days=1)).isoformat()}T06:00:00'
+        rows = []
+        for user in range(1, users + 1):
+            device = user % devices
+            ip = f'10.{device // 250}.{device % 250}.1'
+            point = f'Sucursal {device // 10}'
+            skipped = rng.randrange(len(PUNCHES)) if rng.random() < MISSING else None
+            for position, (mean, spread) in enumerate(PUNCHES):
+                if position != skipped:
+                    seconds = min(86399, max(0, int(rng.gauss(mean, spread / 2))))
+                    rows.append((ip, point, str(device), str(user), f'{text} {clock(seconds)}', 1, position % 2, collected_at))
+        rows = rows[:punches - produced]
+        produced += len(rows)
+        yield rows
+        day += timedelta(days=1)
+
+def timed(label: str, function, rows: int = None):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    rate = f' {rows / elapsed:12,.0f} filas/s' if rows else ''
+    print(f'{label:<56} {elapsed:9.3f} s{rate}')
+    return result
+
+# The same reports computed from the raw punches, as a spreadsheet export would need
+RAW_DAILY = """
+SELECT user_id, substr(timestamp, 1, 10) AS day, MIN(timestamp), MAX(timestamp), COUNT(*)
+FROM attendances WHERE timestamp BETWEEN ? AND ? GROUP BY user_id, day
+"""
+RAW_LATE = """
+SELECT point, COUNT(*) FROM (
+    SELECT point, user_id, substr(timestamp, 1, 10) AS day, MIN(timestamp) AS first_in
+    FROM attendances WHERE timestamp BETWEEN ? AND ? GROUP BY user_id, day
+) WHERE substr(first_in, 12, 8) > ? GROUP BY point
+"""
+RAW_MISSING = """
+SELECT user_id, substr(timestamp, 1, 10) AS day, COUNT(*) FROM attendances
+WHERE timestamp BETWEEN ? AND ? GROUP BY user_id, day HAVING COUNT(*) % 2 = 1
+"""
+RAW_HOURS = """
+SELECT substr(timestamp, 1, 13), COUNT(*) FROM attendances WHERE timestamp BETWEEN ? AND ? GROUP BY 1
+"""
+
+def main():
+    parser = argparse.ArgumentParser(description='Rendimiento de los resumenes de asistencia')
+    parser.add_argument('--punches', type=int, default=10000000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--database', help='Base a usar (se genera si no existe y se conserva)')
+    parser.add_argument('--batch-rows', type=int, default=500000, help='Marcaciones agregadas por transaccion')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as folder:
+        path = args.database or os.path.join(folder, 'attendances.db')
+        store = AttendanceStore(path)
+        first_day = date(2023, 1, 2)
+        if store.count() == 0:
+            def generate():
+                for rows in day_batches(args.punches, args.users, args.devices, first_day, rng):
+                    store.insert_rows(rows)
+            timed('Generacion e insercion de marcaciones', generate, args.punches)
+        total = store.count()
+        last_day = store.connect().execute('SELECT MAX(substr(timestamp, 1, 10)) FROM attendances').fetchone()[0]
+        print(f'Marcaciones: {total:,} - Hasta: {last_day} - Base: {os.path.getsize(path) / 1024 / 1024:,.0f} MiB')
+
+        analytics = AttendanceAnalytics(store, batch_rows=args.batch_rows, shift_start='08:00', grace_minutes=10)
+        timed('Agregacion completa (rebuild)', analytics.rebuild, total)
+
+        # A new collection: one more day of punches, then the incremental refresh
+        next_day = date.fromisoformat(last_day) + timedelta(days=1)
+        new_rows = next(day_batches(args.users * len(PUNCHES), args.users, args.devices, next_day, rng))
+        store.insert_rows(new_rows)
+        timed(f'Refresco incremental ({len(new_rows):,} nuevas)', analytics.refresh, len(new_rows))
+        last_day = next_day.isoformat()
+
+        month_start = (next_day - timedelta(days=30)).isoformat()
+        start, end = f'{month_start} 00:00:00', f'{last_day} 23:59:59'
+        connection = store.connect()
+        reports = (
+            ('Entrada/salida por empleado (30 dias)', lambda: analytics.daily_summary(month_start, last_day),
+             lambda: connection.execute(RAW_DAILY, (start, end)).fetchall()),
+            ('Llegadas tarde por punto (30 dias)', lambda: analytics.late_arrivals_by_point(month_start, last_day),
+             lambda: connection.execute(RAW_LATE, (start, end, '08:10:00')).fetchall()),
+            ('Marcaciones faltantes (30 dias)', lambda: analytics.missing_punches(month_start, last_day),
+             lambda: connection.execute(RAW_MISSING, (start, end)).fetchall()),
+            ('Marcaciones por hora (1 dia)', lambda: analytics.punches_per_hour(last_day, last_day),
+             lambda: connection.execute(RAW_HOURS, (f'{last_day} 00:00:00', end)).fetchall()),
+        )
+        for label, aggregated, raw in reports:
+            rows = timed(f'{label} - resumenes', aggregated)
+            raw_rows = timed(f'{label} - marcaciones', raw)
+            if len(rows) != len(raw_rows):
+                print(f'  Diferencia: {len(rows)} filas en los resumenes, {len(raw_rows)} en las marcaciones')
+        store.close()
+
+if __name__ == '__main__':
+    main()
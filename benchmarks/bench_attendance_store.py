@@ -0,0 +1,87 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Measures the throughput of AttendanceStore: bulk inserts per device batch,
+# re-inserting the same records (all ignored by the unique index) and reading
+# them back incrementally with fetch_since. Run from the project root:
+#   python -m benchmarks.bench_attendance_store --rows 1000000 --batch 5000
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from scripts.business_logic.attendance_store import AttendanceStore
+
+def build_batches(rows: int, batch: int, rng: random.Random) -> list[list[tuple]]:
+    """
+    Builds device batches of raw rows: each batch is the log of one device.
+    """
+    start = datetime(2024, 1, 1)
+    collected_at = datetime.now().isoformat(timespec='seconds')
+    batches = []
+    for number in range(0, rows, batch):
+        ip = f'10.0.{(number // batch) // 250}.{(number // batch) % 250}'
+        moment = start
+        current = []
+        for _ in range(min(batch, rows - number)):
+            moment += timedelta(seconds=rng.randint(1, 600))
+            current.append((ip, 'Centro', '1', str(rng.randint(1, 3000)), moment.strftime('%Y-%m-%d %H:%M:%S'), 1, 0, collected_at))
+        batches.append(current)
+    return batches
+
+def timed(label: str, rows: int, function):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<32} {elapsed:8.2f} s {rows / elapsed:12,.0f} filas/s')
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Rendimiento del almacenamiento SQLite de marcaciones')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=5000, help='Marcaciones por dispositivo (una transaccion)')
+    parser.add_argument('--page', type=int, default=10000, help='Filas por lectura incremental')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    batches = build_batches(args.rows, args.batch, random.Random(args.seed))
+    with tempfile.TemporaryDirectory() as folder:
+        store = AttendanceStore(os.path.join(folder, 'attendances.db'))
+        inserted = timed('Insercion inicial', args.rows, lambda: sum(store.insert_rows(rows) for rows in batches))
+        duplicated = timed('Reinsercion (duplicadas)', args.rows, lambda: sum(store.insert_rows(rows) for rows in batches))
+
+        def read_all():
+            last_id, total = 0, 0
+            while True:
+                page = store.fetch_since(last_id, args.page)
+                if not page:
+                    return total
+                total += len(page)
+                last_id = page[-1]['id']
+        read = timed('Lectura incremental', args.rows, read_all)
+        store.close()
+        size = os.path.getsize(os.path.join(folder, 'attendances.db'))
+
+    print(f'Filas nuevas: {inserted} - Duplicadas insertadas: {duplicated} - Leidas: {read}')
+    print(f'Tamaño de la base: {size / 1024 / 1024:.1f} MiB')
+
+if __name__ == '__main__':
+    main()
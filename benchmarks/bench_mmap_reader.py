@@ -0,0 +1,89 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Compares extracting a two-week period from a large, time-sorted attendance
+# file by plain line iteration (parsing every line) and with MappedRecordFile
+# (binary search of the period, then reading only its lines). Run from the
+# project root:
+#   python -m benchmarks.bench_mmap_reader --lines 10000000 --days 15
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from scripts.business_logic.mmap_reader import MappedRecordFile, attendance_timestamp, timestamp_key
+
+def write_file(path: str, lines: int, rng: random.Random) -> datetime:
+    """
+    Writes `lines` attendance lines, sorted by time, and returns the time of the last one.
+    """
+    moment = datetime(2024, 1, 1)
+    with open(path, 'w', encoding='utf-8') as file:
+        chunk = []
+        for _ in range(lines):
+            moment += timedelta(seconds=rng.randint(0, 20))
+            chunk.append(f'{rng.randint(1, 3000)} {moment:%Y-%m-%d %H:%M:%S} 10.0.0.{rng.randint(1, 200)} 1 0\n')
+            if len(chunk) == 100000:
+                file.write(''.join(chunk))
+                chunk = []
+        file.write(''.join(chunk))
+    return moment
+
+def timed(label: str, function):
+    start = time.perf_counter()
+    result = function()
+    print(f'{label:<36} {time.perf_counter() - start:8.3f} s')
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Rendimiento de la lectura por periodos con mmap')
+    parser.add_argument('--lines', type=int, default=5000000)
+    parser.add_argument('--days', type=int, default=15, help='Dias del periodo extraido')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'marcaciones.txt')
+        last = write_file(path, args.lines, random.Random(args.seed))
+        start = datetime(2024, 1, 1) + (last - datetime(2024, 1, 1)) / 2
+        end = start + timedelta(days=args.days)
+        print(f'Archivo: {os.path.getsize(path) / 1024 / 1024:.0f} MiB, {args.lines:,} lineas - Periodo: {start:%Y-%m-%d} a {end:%Y-%m-%d}')
+
+        def iterate():
+            low, high = timestamp_key(start), timestamp_key(end)
+            with open(path, 'rb') as file:
+                return sum(1 for line in file if low <= (attendance_timestamp(line) or ()) < high)
+
+        def mapped():
+            with MappedRecordFile(path) as records:
+                return sum(1 for _ in records.range(start, end))
+
+        def bisect_only():
+            with MappedRecordFile(path) as records:
+                return records.range_offsets(start, end)
+
+        expected = timed('Iteracion de lineas', iterate)
+        found = timed('mmap + busqueda binaria', mapped)
+        first, last_offset = timed('Solo busqueda binaria', bisect_only)
+    print(f'Lineas del periodo: {found} (iteracion: {expected}) - {(last_offset - first) / 1024 / 1024:.1f} MiB leidos')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Fairness of the shared session budget of the multi-site mode: a large site and a
+# small one start a run at the same time, each with its own worker pool, and their
+# device sessions (simulated with a sleep) compete for the shared budget. Compares a
+# single first-come first-served budget with the weighted fair share of `FairShare`.
+# Run from the project root:
+#   python -m benchmarks.bench_multi_site --large 2000 --small 20 --max-sessions 16
+
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from scripts.business_logic.multi_site import FairShare, Site
+
+def run(fair_share: FairShare, site_of: dict, sites: dict, session_seconds: float, rng: random.Random) -> dict:
+    """
+    Runs every site with its own pool and returns the seconds each site needed.
+    """
+    durations = {name: [rng.uniform(0.5, 1.5) * session_seconds for _ in range(count)] for name, (count, _) in sites.items()}
+    finished = {}
+    start = time.perf_counter()
+
+    def session(name: str, seconds: float):
+        with fair_share.session(site_of[name]):
+            time.sleep(seconds)
+
+    def run_site(name: str):
+        _, workers = sites[name]
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name) as pool:
+            list(pool.map(lambda seconds: session(name, seconds), durations[name]))
+        finished[name] = time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=len(sites)) as hosts:
+        list(hosts.map(run_site, sites))
+    return finished
+
+def main():
+    parser = argparse.ArgumentParser(description='Reparto de las sesiones compartidas entre sitios')
+    parser.add_argument('--large', type=int, default=2000, help='Dispositivos del sitio grande')
+    parser.add_argument('--small', type=int, default=20, help='Dispositivos del sitio chico')
+    parser.add_argument('--large-workers', type=int, default=128)
+    parser.add_argument('--small-workers', type=int, default=8)
+    parser.add_argument('--max-sessions', type=int, default=16, help='Sesiones compartidas')
+    parser.add_argument('--session-ms', type=float, default=5.0, help='Duracion media de una sesion')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    sites = {'grande': (args.large, args.large_workers), 'chico': (args.small, args.small_workers)}
+    alone = FairShare(args.max_sessions)
+    alone.add_site(Site('chico', '.'))
+    baseline = run(alone, {'chico': 'chico'}, {'chico': sites['chico']}, args.session_ms / 1000, random.Random(args.seed))
+    print(f'{"sitio chico solo":<28} chico {baseline["chico"]:7.2f} s')
+
+    # First come, first served: both sites queue in the same budget
+    shared = FairShare(args.max_sessions)
+    shared.add_site(Site('todos', '.'))
+    fifo = run(shared, {name: 'todos' for name in sites}, sites, args.session_ms / 1000, random.Random(args.seed))
+    fair_share = FairShare(args.max_sessions)
+    for name in sites:
+        fair_share.add_site(Site(name, '.'))
+    fair = run(fair_share, {name: name for name in sites}, sites, args.session_ms / 1000, random.Random(args.seed))
+    for label, finished in (('orden de llegada', fifo), ('reparto equitativo', fair)):
+        print(f'{label:<28} chico {finished["chico"]:7.2f} s ({finished["chico"] / baseline["chico"]:5.1f}x solo)'
+              f' - grande {finished["grande"]:7.2f} s')
+    for share in fair_share.snapshot():
+        print(f'  {share["site"]:<8} sesiones {share["served"]:6} espera media {share["mean_wait_seconds"] * 1000:8.1f} ms')
+
+if __name__ == '__main__':
+    main()
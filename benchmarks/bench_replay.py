@@ -0,0 +1,129 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Regression benchmark of the collection path on recorded sessions: replays each
+# recording at full speed (pyzk parses the recorded buffers), formats the records
+# with AttendancesManager.format_attendances and writes them to a SQLite store.
+# The corpus is a folder of recordings captured with [Replay_config] capture = True;
+# without one, a synthetic session is generated. Run from the project root:
+#   python -m benchmarks.bench_replay --corpus captures --repeat 3
+#   python -m benchmarks.bench_replay --synthetic 200000
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from struct import pack
+from types import SimpleNamespace
+from scripts.business_logic.attendance_store import AttendanceStore
+from scripts.business_logic.chunked_download import CMD_ATTLOG_RRQ
+from scripts.business_logic.session_replay import (
+    CMD_USERTEMP_RRQ, SIZE_ATTRIBUTES, ReplayConnectionManager, SessionRecording, encode_value, find_captures
+)
+
+FCT_USER = 5  # Same value as zk.const
+
+def encode_time(moment: datetime) -> bytes:
+    """
+    Encodes a timestamp like the devices do (pyzk's `__encode_time`).
+    """
+    value = (((moment.year % 100) * 12 * 31 + (moment.month - 1) * 31 + moment.day - 1) * 86400
+             + (moment.hour * 60 + moment.minute) * 60 + moment.second)
+    return pack('<I', value)
+
+def synthetic_recording(records: int, users: int, rng: random.Random) -> SessionRecording:
+    """
+    Builds the recording of a `get_attendance` call on a device with 40-byte records.
+    """
+    user_table = b''.join(pack('<HB8s24sIx7sx24s', uid, 0, b'', b'', 0, b'1', str(uid).encode())
+                          for uid in range(1, users + 1))
+    moment = datetime(2024, 1, 1, 7)
+    log = []
+    for _ in range(records):
+        moment += timedelta(seconds=rng.randint(1, 120))
+        uid = rng.randint(1, users)
+        log.append(pack('<H24sB4sB8s', uid, str(uid).encode(), 1, encode_time(moment), rng.randint(0, 1), b''))
+    sizes = {name: 0 for name in SIZE_ATTRIBUTES}
+    sizes.update(users=users, records=records, users_cap=10000, rec_cap=max(records, 100000))
+    read_sizes = ({'m': 'read_sizes', 'a': [], 't': 0.0, 'd': 0.01, 'r': {'result': True, 'sizes': sizes}}, None)
+    events = [
+        read_sizes,
+        read_sizes,
+        ({'m': 'read_with_buffer', 'a': encode_value((CMD_USERTEMP_RRQ, FCT_USER)), 't': 0.02, 'd': 0.1, 'r': 4 + len(user_table)},
+         pack('I', len(user_table)) + user_table),
+        ({'m': 'read_with_buffer', 'a': encode_value((CMD_ATTLOG_RRQ,)), 't': 0.2, 'd': records / 20000, 'r': 4 + records * 40},
+         pack('I', records * 40) + b''.join(log)),
+    ]
+    header = {'ip': '10.0.0.1', 'communication': 'TCP', 'tcp': True, 'encoding': 'UTF-8',
+              'captured': datetime.now().isoformat(timespec='seconds'), 'anonymized': True, 'sizes': sizes}
+    return SessionRecording(header, events)
+
+def format_function():
+    """
+    Returns `format_attendances` of the attendance manager, or None if the common
+    package is not available.
+    """
+    try:
+        from scripts.business_logic.service_manager import AttendancesManager
+    except ImportError as e:
+        print(f'Sin formateo ({e})')
+        return None
+    return AttendancesManager().format_attendances
+
+def timed(label: str, records: int, function):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<40} {elapsed:8.3f} s {records / elapsed if elapsed else 0:12,.0f} marcaciones/s')
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Rendimiento de la obtencion sobre sesiones grabadas')
+    parser.add_argument('--corpus', nargs='*', default=[], help='Grabaciones o carpetas de grabaciones')
+    parser.add_argument('--synthetic', type=int, default=100000, help='Marcaciones de la sesion sintetica (sin corpus)')
+    parser.add_argument('--users', type=int, default=3000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    recordings = [SessionRecording.load(path) for path in find_captures(args.corpus)]
+    if not recordings:
+        recordings = [synthetic_recording(args.synthetic, args.users, random.Random(args.seed))]
+    format_attendances = format_function()
+    print(f'Sesiones: {len(recordings)} - Bytes grabados: {sum(recording.summary()["bytes"] for recording in recordings):,}')
+
+    with tempfile.TemporaryDirectory() as folder:
+        for attempt in range(1, args.repeat + 1):
+            print(f'-- Repeticion {attempt}')
+            for recording in recordings:
+                device = SimpleNamespace(ip=recording.header['ip'], point='Replay', id=1)
+                conn_manager = ReplayConnectionManager(recording)
+                conn_manager.connect_with_retry()
+                expected = recording.header['sizes'].get('records') or 1
+                attendances = timed(f'{device.ip} descarga y parseo', expected, conn_manager.get_attendances)
+                if format_attendances is not None:
+                    attendances, _ = timed(f'{device.ip} formateo', len(attendances), lambda: format_attendances(attendances, device.id))
+                store = AttendanceStore(os.path.join(folder, f'attendances_{attempt}.db'))
+                timed(f'{device.ip} escritura SQLite', len(attendances), lambda: store.insert_many(device, attendances))
+                store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Runs the transport auto-tuning against simulated links (a LAN clock and a
+# clock behind a lossy, high-latency VPN), then compares the download time of a
+# whole log with the default profile (inventory transport, protocol maximum
+# chunk, pyzk's timeout) and with the tuned one. Timeouts are scaled down by
+# TIMEOUT_SCALE so the run stays short. Run from the project root:
+#   python -m benchmarks.bench_transport_tuning --log-kb 2048
+
+import argparse
+import random
+import tempfile
+import time
+from struct import pack
+from types import SimpleNamespace
+from scripts.business_logic.chunked_download import MAX_CHUNK_TCP, MAX_CHUNK_UDP
+from scripts.business_logic.transport_profiles import TransportProfile, TransportProfiles, tune_device
+
+TIMEOUT_SCALE = 0.01
+PYZK_TIMEOUT = 60
+SEGMENT = 1024  # Bytes per datagram (UDP) or per segment (TCP) of the model
+
+LINKS = {
+    'lan': SimpleNamespace(rtt=0.001, bandwidth=10_000_000, loss=0.0, communication='TCP'),
+    'vpn': SimpleNamespace(rtt=0.06, bandwidth=500_000, loss=0.01, communication='UDP'),
+}
+
+class SimulatedLinkZK:
+    """
+    Chunk reads over a link model. TCP retransmits a lost segment at the cost of one
+    round trip; over UDP a lost datagram fails the whole chunk after the timeout.
+    """
+
+    def __init__(self, link, communication: str, timeout: float, log_size: int, rng: random.Random):
+        self.link = link
+        self.tcp = communication == 'TCP'
+        self.timeout = timeout
+        self.log_size = log_size
+        self.rng = rng
+        self._ZK__data = None
+
+    def _ZK__send_command(self, command, command_string=b'', response_size=8):
+        time.sleep(self.link.rtt)
+        self._ZK__data = b'\x00' + pack('I', self.log_size)
+        return {'status': True, 'code': 2000}
+
+    def _ZK__read_chunk(self, start, size):
+        segments = -(-size // SEGMENT)
+        lost = sum(1 for _ in range(segments) if self.rng.random() < self.link.loss)
+        if lost and not self.tcp:
+            time.sleep(self.timeout * TIMEOUT_SCALE)
+            raise TimeoutError('datagrama perdido')
+        time.sleep(self.link.rtt * (1 + lost) + size / self.link.bandwidth)
+        return bytes(min(size, self.log_size - start))
+
+    def free_data(self):
+        time.sleep(self.link.rtt)
+
+class SimulatedConnectionManager:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def is_connected(self):
+        return True
+
+    def disconnect(self):
+        pass
+
+def simulated_connect(link, log_size: int, rng: random.Random):
+    def connect(device, profile: TransportProfile):
+        time.sleep(link.rtt * (2 if profile.communication == 'TCP' else 1))
+        return SimulatedConnectionManager(SimulatedLinkZK(link, profile.communication, profile.timeout or PYZK_TIMEOUT, log_size, rng))
+    return connect
+
+def download(connect, device, profile: TransportProfile, log_size: int) -> tuple:
+    """
+    Reads a whole log with a profile, reconnecting after a failed chunk.
+
+    Returns:
+        tuple: (seconds, failed chunks).
+    """
+    max_chunk = MAX_CHUNK_TCP if profile.communication == 'TCP' else MAX_CHUNK_UDP
+    chunk_size = min(profile.chunk_size or max_chunk, max_chunk)
+    start = time.perf_counter()
+    conn_manager = connect(device, profile)
+    conn_manager.conn._ZK__send_command(0)
+    done = failures = 0
+    while done < log_size:
+        try:
+            done += len(conn_manager.conn._ZK__read_chunk(done, min(chunk_size, log_size - done)))
+        except TimeoutError:
+            failures += 1
+            conn_manager = connect(device, profile)
+            conn_manager.conn._ZK__send_command(0)
+    conn_manager.conn.free_data()
+    return time.perf_counter() - start, failures
+
+def main():
+    parser = argparse.ArgumentParser(description='Ajuste automatico de la comunicacion sobre enlaces simulados')
+    parser.add_argument('--log-kb', type=int, default=2048, help='Tamaño del registro descargado')
+    parser.add_argument('--sample-kb', type=int, default=128)
+    parser.add_argument('--rounds', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    log_size = args.log_kb * 1024
+    with tempfile.TemporaryDirectory() as folder:
+        profiles = TransportProfiles(folder)
+        for name, link in LINKS.items():
+            rng = random.Random(args.seed)
+            device = SimpleNamespace(ip=f'10.0.0.{len(profiles.entries) + 1}', point=name, communication=link.communication)
+            connect = simulated_connect(link, log_size, rng)
+            start = time.perf_counter()
+            tuned = tune_device(device, profiles, args.rounds, args.sample_kb * 1024, connect)
+            print(f'[{name}] ajuste en {time.perf_counter() - start:.1f} s: {tuned}')
+            profiles.set(device.ip, tuned)
+            default = TransportProfile(communication=link.communication)
+            for label, profile in (('predeterminado', default), ('ajustado', profiles.resolve(device))):
+                seconds, failures = download(connect, device, profile, log_size)
+                print(f'[{name}] {label:<15} {profile.communication} bloques de {profile.chunk_size or "max"}: '
+                      f'{seconds:7.2f} s, {log_size / seconds / 1024:8.0f} KiB/s, {failures} bloques fallidos')
+
+if __name__ == '__main__':
+    main()
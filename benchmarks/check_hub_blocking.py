@@ -0,0 +1,289 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Runs the real AttendancesManager and HourManager of the service under eventlet,
+# with HubBlockingDetector watching the hub, against simulated devices. Only the
+# network is simulated: pyzk's sockets are replaced by in-memory devices that speak
+# the ZK protocol over TCP, so ConnectionManager, pyzk (handshake, buffered reads
+# and its parse loops), the probe, the chunked download, format_attendances, the
+# attendance files and the SQLite sink, the metadata cache, the cursors, the
+# journal and the clear phase all run unchanged. Nothing in the check yields on
+# its own: the simulated sockets only wait for the modelled latency and bandwidth,
+# like a real socket. Exits with code 1 if any path blocked every green thread for
+# longer than the threshold, or if a device failed. The stores, the attendance
+# files and config.ini (a copy of the one of the project, if any) live in a
+# temporary root. Run from the project root:
+#   python -m benchmarks.check_hub_blocking --devices 50 --records 20000
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import configparser
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from socket import SOCK_STREAM, timeout
+from struct import pack, unpack
+from types import SimpleNamespace
+from zk import base as zk_base
+from zk import const
+from benchmarks.bench_replay import FCT_USER, encode_time
+from scripts.business_logic.chunked_download import CMD_PREPARE_BUFFER
+from scripts.business_logic.hub_monitor import HubBlockingDetector
+from scripts.business_logic.run_journal import OUTCOME_OK
+from scripts.business_logic.service_manager import AttendancesManager, HourManager
+from scripts.common.business_logic.device_manager import get_devices_info
+from scripts.common.utils.file_manager import find_root_directory
+
+CMD_READ_BUFFER = 1504  # Not in zk.const: pyzk's __read_chunk sends it as a literal
+
+def build_log(records: int, users: int) -> bytes:
+    """
+    Builds a log of 40-byte records, one punch per minute spread over `users` users.
+    """
+    start = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0) - timedelta(minutes=records)
+    return b''.join(
+        pack('<H24sB4sB8s', number % users + 1, str(number % users + 1).encode(), 1,
+             encode_time(start + timedelta(minutes=number)), 0, b'')
+        for number in range(records)
+    )
+
+def build_users(users: int) -> bytes:
+    """
+    Builds a user table of 72-byte records.
+    """
+    return b''.join(pack('<HB8s24sIx7sx24s', uid, 0, b'', b'', 0, b'1', str(uid).encode())
+                    for uid in range(1, users + 1))
+
+class SimulatedDevice:
+    """
+    The state of a simulated device: attendance log, user table, counters and clock.
+    """
+
+    def __init__(self, ip: str, log: bytes, users: int, latency: float, bandwidth: float):
+        self.ip = ip
+        self.log = log
+        self.users = users
+        self.user_table = build_users(users)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.rec_cap = max(100000, len(log) // 40)
+        self.options = {
+            b'~DeviceName': b'MB160', b'~SerialNumber': f'SIM{ip.replace(".", "")}'.encode(),
+            b'~Platform': b'ZMM220_TFT', b'MAC': b'00:17:61:00:00:01', b'~ZKFPVersion': b'10',
+            b'IPAddress': ip.encode(), b'NetMask': b'255.255.255.0', b'GATEIPAddress': b'10.0.0.254',
+        }
+
+    def sizes(self) -> bytes:
+        fields = [0] * 20
+        fields[4] = self.users
+        fields[8] = len(self.log) // 40
+        fields[15] = 10000
+        fields[16] = self.rec_cap
+        fields[18] = 10000 - self.users
+        fields[19] = self.rec_cap - fields[8]
+        return pack('20i', *fields) + pack('3i', 0, 0, 0)
+
+    def buffer(self, command: int, fct: int) -> bytes:
+        if command == const.CMD_ATTLOG_RRQ:
+            data = self.log
+        elif command == const.CMD_USERTEMP_RRQ and fct == FCT_USER:
+            data = self.user_table
+        else:
+            data = b''
+        return pack('I', len(data)) + data
+
+class SimulatedSocket:
+    """
+    Stands in for the TCP socket of a pyzk connection: every packet sent is answered
+    by the simulated device at the connected address, after the modelled round trip,
+    and the answer is read back at the modelled bandwidth.
+    """
+
+    def __init__(self, devices: dict, kind: int):
+        self.devices = devices
+        self.kind = kind
+        self.device: SimulatedDevice = None
+        self.pending = bytearray()
+        self.prepared = b''
+        self.session_id = 0
+
+    def settimeout(self, value):
+        pass
+
+    def connect_ex(self, address) -> int:
+        self.device = self.devices.get(address[0]) if self.kind == SOCK_STREAM else None
+        return 0 if self.device is not None else 111  # ECONNREFUSED
+
+    def close(self):
+        self.device = None
+
+    def sendto(self, data, address):
+        raise OSError('Los dispositivos simulados solo usan TCP')
+
+    def send(self, data: bytes) -> int:
+        if self.device is None:
+            raise OSError('Socket no conectado')
+        time.sleep(self.device.latency)
+        _, _, length = unpack('<HHI', data[:8])
+        command, _, _, reply_id = unpack('<4H', data[8:16])
+        self.__answer(command, bytes(data[16:8 + length]), reply_id)
+        return len(data)
+
+    def recv(self, size: int) -> bytes:
+        if not self.pending:
+            raise timeout('timed out')
+        data = bytes(self.pending[:size])
+        del self.pending[:size]
+        time.sleep(len(data) / self.device.bandwidth)
+        return data
+
+    def __packet(self, code: int, reply_id: int, data: bytes = b''):
+        packet = pack('<4H', code, 0, self.session_id, reply_id) + data
+        self.pending += pack('<HHI', const.MACHINE_PREPARE_DATA_1, const.MACHINE_PREPARE_DATA_2, len(packet)) + packet
+
+    def __answer(self, command: int, data: bytes, reply_id: int):
+        device = self.device
+        if command == const.CMD_CONNECT:
+            self.session_id = 1
+        elif command == const.CMD_GET_FREE_SIZES:
+            return self.__packet(const.CMD_ACK_OK, reply_id, device.sizes())
+        elif command == const.CMD_OPTIONS_RRQ:
+            key = data.split(b'\x00')[0]
+            return self.__packet(const.CMD_ACK_OK, reply_id, key + b'=' + device.options.get(key, b'0') + b'\x00')
+        elif command == const.CMD_GET_VERSION:
+            return self.__packet(const.CMD_ACK_OK, reply_id, b'Ver 6.60 Apr 28 2017\x00')
+        elif command == const.CMD_GET_PINWIDTH:
+            return self.__packet(const.CMD_ACK_OK, reply_id, b'\x09\x00')
+        elif command == const.CMD_GET_TIME:
+            return self.__packet(const.CMD_ACK_OK, reply_id, encode_time(datetime.now()))
+        elif command == const.CMD_CLEAR_ATTLOG:
+            device.log = b''
+        elif command == CMD_PREPARE_BUFFER:
+            _, buffer_command, fct, _ = unpack('<bhii', data[:11])
+            self.prepared = device.buffer(buffer_command, fct)
+            return self.__packet(const.CMD_ACK_OK, reply_id, b'\x00' + pack('I', len(self.prepared)))
+        elif command == CMD_READ_BUFFER:
+            start, size = unpack('<ii', data[:8])
+            self.__packet(const.CMD_PREPARE_DATA, reply_id, pack('<II', size, 0))
+            self.__packet(const.CMD_DATA, reply_id, self.prepared[start:start + size])
+        elif command == const.CMD_FREE_DATA:
+            self.prepared = b''
+        self.__packet(const.CMD_ACK_OK, reply_id)
+
+def simulate_network(devices: dict):
+    """
+    Replaces pyzk's sockets with the simulated devices and skips its ICMP ping.
+    """
+    zk_base.socket = lambda family=None, kind=SOCK_STREAM, *args: SimulatedSocket(devices, kind)
+    zk_base.ZK_helper.test_ping = lambda helper: helper.ip in devices
+
+def simulate_installation(inventory: list, root: str):
+    """
+    Points every loaded module of the application to the simulated device inventory
+    and to the temporary root, so the attendance files are not written to the project.
+    """
+    for name, module in list(sys.modules.items()):
+        if not name.startswith('scripts.') or module is None:
+            continue
+        if getattr(module, 'get_devices_info', None) is get_devices_info:
+            module.get_devices_info = lambda: list(inventory)
+        if getattr(module, 'find_root_directory', None) is find_root_directory:
+            module.find_root_directory = lambda: root
+
+def write_config(root: str, clear: bool):
+    """
+    Writes the config.ini of the temporary root: the one of the project, if any, with
+    the SQLite sink and the attendance aggregates enabled and session capture disabled.
+    """
+    source = os.path.join(find_root_directory(), 'config.ini')
+    if os.path.exists(source):
+        shutil.copyfile(source, os.path.join(root, 'config.ini'))
+    config = configparser.ConfigParser()
+    config.read(os.path.join(root, 'config.ini'))
+    overrides = {
+        'Device_config': {'clear_attendance_service': str(clear), 'probe_before_download': 'True'},
+        'Storage_config': {'sqlite_enabled': 'True'},
+        'Analytics_config': {'enabled': 'True'},
+        'Replay_config': {'capture': 'False'},
+    }
+    for section, values in overrides.items():
+        if not config.has_section(section):
+            config.add_section(section)
+        for key, value in values.items():
+            config.set(section, key, value)
+    with open(os.path.join(root, 'config.ini'), 'w', encoding='utf-8') as config_file:
+        config.write(config_file)
+
+def main():
+    parser = argparse.ArgumentParser(description='Detecta bloqueos del hub de eventlet en las rutas de cada dispositivo')
+    parser.add_argument('--devices', type=int, default=50)
+    parser.add_argument('--records', type=int, default=20000, help='Marcaciones por dispositivo')
+    parser.add_argument('--users', type=int, default=500, help='Usuarios por dispositivo')
+    parser.add_argument('--latency', type=float, default=0.01, help='Latencia simulada por intercambio (s)')
+    parser.add_argument('--bandwidth', type=float, default=10_000_000, help='Ancho de banda simulado (bytes/s)')
+    parser.add_argument('--threshold-ms', type=int, default=100)
+    parser.add_argument('--clear', action='store_true', help='Incluye la eliminacion de marcaciones en dos fases')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(message)s')
+    log = build_log(args.records, args.users)
+    inventory = [SimpleNamespace(ip=f'10.0.{number // 250}.{number % 250 + 1}', point=f'Sucursal {number % 5}', id=number + 1,
+                                 district_name='Simulado', model_name='', communication='TCP', battery_failing=False, active=True)
+                 for number in range(args.devices)]
+    simulate_network({device.ip: SimulatedDevice(device.ip, log, args.users, args.latency, args.bandwidth) for device in inventory})
+
+    with tempfile.TemporaryDirectory() as root:
+        write_config(root, args.clear)
+        simulate_installation(inventory, root)
+        config_parser = configparser.ConfigParser()
+        attendances_manager = AttendancesManager(root, config_parser)
+        hour_manager = HourManager(root, config_parser)
+        detector = HubBlockingDetector(args.threshold_ms / 1000)
+        detector.start()
+        start = time.perf_counter()
+        attendances_manager.manage_devices_attendances()
+        collection_time = time.perf_counter() - start
+        start = time.perf_counter()
+        hour_manager.manage_hour_devices()
+        sync_time = time.perf_counter() - start
+        eventlet.sleep(detector.interval * 4)  # Let the watchdog report a stall that just ended
+        detector.stop()
+        if attendances_manager.store is not None:
+            attendances_manager.store.close()
+
+    records = attendances_manager.journal_records + hour_manager.journal_records
+    failed = [record for record in records if record.get('outcome') != OUTCOME_OK]
+    print(f'Dispositivos: {args.devices} - Marcaciones: {sum(record.get("attendances", 0) for record in attendances_manager.journal_records)} '
+          f'- Obtencion: {collection_time:.1f} s - Hora: {sync_time:.1f} s')
+    print(f'Ejecuciones con error: {len(failed)}')
+    for record in failed:
+        print(f'  {record["task"]} {record["ip"]}: {record.get("outcome")} ({record.get("error")})')
+    print(f'Bloqueos del hub mayores a {args.threshold_ms} ms: {len(detector.stalls)}')
+    for duration, stack in detector.stalls:
+        print(f'\n--- {duration * 1000:.0f} ms ---\n{stack}')
+    return 1 if detector.stalls or failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -17,12 +17,11 @@
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-import eventlet
-eventlet.monkey_patch()
+# The profiler is imported first so its clock starts before any heavy import.
+# The tray does not run device I/O, so eventlet is neither imported nor
+# monkey-patched here; that is only needed by the service (schedulerService.py).
+from scripts.ui.startup_profiler import profiler
 from scripts.common.utils.errors import BaseError
-from scripts.common.utils.system_utils import is_user_admin
-from PyQt5.QtWidgets import QApplication
-from scripts.ui.icon_manager import MainWindow
 from scripts.common.utils.logging import config_log, logging
 from scripts.common.utils.file_manager import find_root_directory
 import sys
@@ -45,12 +44,14 @@ def main():
     3. Determines the application mode based on whether the script is frozen or not.
     4. Logs and prints the service version and mode information.
     5. Displays copyright information.
-    6. Initializes the PyQt application and launches the main window.
+    6. Imports PyQt5 and the main window, initializes the PyQt application and launches the main window.
     7. Handles any exceptions by logging a critical error.
+    Each step is recorded by the startup profiler (see `scripts.ui.startup_profiler`).
     Raises:
         Exception: If an error occurs during the application's execution, it is caught
                    and logged as a critical error with a specific error code.
     """
+    profiler.mark('imports base')
     config_log("icono_reloj_de_asistencias_" + SERVICE_VERSION)
 
     logging.debug('Script ejecutandose...')
@@ -65,12 +66,18 @@ def main():
     logging.info(msg_init)
     print(msg_init)
     print_copyright()
+    profiler.mark('logs configurados')
 
     #config_content()
     #logging.debug(sys.argv)
     
     try:
+        # Imported here so the heavy GUI modules are loaded (and profiled) only when needed
+        QApplication = profiler.timed_import('PyQt5.QtWidgets').QApplication
         app = QApplication(sys.argv)
+        profiler.mark('QApplication')
+        MainWindow = profiler.timed_import('scripts.ui.icon_manager').MainWindow
+        profiler.mark('import ventana principal')
         MainWindow()
         sys.exit(app.exec_())
     except Exception as e:
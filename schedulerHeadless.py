@@ -0,0 +1,71 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock 
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Runs the scheduling core of the service in the foreground, without the Windows
+# service (Linux, macOS, containers, or Windows for debugging). Stops with Ctrl+C
+# or SIGTERM. Usage, from the project root:
+#   python schedulerHeadless.py [--root DIR] [--console]
+#   python schedulerHeadless.py --once [--ip 10.0.0.5] [--point "Sucursal Centro"]
+#   python schedulerHeadless.py --sites sites.ini [--once]
+
+import eventlet
+eventlet.monkey_patch()
+import argparse
+import logging
+import signal
+import sys
+
+from scripts.business_logic.command_channel import RunRequest
+from scripts.business_logic.multi_site import MultiSiteHost
+from scripts.business_logic.scheduler_core import SchedulerCore
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Ejecuta el planificador del servicio en primer plano')
+    parser.add_argument('--root', help='Directorio raiz con config.ini y schedule.txt (por defecto, el de la aplicacion)')
+    parser.add_argument('--console', action='store_true', help='Ademas de los archivos de log, muestra los logs en la consola')
+    parser.add_argument('--once', action='store_true', help='Obtiene las marcaciones una sola vez y termina')
+    parser.add_argument('--ip', action='append', help='Con --once, limita la obtencion a esta IP (repetible)')
+    parser.add_argument('--point', action='append', help='Con --once, limita la obtencion a este punto (repetible)')
+    parser.add_argument('--sites', help='Archivo de sitios: ejecuta varios sitios en el mismo proceso (ver multi_site)')
+    args = parser.parse_args(argv)
+
+    core = MultiSiteHost(args.sites) if args.sites else SchedulerCore(args.root)
+    core.setup_logging()
+    if args.console:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        logging.getLogger().addHandler(handler)
+
+    if args.once and args.sites:
+        return 0 if core.run_once(args.ip, args.point) else 1
+    if args.once:
+        core.run_requests.put(RunRequest(args.ip, args.point, 'headless'))
+        return 0 if core.run_requested_collection(timeout=0) else 1
+
+    def stop(signum, frame):
+        logging.info(f'Senal {signum} recibida')
+        core.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    core.main()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,462 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from scripts.business_logic.hub_monitor import offload
+from scripts.common.utils.file_manager import find_root_directory
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_FOLDER = 'archive'
+ARCHIVE_SECTION = 'Archive_config'
+CODEC_GZIP = 'gzip'
+CODEC_ZSTD = 'zstd'
+EXTENSIONS = {CODEC_GZIP: '.gz', CODEC_ZSTD: '.zst'}
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+MONTH_PATTERN = re.compile(r'(\d{4})-(\d{2})(?!\d)')
+
+def month_of(relative_path: str, mtime: float) -> str:
+    """
+    Returns the month (YYYY-MM) a file belongs to.
+
+    The first YYYY-MM found in its path (e.g. a dated file name) wins. Otherwise the
+    modification time is used, which also covers the log folders (named with the
+    locale dependent `%Y-%b` format).
+    """
+    match = MONTH_PATTERN.search(relative_path.replace(os.sep, '/'))
+    if match and 1 <= int(match.group(2)) <= 12:
+        return f'{match.group(1)}-{match.group(2)}'
+    return datetime.fromtimestamp(mtime).strftime('%Y-%m')
+
+class BlockCodec:
+    """
+    Compresses independent blocks that can be concatenated in one file.
+
+    gzip members and zstd frames can both be concatenated and still be valid
+    files for the standard tools (`zcat`, `zstdcat`), while every block can also
+    be decompressed on its own from its offset.
+    """
+
+    def __init__(self, name: str = CODEC_GZIP, level: int = None):
+        if name == CODEC_ZSTD and zstandard is None:
+            logging.warning('zstandard no esta instalado, se usa gzip para el archivo')
+            name = CODEC_GZIP
+        if name not in EXTENSIONS:
+            raise ValueError(f'Compresion desconocida: {name}')
+        self.name = name
+        self.extension = EXTENSIONS[name]
+        if name == CODEC_ZSTD:
+            self.level = 10 if level is None else level
+        else:
+            self.level = 6 if level is None else level
+
+    def compress(self, data: bytes) -> bytes:
+        if self.name == CODEC_ZSTD:
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+        return compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data: bytes) -> bytes:
+        if self.name == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError('Se necesita el paquete zstandard para leer este archivo')
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompressobj(31).decompress(data)
+
+def file_matches(path: str, entry: dict) -> bool:
+    """
+    Returns True if a file still has the size and modification time recorded in its index entry.
+    """
+    try:
+        return os.path.getsize(path) == entry['size'] and int(os.path.getmtime(path)) == entry['mtime']
+    except OSError:
+        return False
+
+def archived_key(files: dict, key: str, path: str) -> str:
+    """
+    Returns the key under which the file was already archived as it is now (`key` or a later
+    version of it, `key@<mtime>`), or None.
+    """
+    for name, entry in files.items():
+        if (name == key or name.startswith(key + '@')) and file_matches(path, entry):
+            return name
+    return None
+
+class Archiver:
+    """
+    Compresses the files of closed months into seekable block archives.
+
+    For every source folder (e.g. `logs`), the files of each closed month are packed
+    into `archive/<folder>/<YYYY-MM>.gz` (or `.zst`): every file is cut into blocks of
+    about `block_size` bytes at line boundaries, and each block is an independent
+    gzip member (zstd frame). The index `archive/<folder>/<YYYY-MM>.idx.json` keeps,
+    per original file, the offset, compressed and uncompressed length, first line
+    number and CRC32 of each block, so a file or a line range can be streamed back
+    without decompressing the rest of the archive.
+
+    Files that show up later for an already archived month are appended as new
+    blocks; a file already archived with the same size and modification time is
+    skipped, so originals kept in place are not archived again every day. With
+    `delete_originals`, an original is removed only after its blocks were read back
+    and verified, and only if it did not change since it was archived.
+
+    Settings (section `[Archive_config]` of config.ini, all optional):
+        enabled: Runs the archival stage in the service (off by default).
+        folders: Comma separated folders, relative to the root, to archive. Only `logs`
+            by default: the per-device attendance files of `devices` are still read by
+            payroll and by the common package.
+        codec: gzip or zstd (needs the zstandard package).
+        block_size_kb: Uncompressed size of each block.
+        grace_days: Files modified more recently are never archived.
+        delete_originals: Removes the original files once archived and verified (off by default).
+    """
+
+    def __init__(self, root: str = None, folders=('logs',), codec: str = CODEC_GZIP,
+                 block_size: int = DEFAULT_BLOCK_SIZE, grace_days: int = 3, delete_originals: bool = False):
+        self.root = root or find_root_directory()
+        self.folders = [folder.strip() for folder in folders if folder.strip()]
+        self.codec = BlockCodec(codec)
+        self.block_size = max(4096, int(block_size))
+        self.grace_days = grace_days
+        self.delete_originals = delete_originals
+        self.thread: threading.Thread = None
+        self.stop_event = threading.Event()
+
+    @classmethod
+    def from_config(cls, config, root: str = None) -> 'Archiver':
+        """
+        Builds the archiver from the `[Archive_config]` section of a loaded ConfigParser.
+        """
+        return cls(
+            root=root,
+            folders=config.get(ARCHIVE_SECTION, 'folders', fallback='logs').split(','),
+            codec=config.get(ARCHIVE_SECTION, 'codec', fallback=CODEC_GZIP).strip().lower(),
+            block_size=config.getint(ARCHIVE_SECTION, 'block_size_kb', fallback=1024) * 1024,
+            grace_days=config.getint(ARCHIVE_SECTION, 'grace_days', fallback=3),
+            delete_originals=config.getboolean(ARCHIVE_SECTION, 'delete_originals', fallback=False)
+        )
+
+    def archive_folder(self, folder: str) -> str:
+        return os.path.join(self.root, ARCHIVE_FOLDER, folder)
+
+    def closed_files(self, folder: str, now: datetime = None) -> dict[str, list[str]]:
+        """
+        Lists the files of a source folder that belong to closed months.
+
+        A month is closed once it is over, and a file is only taken once it was not
+        modified for `grace_days`, so files still being written are left alone.
+
+        Returns:
+            dict[str, list[str]]: Relative paths (to the source folder) keyed by month.
+        """
+        now = now or datetime.now()
+        current_month = now.strftime('%Y-%m')
+        limit = (now - timedelta(days=self.grace_days)).timestamp()
+        source = os.path.join(self.root, folder)
+        months: dict[str, list[str]] = {}
+        for directory, _, files in os.walk(source):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    continue
+                relative_path = os.path.relpath(path, source)
+                month = month_of(relative_path, mtime)
+                if month < current_month and mtime < limit:
+                    months.setdefault(month, []).append(relative_path)
+        for paths in months.values():
+            paths.sort()
+        return months
+
+    def run(self, now: datetime = None) -> dict:
+        """
+        Archives every closed month of every source folder.
+
+        Returns:
+            dict: Totals of the run (files, original and compressed bytes).
+        """
+        totals = {'files': 0, 'bytes': 0, 'compressed': 0}
+        for folder in self.folders:
+            for month, paths in sorted(self.closed_files(folder, now).items()):
+                if self.stop_event.is_set():
+                    return totals
+                try:
+                    result = self.archive_month(folder, month, paths)
+                except Exception as e:
+                    logging.error(f'Error al archivar {folder} {month}: {e}')
+                    continue
+                for key in totals:
+                    totals[key] += result[key]
+        if totals['files']:
+            logging.info(f'Archivados {totals["files"]} archivos: {totals["bytes"]} bytes -> {totals["compressed"]} bytes')
+        return totals
+
+    def archive_month(self, folder: str, month: str, paths: list[str]) -> dict:
+        """
+        Appends the given files of a month to its archive, verifies them and, with
+        `delete_originals`, removes the originals that did not change meanwhile.
+
+        Args:
+            folder (str): Source folder, relative to the root.
+            month (str): Month of the files (YYYY-MM).
+            paths (list[str]): Paths of the files, relative to the source folder.
+
+        Returns:
+            dict: Files archived and their original and compressed bytes.
+        """
+        archive_folder = self.archive_folder(folder)
+        os.makedirs(archive_folder, exist_ok=True)
+        archive_path = os.path.join(archive_folder, month + self.codec.extension)
+        index = self.load_index(folder, month) or {'codec': self.codec.name, 'files': {}}
+        if index['codec'] != self.codec.name:
+            # Keep appending with the codec the archive was created with
+            codec = BlockCodec(index['codec'])
+            archive_path = os.path.join(archive_folder, month + codec.extension)
+        else:
+            codec = self.codec
+
+        source = os.path.join(self.root, folder)
+        result = {'files': 0, 'bytes': 0, 'compressed': 0}
+        archived: list[tuple[str, str]] = []
+        kept: list[tuple[str, str]] = []  # Originals already archived by a previous run
+        with open(archive_path, 'ab') as archive:
+            for relative_path in paths:
+                key = relative_path.replace(os.sep, '/')
+                previous = archived_key(index['files'], key, os.path.join(source, relative_path))
+                if previous is not None:
+                    kept.append((relative_path, previous))
+                    continue
+                if key in index['files']:
+                    # A file with the same name was archived before (e.g. a log rewritten): keep both
+                    key = f'{key}@{int(os.path.getmtime(os.path.join(source, relative_path)))}'
+                entry = self.__append_file(archive, codec, os.path.join(source, relative_path))
+                index['files'][key] = entry
+                archived.append((relative_path, key))
+                result['files'] += 1
+                result['bytes'] += entry['size']
+                result['compressed'] += sum(block[1] for block in entry['blocks'])
+                time.sleep(0)  # Let other green threads run between files
+            archive.flush()
+            os.fsync(archive.fileno())
+
+        self.__save_index(folder, month, index)
+        if self.delete_originals:
+            archived += kept
+        # Read the blocks back before any original is removed
+        self.__verify(archive_path, codec, index, [key for _, key in archived])
+        if self.delete_originals:
+            for relative_path, key in archived:
+                path = os.path.join(source, relative_path)
+                if file_matches(path, index['files'][key]):
+                    os.remove(path)
+                else:
+                    logging.warning(f'{path} cambio durante el archivado, se conserva el original')
+            self.__remove_empty_folders(source)
+        return result
+
+    def __append_file(self, archive, codec: BlockCodec, path: str) -> dict:
+        entry = {'size': 0, 'lines': 0, 'mtime': int(os.path.getmtime(path)), 'blocks': []}
+        with open(path, 'rb') as original:
+            pending = b''
+            while True:
+                data = original.read(self.block_size)
+                if not data and not pending:
+                    break
+                block = pending + data
+                if data:
+                    # Cut at the last line break so every block starts with a complete line
+                    cut = block.rfind(b'\n') + 1
+                    if cut == 0:
+                        pending = block
+                        continue
+                    block, pending = block[:cut], block[cut:]
+                else:
+                    pending = b''
+                compressed = offload(codec.compress, block)
+                offset = archive.tell()
+                archive.write(compressed)
+                entry['blocks'].append([offset, len(compressed), len(block), entry['lines'], zlib.crc32(block)])
+                entry['size'] += len(block)
+                entry['lines'] += block.count(b'\n')
+        return entry
+
+    def __verify(self, archive_path: str, codec: BlockCodec, index: dict, keys: list[str]):
+        with open(archive_path, 'rb') as archive:
+            for key in keys:
+                for offset, length, size, _, crc in index['files'][key]['blocks']:
+                    archive.seek(offset)
+                    block = codec.decompress(archive.read(length))
+                    if len(block) != size or zlib.crc32(block) != crc:
+                        raise IOError(f'Bloque corrupto en {archive_path} ({key}, offset {offset})')
+
+    def __remove_empty_folders(self, source: str):
+        for directory, _, _ in sorted(os.walk(source), key=lambda item: len(item[0]), reverse=True):
+            if directory != source:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+
+    def load_index(self, folder: str, month: str) -> dict:
+        try:
+            with open(os.path.join(self.archive_folder(folder), f'{month}.idx.json'), 'r', encoding='utf-8') as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return None
+
+    def __save_index(self, folder: str, month: str, index: dict):
+        index_path = os.path.join(self.archive_folder(folder), f'{month}.idx.json')
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as index_file:
+            json.dump(index, index_file, separators=(',', ':'))
+        os.replace(tmp_path, index_path)
+
+    def available_months(self, folder: str) -> list[str]:
+        try:
+            names = os.listdir(self.archive_folder(folder))
+        except FileNotFoundError:
+            return []
+        return sorted(name[:-len('.idx.json')] for name in names if name.endswith('.idx.json'))
+
+    def iter_lines(self, folder: str, month: str, path: str = None, start_line: int = 0):
+        """
+        Streams lines back from an archive, decompressing one block at a time.
+
+        Args:
+            folder (str): Source folder the archive belongs to.
+            month (str): Month of the archive (YYYY-MM).
+            path (str, optional): Only this original file (relative path, '/' separated).
+                Paths ending in '/' select a whole subfolder.
+            start_line (int): First line to return of each file; the blocks before it are skipped
+                without being decompressed.
+
+        Yields:
+            tuple[str, str]: The original relative path and the line (without line break).
+        """
+        index = self.load_index(folder, month)
+        if index is None:
+            return
+        codec = BlockCodec(index['codec'])
+        archive_path = os.path.join(self.archive_folder(folder), month + codec.extension)
+        with open(archive_path, 'rb') as archive:
+            for name, entry in sorted(index['files'].items()):
+                if path is not None and name != path and not (path.endswith('/') and name.startswith(path)):
+                    continue
+                blocks = entry['blocks']
+                for position, (offset, length, size, first_line, _) in enumerate(blocks):
+                    # The next block starts where this one ends
+                    if position + 1 < len(blocks) and blocks[position + 1][3] <= start_line:
+                        continue
+                    archive.seek(offset)
+                    lines = codec.decompress(archive.read(length)).decode('utf-8', errors='replace').splitlines()
+                    for number, line in enumerate(lines, start=first_line):
+                        if number >= start_line:
+                            yield name, line
+
+    def start_background(self, now: datetime = None) -> bool:
+        """
+        Runs `run()` in a background thread, unless a previous run is still going.
+
+        Returns:
+            bool: True if a new run was started.
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return False
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.__run_safely, args=(now,), name='archiver', daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+
+    def __run_safely(self, now: datetime = None):
+        try:
+            self.run(now)
+        except Exception as e:
+            logging.error(f'Error en el archivado: {e}')
+
+def main(argv=None):
+    """
+    Command line access to the archives.
+
+    Usage:
+        python -m scripts.business_logic.archiver run
+        python -m scripts.business_logic.archiver list logs
+        python -m scripts.business_logic.archiver cat devices 2024-05 --path "Sucursal/1_MB160/2024-05-02_file.cro"
+        python -m scripts.business_logic.archiver grep logs 2024-05 "Error"
+    """
+    from scripts import config
+    parser = argparse.ArgumentParser(description='Archivo comprimido de logs y marcaciones de meses cerrados')
+    parser.add_argument('--root', help='Directorio raiz (por defecto, el de la aplicacion)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('run', help='Archiva los meses cerrados')
+    list_parser = subparsers.add_parser('list', help='Lista los meses archivados o los archivos de un mes')
+    list_parser.add_argument('folder')
+    list_parser.add_argument('month', nargs='?')
+    for name in ('cat', 'grep'):
+        read_parser = subparsers.add_parser(name)
+        read_parser.add_argument('folder')
+        read_parser.add_argument('month')
+        if name == 'grep':
+            read_parser.add_argument('pattern')
+        read_parser.add_argument('--path', help='Archivo original (o carpeta terminada en /)')
+        read_parser.add_argument('--from-line', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    root = args.root or find_root_directory()
+    config.read(os.path.join(root, 'config.ini'))
+    archiver = Archiver.from_config(config, root)
+
+    if args.command == 'run':
+        totals = archiver.run()
+        print(f'{totals["files"]} archivos, {totals["bytes"]} bytes -> {totals["compressed"]} bytes')
+    elif args.command == 'list':
+        if not args.month:
+            for month in archiver.available_months(args.folder):
+                print(month)
+        else:
+            index = archiver.load_index(args.folder, args.month) or {'files': {}}
+            for name, entry in sorted(index['files'].items()):
+                compressed = sum(block[1] for block in entry['blocks'])
+                print(f'{name}\t{entry["lines"]} lineas\t{entry["size"]} -> {compressed} bytes')
+    else:
+        pattern = re.compile(args.pattern) if args.command == 'grep' else None
+        for name, line in archiver.iter_lines(args.folder, args.month, args.path, args.from_line):
+            if pattern is None:
+                print(line)
+            elif pattern.search(line):
+                print(f'{name}: {line}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
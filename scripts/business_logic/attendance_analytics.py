@@ -0,0 +1,451 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+from scripts.business_logic.attendance_store import AttendanceStore
+from scripts.business_logic.hub_monitor import offload
+from scripts.common.utils.file_manager import find_root_directory
+
+ANALYTICS_SECTION = 'Analytics_config'
+SHIFTS_SECTION = 'Analytics_shifts'
+WATERMARK = 'attendances_last_id'
+DEFAULT_BATCH = 500000
+DEFAULT_SHIFT_START = '08:00'
+
+ANALYTICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance_daily (
+    day TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    point TEXT NOT NULL,
+    first_in TEXT NOT NULL,
+    last_out TEXT NOT NULL,
+    punches INTEGER NOT NULL,
+    PRIMARY KEY (day, user_id, point)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_attendance_daily_user ON attendance_daily (user_id, day);
+CREATE TABLE IF NOT EXISTS attendance_hourly (
+    hour TEXT NOT NULL,
+    device_ip TEXT NOT NULL,
+    point TEXT NOT NULL,
+    punches INTEGER NOT NULL,
+    PRIMARY KEY (hour, device_ip)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS analytics_state (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Both aggregates only read the rows between the watermark and the end of the batch,
+# and merge them into the existing aggregates (first_in/last_out as min/max, counts as sums)
+REFRESH_DAILY = """
+INSERT INTO attendance_daily (day, user_id, point, first_in, last_out, punches)
+SELECT substr(timestamp, 1, 10), user_id, COALESCE(point, ''), MIN(timestamp), MAX(timestamp), COUNT(*)
+FROM attendances WHERE id > ? AND id <= ?
+GROUP BY 1, 2, 3
+ON CONFLICT (day, user_id, point) DO UPDATE SET
+    first_in = MIN(first_in, excluded.first_in),
+    last_out = MAX(last_out, excluded.last_out),
+    punches = punches + excluded.punches
+"""
+
+REFRESH_HOURLY = """
+INSERT INTO attendance_hourly (hour, device_ip, point, punches)
+SELECT substr(timestamp, 1, 13), device_ip, COALESCE(point, ''), COUNT(*)
+FROM attendances WHERE id > ? AND id <= ?
+GROUP BY 1, 2
+ON CONFLICT (hour, device_ip) DO UPDATE SET
+    point = excluded.point,
+    punches = punches + excluded.punches
+"""
+
+# First punch of each employee and day, with the point where it happened (for a bare column
+# next to MIN, SQLite takes the value of the row that holds the minimum)
+FIRST_PUNCHES = """
+SELECT user_id, day, MIN(first_in) AS first_in, point FROM attendance_daily
+WHERE day BETWEEN ? AND ? GROUP BY day, user_id
+"""
+
+def shift_time(text: str) -> str:
+    """
+    Normalizes a time of day ('8:00', '08:00' or '08:00:30') to 'HH:MM:SS'.
+
+    Raises:
+        ValueError: If the text is not a valid time of day.
+    """
+    text = text.strip()
+    for layout in ('%H:%M:%S', '%H:%M'):
+        try:
+            return datetime.strptime(text, layout).strftime('%H:%M:%S')
+        except ValueError:
+            continue
+    raise ValueError(f'hora invalida {text!r}, se esperaba HH:MM')
+
+def late_after(shift_start: str, grace_minutes: float) -> str:
+    """
+    Returns the time of day ('HH:MM:SS') after which a first punch is a late arrival.
+    """
+    start = datetime.strptime(shift_time(shift_start), '%H:%M:%S')
+    limit = min(start + timedelta(minutes=grace_minutes), start.replace(hour=23, minute=59, second=59))
+    return limit.strftime('%H:%M:%S')
+
+class AttendanceAnalytics:
+    """
+    Incremental aggregates of the attendances stored in the SQLite sink, and the HR reports built on them.
+
+    Two tables are kept next to `attendances`:
+        attendance_daily: first and last punch and punch count per day, point and user.
+        attendance_hourly: punch count per hour and device.
+
+    `refresh` aggregates only the rows stored since the last refresh (the `id` of the
+    last aggregated row is kept in `analytics_state`, in the same transaction as the
+    aggregates), so the cost of keeping them current is proportional to the new punches,
+    never to the size of the database. The unique index of `attendances` already drops
+    repeated punches, so a punch is counted once. The reports (first-in/last-out, late
+    arrivals, missing punches, punches per hour) read the aggregates: a few rows per
+    employee and day instead of every raw punch.
+
+    Days are calendar days: a shift that crosses midnight shows up as two days.
+
+    Settings (section `[Analytics_config]` of config.ini, all optional):
+        enabled: Keeps the aggregates current while collecting (requires sqlite_enabled).
+        batch_rows: Maximum rows aggregated per transaction.
+        shift_start: Start of the shift, for the late arrivals.
+        grace_minutes: Minutes after the start of the shift before a punch is late.
+    Section `[Analytics_shifts]`: start of the shift of a point, e.g. `Sucursal Norte = 07:30`.
+    """
+
+    def __init__(self, store: AttendanceStore, batch_rows: int = DEFAULT_BATCH, shift_start: str = DEFAULT_SHIFT_START,
+                 grace_minutes: float = 0, shifts: dict = None):
+        self.store = store
+        self.batch_rows = max(1, int(batch_rows))
+        self.shift_start = shift_time(shift_start)
+        self.grace_minutes = float(grace_minutes)
+        # ConfigParser lowers option names, so points are matched case-insensitively
+        self.shifts = {point.lower(): shift_time(start) for point, start in (shifts or {}).items()}
+        with self.store.lock:
+            self.store.connect().executescript(ANALYTICS_SCHEMA)
+
+    @classmethod
+    def from_config(cls, config, store: AttendanceStore, require_enabled: bool = True) -> 'AttendanceAnalytics':
+        """
+        Builds the analytics from the `[Analytics_config]` and `[Analytics_shifts]` sections of a loaded ConfigParser.
+
+        Returns:
+            AttendanceAnalytics: The analytics, or None if they are disabled or there is no store.
+        """
+        if store is None:
+            return None
+        if require_enabled and not config.getboolean(ANALYTICS_SECTION, 'enabled', fallback=False):
+            return None
+        return cls(
+            store,
+            batch_rows=config.getint(ANALYTICS_SECTION, 'batch_rows', fallback=DEFAULT_BATCH),
+            shift_start=config.get(ANALYTICS_SECTION, 'shift_start', fallback=DEFAULT_SHIFT_START),
+            grace_minutes=config.getfloat(ANALYTICS_SECTION, 'grace_minutes', fallback=0),
+            shifts=dict(config.items(SHIFTS_SECTION, raw=True)) if config.has_section(SHIFTS_SECTION) else None
+        )
+
+    def watermark(self) -> int:
+        """
+        Returns the id of the last aggregated attendance.
+        """
+        with self.store.lock:
+            row = self.store.connect().execute('SELECT value FROM analytics_state WHERE name = ?', (WATERMARK,)).fetchone()
+        return row[0] if row else 0
+
+    def refresh(self, max_rows: int = None) -> int:
+        """
+        Aggregates the attendances stored since the last refresh, `batch_rows` at a time.
+
+        Each batch is one transaction that also moves the watermark, so an interrupted
+        refresh never counts a punch twice or skips one.
+
+        Args:
+            max_rows (int, optional): Stop after about this many rows (the service limits
+                each refresh so a first backfill does not hold the store for long). None
+                aggregates everything.
+
+        Returns:
+            int: Number of attendances aggregated.
+        """
+        done = 0
+        while max_rows is None or done < max_rows:
+            with self.store.lock:
+                # sqlite3 never yields to eventlet's hub: the batch runs in its native thread pool
+                rows = offload(self.__refresh_batch, self.store.connect(), self.batch_rows)
+            if not rows:
+                break
+            done += rows
+        return done
+
+    @staticmethod
+    def __refresh_batch(connection: sqlite3.Connection, batch_rows: int) -> int:
+        with connection:
+            row = connection.execute('SELECT value FROM analytics_state WHERE name = ?', (WATERMARK,)).fetchone()
+            after = row[0] if row else 0
+            # Ids only grow (AUTOINCREMENT): the batch ends at the id of its last row
+            end = connection.execute(
+                'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM attendances WHERE id > ? ORDER BY id LIMIT ?)',
+                (after, batch_rows)
+            ).fetchone()
+            if not end[1]:
+                return 0
+            connection.execute(REFRESH_DAILY, (after, end[0]))
+            connection.execute(REFRESH_HOURLY, (after, end[0]))
+            connection.execute(
+                'INSERT INTO analytics_state (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = excluded.value',
+                (WATERMARK, end[0])
+            )
+            return end[1]
+
+    def rebuild(self) -> int:
+        """
+        Drops the aggregates and builds them again from every stored attendance.
+
+        Returns:
+            int: Number of attendances aggregated.
+        """
+        with self.store.lock:
+            connection = self.store.connect()
+            with connection:
+                connection.execute('DELETE FROM attendance_daily')
+                connection.execute('DELETE FROM attendance_hourly')
+                connection.execute('DELETE FROM analytics_state WHERE name = ?', (WATERMARK,))
+        return self.refresh()
+
+    def __query(self, sql: str, parameters: tuple) -> list[dict]:
+        def fetch(connection: sqlite3.Connection) -> list[dict]:
+            cursor = connection.execute(sql, parameters)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+        with self.store.lock:
+            return offload(fetch, self.store.connect())
+
+    def daily_summary(self, start: str, end: str, users=None, points=None) -> list[dict]:
+        """
+        Returns the first punch (entry) and last punch (exit) of every employee and day.
+
+        Args:
+            start (str): First day, 'YYYY-MM-DD'.
+            end (str): Last day, 'YYYY-MM-DD' (inclusive).
+            users (iterable[str], optional): Only these users.
+            points (iterable[str], optional): Only the punches of these points.
+
+        Returns:
+            list[dict]: One item per user and day: first_in, last_out, punches and the points.
+        """
+        conditions, parameters = ['day BETWEEN ? AND ?'], [start, end]
+        for column, values in (('user_id', users), ('point', points)):
+            if values:
+                values = list(values)
+                conditions.append(f'{column} IN ({", ".join("?" * len(values))})')
+                parameters.extend(values)
+        return self.__query(
+            'SELECT user_id, day, MIN(first_in) AS first_in, MAX(last_out) AS last_out, SUM(punches) AS punches, '
+            'GROUP_CONCAT(point) AS points '
+            f'FROM attendance_daily WHERE {" AND ".join(conditions)} GROUP BY day, user_id ORDER BY day, user_id',
+            tuple(parameters)
+        )
+
+    def __limits(self) -> tuple[str, list]:
+        # Late threshold of each configured point, as a VALUES table joined by the late arrival queries
+        limits = [(point, late_after(start, self.grace_minutes)) for point, start in self.shifts.items()]
+        if not limits:
+            return 'SELECT NULL AS point, NULL AS late_after WHERE 0', []
+        values = ', '.join('(?, ?)' for _ in limits)
+        return f'SELECT column1 AS point, column2 AS late_after FROM (VALUES {values})', [value for limit in limits for value in limit]
+
+    def late_arrivals(self, start: str, end: str, points=None) -> list[dict]:
+        """
+        Returns the employees whose first punch of the day is after the start of the shift
+        of the point where they punched plus the grace minutes.
+
+        Returns:
+            list[dict]: One item per user and day: point, first_in, late_after and minutes_late.
+        """
+        limits, parameters = self.__limits()
+        default = late_after(self.shift_start, self.grace_minutes)
+        conditions = ''
+        if points:
+            points = list(points)
+            conditions = f' AND f.point IN ({", ".join("?" * len(points))})'
+        rows = self.__query(
+            f'WITH limits AS ({limits}), firsts AS ({FIRST_PUNCHES}) '
+            'SELECT f.point, f.day, f.user_id, f.first_in, COALESCE(l.late_after, ?) AS late_after '
+            'FROM firsts f LEFT JOIN limits l ON l.point = lower(f.point) '
+            f'WHERE substr(f.first_in, 12, 8) > COALESCE(l.late_after, ?){conditions} '
+            'ORDER BY f.point, f.day, f.user_id',
+            tuple(parameters) + (start, end, default, default, *(points or ()))
+        )
+        for row in rows:
+            first_in = datetime.strptime(row['first_in'][11:19], '%H:%M:%S')
+            row['minutes_late'] = round((first_in - datetime.strptime(row['late_after'], '%H:%M:%S')).total_seconds() / 60, 1)
+        return rows
+
+    def late_arrivals_by_point(self, start: str, end: str) -> list[dict]:
+        """
+        Returns, per point, the employee-days that started there, the late arrivals and the
+        employees who arrived late.
+        """
+        limits, parameters = self.__limits()
+        default = late_after(self.shift_start, self.grace_minutes)
+        return self.__query(
+            f'WITH limits AS ({limits}), firsts AS ({FIRST_PUNCHES}) '
+            'SELECT f.point, COUNT(*) AS days_worked, '
+            'SUM(substr(f.first_in, 12, 8) > COALESCE(l.late_after, ?)) AS late_arrivals, '
+            'COUNT(DISTINCT CASE WHEN substr(f.first_in, 12, 8) > COALESCE(l.late_after, ?) THEN f.user_id END) AS late_employees '
+            'FROM firsts f LEFT JOIN limits l ON l.point = lower(f.point) '
+            'GROUP BY f.point ORDER BY late_arrivals DESC, f.point',
+            tuple(parameters) + (start, end, default, default)
+        )
+
+    def missing_punches(self, start: str, end: str, points=None) -> list[dict]:
+        """
+        Returns the employees and days with an odd number of punches (an entry without its
+        exit or the other way around), counting the punches of every point.
+        """
+        conditions, parameters = '', [start, end]
+        if points:
+            points = list(points)
+            conditions = f' AND point IN ({", ".join("?" * len(points))})'
+            parameters.extend(points)
+        return self.__query(
+            'SELECT user_id, day, SUM(punches) AS punches, MIN(first_in) AS first_in, MAX(last_out) AS last_out, '
+            'GROUP_CONCAT(point) AS points '
+            f'FROM attendance_daily WHERE day BETWEEN ? AND ?{conditions} '
+            'GROUP BY day, user_id HAVING SUM(punches) % 2 = 1 ORDER BY day, user_id',
+            tuple(parameters)
+        )
+
+    def punches_per_hour(self, start: str, end: str, device_ip: str = None, by_device: bool = False) -> list[dict]:
+        """
+        Returns the punches per hour ('YYYY-MM-DD HH') between two days, of every device
+        together, of one device, or of each device (`by_device`).
+        """
+        conditions, parameters = 'hour BETWEEN ? AND ?', [f'{start} 00', f'{end} 23']
+        if device_ip:
+            conditions += ' AND device_ip = ?'
+            parameters.append(device_ip)
+        columns = 'hour, device_ip, point' if by_device or device_ip else 'hour'
+        return self.__query(
+            f'SELECT {columns}, SUM(punches) AS punches FROM attendance_hourly WHERE {conditions} '
+            f'GROUP BY {columns} ORDER BY {columns}',
+            tuple(parameters)
+        )
+
+def refresh_analytics(analytics: AttendanceAnalytics, max_rows: int = None):
+    """
+    Brings the aggregates up to date, logging instead of raising on errors.
+
+    The aggregates can always be rebuilt from the attendances: an error must never
+    make a collection fail.
+    """
+    if analytics is None:
+        return
+    try:
+        rows = analytics.refresh(max_rows)
+        if rows:
+            logging.debug(f'{rows} marcaciones agregadas a los resumenes de asistencia')
+    except sqlite3.Error as e:
+        logging.error(f'Error al actualizar los resumenes de asistencia: {e}')
+
+def print_rows(rows: list[dict], as_json: bool):
+    if as_json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+        return
+    if rows:
+        print('\t'.join(rows[0]))
+    for row in rows:
+        print('\t'.join('' if value is None else str(value) for value in row.values()))
+
+def main(argv=None):
+    """
+    Updates the attendance aggregates and prints the reports built on them.
+
+    Usage:
+        python -m scripts.business_logic.attendance_analytics refresh
+        python -m scripts.business_logic.attendance_analytics daily --from 2024-05-01 --to 2024-05-31 --user 1024
+        python -m scripts.business_logic.attendance_analytics late --from 2024-05-01 --to 2024-05-31 --by-point
+        python -m scripts.business_logic.attendance_analytics missing --from 2024-05-01 --to 2024-05-31
+        python -m scripts.business_logic.attendance_analytics hours --from 2024-05-06 --to 2024-05-06 --by-device
+    """
+    from scripts import config
+    today = datetime.today().strftime('%Y-%m-%d')
+    parser = argparse.ArgumentParser(description='Resumenes de asistencia sobre la base de marcaciones')
+    parser.add_argument('--root', help='Directorio raiz (por defecto, el de la aplicacion)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('refresh', help='Agrega las marcaciones nuevas a los resumenes')
+    subparsers.add_parser('rebuild', help='Vuelve a armar los resumenes desde todas las marcaciones')
+    daily_parser = subparsers.add_parser('daily', help='Primera entrada y ultima salida por empleado y dia')
+    late_parser = subparsers.add_parser('late', help='Llegadas tarde')
+    missing_parser = subparsers.add_parser('missing', help='Dias con marcaciones impares (falta una entrada o salida)')
+    hours_parser = subparsers.add_parser('hours', help='Marcaciones por hora')
+    for subparser in (daily_parser, late_parser, missing_parser, hours_parser):
+        subparser.add_argument('--from', dest='start', default=today, help='Primer dia (AAAA-MM-DD)')
+        subparser.add_argument('--to', dest='end', default=today, help='Ultimo dia (AAAA-MM-DD)')
+        subparser.add_argument('--json', action='store_true')
+        subparser.add_argument('--no-refresh', action='store_true', help='No agrega antes las marcaciones nuevas')
+    for subparser in (daily_parser, late_parser, missing_parser):
+        subparser.add_argument('--point', action='append', help='Punto de marcacion (repetible)')
+    daily_parser.add_argument('--user', action='append', help='Usuario (repetible)')
+    late_parser.add_argument('--by-point', action='store_true', help='Totales por punto')
+    hours_parser.add_argument('--ip', help='Solo este dispositivo')
+    hours_parser.add_argument('--by-device', action='store_true', help='Separado por dispositivo')
+    args = parser.parse_args(argv)
+
+    root = args.root or find_root_directory()
+    config.read(os.path.join(root, 'config.ini'))
+    store = AttendanceStore.from_config(config, root)
+    if store is None:
+        print('La base de datos de marcaciones no esta habilitada (sqlite_enabled en [Storage_config])', file=sys.stderr)
+        return 1
+    try:
+        analytics = AttendanceAnalytics.from_config(config, store, require_enabled=False)
+    except ValueError as e:
+        print(f'Configuracion invalida en [{ANALYTICS_SECTION}] o [{SHIFTS_SECTION}]: {e}', file=sys.stderr)
+        return 1
+    if args.command == 'rebuild':
+        print(f'{analytics.rebuild()} marcaciones agregadas')
+        return 0
+    if args.command == 'refresh' or not args.no_refresh:
+        rows = analytics.refresh()
+        if args.command == 'refresh':
+            print(f'{rows} marcaciones nuevas agregadas - ultimo id: {analytics.watermark()}')
+            return 0
+    if args.command == 'daily':
+        rows = analytics.daily_summary(args.start, args.end, args.user, args.point)
+    elif args.command == 'late':
+        rows = analytics.late_arrivals_by_point(args.start, args.end) if args.by_point else analytics.late_arrivals(args.start, args.end, args.point)
+    elif args.command == 'missing':
+        rows = analytics.missing_punches(args.start, args.end, args.point)
+    else:
+        rows = analytics.punches_per_hour(args.start, args.end, args.ip, args.by_device)
+    print_rows(rows, args.json)
+    store.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from scripts.business_logic.hub_monitor import offload
+from scripts.common.utils.file_manager import find_root_directory
+
+STORAGE_SECTION = 'Storage_config'
+DEFAULT_DATABASE = 'attendances.db'
+YIELD_EVERY = 1000
+COLUMNS = ('device_ip', 'point', 'device_id', 'user_id', 'timestamp', 'status', 'punch', 'collected_at')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendances (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    device_ip TEXT NOT NULL,
+    point TEXT,
+    device_id TEXT,
+    user_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status INTEGER,
+    punch INTEGER,
+    collected_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS ux_attendances_device_user_timestamp
+    ON attendances (device_ip, user_id, timestamp);
+"""
+
+def attendance_values(attendance) -> tuple:
+    """
+    Extracts (user_id, timestamp, status, punch) from an attendance record.
+
+    Accepts the attendance objects of the application and of pyzk (attributes)
+    as well as dictionaries with the same keys. Timestamps are stored as
+    'YYYY-MM-DD HH:MM:SS' text, so they sort chronologically.
+    """
+    def value(name):
+        if isinstance(attendance, dict):
+            return attendance.get(name)
+        return getattr(attendance, name, None)
+
+    timestamp = value('timestamp')
+    if isinstance(timestamp, datetime):
+        timestamp = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value('user_id')), str(timestamp), value('status'), value('punch')
+
+def build_rows(device, attendances: list) -> list[tuple]:
+    """
+    Converts the attendances of a device into rows in the order of `COLUMNS`.
+    """
+    collected_at = datetime.now().isoformat(timespec='seconds')
+    point = getattr(device, 'point', None)
+    device_id = getattr(device, 'id', None)
+    device_id = None if device_id is None else str(device_id)
+    rows = []
+    for position, attendance in enumerate(attendances, start=1):
+        rows.append((device.ip, point, device_id, *attendance_values(attendance), collected_at))
+        if position % YIELD_EVERY == 0:
+            time.sleep(0)  # CPU bound on large logs: let other green threads run
+    return rows
+
+class AttendanceStore:
+    """
+    SQLite persistence of the attendance records, next to the attendance files.
+
+    The database runs in WAL mode, so readers (e.g. a payroll sync) never block the
+    service while it writes. Each device batch goes in with a single `executemany` in
+    one transaction. The unique index on (device_ip, user_id, timestamp) makes
+    `INSERT OR IGNORE` drop the records already stored, so collecting the same punches
+    twice (e.g. when the device was not cleared) is harmless. Ids only grow
+    (AUTOINCREMENT), so readers can poll new records with `fetch_since(last_id)`.
+
+    A single connection is shared by the workers of a run and serialized with a lock.
+
+    Settings (section `[Storage_config]` of config.ini, all optional):
+        sqlite_enabled: Also stores the attendances in the database.
+        sqlite_path: Path of the database, relative to the root directory.
+    """
+
+    def __init__(self, path: str = None):
+        """
+        Args:
+            path (str, optional): Path of the database file. Defaults to `attendances.db`
+                in the root directory of the application.
+        """
+        self.path = path or os.path.join(find_root_directory(), DEFAULT_DATABASE)
+        self.lock = threading.Lock()
+        self.connection: sqlite3.Connection = None
+
+    @classmethod
+    def from_config(cls, config, root: str = None) -> 'AttendanceStore':
+        """
+        Builds the store from the `[Storage_config]` section of a loaded ConfigParser.
+
+        Returns:
+            AttendanceStore: The store, or None if the SQLite sink is disabled.
+        """
+        if not config.getboolean(STORAGE_SECTION, 'sqlite_enabled', fallback=False):
+            return None
+        path = config.get(STORAGE_SECTION, 'sqlite_path', fallback=DEFAULT_DATABASE)
+        return cls(os.path.join(root or find_root_directory(), path))
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            # With WAL, NORMAL only risks the last transactions on a power loss, never corruption
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.executescript(SCHEMA)
+        return self.connection
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def insert_many(self, device, attendances: list) -> int:
+        """
+        Stores the attendances of a device, ignoring the ones already stored.
+
+        Args:
+            device (Device): The device the attendances come from.
+            attendances (list): The attendance records (see `attendance_values`).
+
+        Returns:
+            int: Number of new records stored.
+        """
+        if not attendances:
+            return 0
+        return self.insert_rows(build_rows(device, attendances))
+
+    def insert_rows(self, rows: list[tuple]) -> int:
+        """
+        Stores raw rows (in the order of `COLUMNS`) in a single transaction.
+
+        Returns:
+            int: Number of new rows stored.
+        """
+        with self.lock:
+            # sqlite3 never yields to eventlet's hub: the write runs in its native thread pool
+            return offload(self.__insert_rows, self.connect(), rows)
+
+    @staticmethod
+    def __insert_rows(connection: sqlite3.Connection, rows: list[tuple]) -> int:
+        before = connection.total_changes
+        with connection:
+            connection.executemany(
+                f'INSERT OR IGNORE INTO attendances ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})',
+                rows
+            )
+        return connection.total_changes - before
+
+    def fetch_since(self, last_id: int = 0, limit: int = 1000) -> list[dict]:
+        """
+        Returns the records stored after a given id, oldest first.
+
+        Args:
+            last_id (int): Id of the last record already read (0 for the beginning).
+            limit (int): Maximum number of records returned.
+
+        Returns:
+            list[dict]: The records, with their `id` and the fields of `COLUMNS`.
+        """
+        with self.lock:
+            cursor = self.connect().execute(
+                f'SELECT id, {", ".join(COLUMNS)} FROM attendances WHERE id > ? ORDER BY id LIMIT ?',
+                (last_id, limit)
+            )
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def max_id(self) -> int:
+        with self.lock:
+            return self.connect().execute('SELECT COALESCE(MAX(id), 0) FROM attendances').fetchone()[0]
+
+    def count(self) -> int:
+        with self.lock:
+            return self.connect().execute('SELECT COUNT(*) FROM attendances').fetchone()[0]
+
+def store_attendances(store: AttendanceStore, device, attendances: list):
+    """
+    Writes the attendances of a device to the store, logging instead of raising on errors.
+
+    The attendance files remain the primary persistence: a database error must
+    never make a collection fail.
+    """
+    if store is None:
+        return
+    try:
+        inserted = store.insert_many(device, attendances)
+        logging.debug(f'{device.ip} - {inserted} marcaciones nuevas guardadas en {store.path}')
+    except sqlite3.Error as e:
+        logging.error(f'{device.ip} - Error al guardar marcaciones en la base de datos: {e}')
@@ -0,0 +1,151 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from scripts.business_logic.device_probe import read_device_sizes
+
+CLEARED = 'cleared'
+CHANGED = 'changed'  # New punches arrived after the download: clearing would lose them
+FAILED = 'failed'
+
+class ClearCandidate:
+    """
+    A device whose attendances were downloaded, counted and persisted in this run,
+    so its log can be cleared (phase two of `clear_verified`).
+    """
+
+    __slots__ = ('device', 'expected_records', 'record')
+
+    def __init__(self, device, expected_records: int, record: dict = None):
+        """
+        Args:
+            device (Device): The device.
+            expected_records (int): Records on the device when they were downloaded.
+            record (dict, optional): The journal record of the device, updated with the outcome.
+        """
+        self.device = device
+        self.expected_records = expected_records
+        self.record = record
+
+def verify_download(device_records: int, downloaded: int, with_error: int) -> str:
+    """
+    Phase one check of a device, once its attendances are persisted.
+
+    Args:
+        device_records (int): Records reported by the device (None if unknown).
+        downloaded (int): Records downloaded.
+        with_error (int): Downloaded records that could not be formatted.
+
+    Returns:
+        str: Why the device must not be cleared, or None if it can be.
+    """
+    if with_error:
+        return f'{with_error} marcaciones con error'
+    if device_records is None:
+        return 'no se pudo leer la cantidad de registros del dispositivo'
+    if device_records != downloaded:
+        return f'el dispositivo informa {device_records} registros y se obtuvieron {downloaded}'
+    return None
+
+def clear_verified(candidates: list[ClearCandidate], connect, workers: int = 16, dispatch=None) -> dict:
+    """
+    Phase two: clears, in parallel, the logs of the devices verified in phase one.
+
+    Each device is probed again right before the clear. If its record count changed
+    since the download, the new punches are not persisted yet and the device is left
+    untouched until the next run. Otherwise the device is disabled, so nobody can punch
+    while it is cleared, its count is checked once more and its log is cleared; it is
+    enabled again whatever happens. After the clear, the count must be zero.
+
+    Args:
+        candidates (list[ClearCandidate]): The verified devices.
+        connect (callable): Builds a connected connection manager for a device.
+        workers (int): Devices cleared at the same time.
+        dispatch (callable, optional): Returns the context manager a device must hold while
+            it is contacted (see `DispatchPolicy.budgets`), so the clear respects the same
+            concurrency budgets as the collection.
+
+    Returns:
+        dict: Outcome (`CLEARED`, `CHANGED` or `FAILED`) by IP.
+    """
+    def clear_one(candidate: ClearCandidate):
+        device = candidate.device
+        with dispatch(device) if dispatch is not None else nullcontext():
+            return clear_device(candidate, connect)
+
+    outcomes = {}
+    if not candidates:
+        return outcomes
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(candidates))), thread_name_prefix='clear') as executor:
+        for candidate, (ip, outcome) in zip(candidates, executor.map(clear_one, candidates)):
+            outcomes[ip] = outcome
+            if candidate.record is not None:
+                candidate.record['cleared'] = outcome == CLEARED
+    counts = {outcome: list(outcomes.values()).count(outcome) for outcome in (CLEARED, CHANGED, FAILED)}
+    logging.info(f'Eliminacion de marcaciones: {counts[CLEARED]} eliminados, {counts[CHANGED]} con marcaciones nuevas, {counts[FAILED]} con error')
+    return outcomes
+
+def clear_device(candidate: ClearCandidate, connect) -> tuple[str, str]:
+    """
+    Clears the log of one verified device (see `clear_verified`).
+
+    Returns:
+        tuple[str, str]: The IP of the device and its outcome.
+    """
+    device = candidate.device
+    conn_manager = None
+    disabled = False
+    try:
+        conn_manager = connect(device)
+        sizes = read_device_sizes(conn_manager)
+        if sizes is None:
+            return device.ip, FAILED
+        if sizes['records'] != candidate.expected_records:
+            logging.info(f'{device.ip} - {sizes["records"] - candidate.expected_records} marcaciones nuevas desde la descarga, no se eliminan')
+            return device.ip, CHANGED
+        conn_manager.conn.disable_device()
+        disabled = True
+        # A punch may have arrived before the device was disabled
+        sizes = read_device_sizes(conn_manager)
+        if sizes is None or sizes['records'] != candidate.expected_records:
+            logging.info(f'{device.ip} - Marcaciones nuevas desde la descarga, no se eliminan')
+            return device.ip, CHANGED if sizes is not None else FAILED
+        conn_manager.clear_attendances(True)
+        sizes = read_device_sizes(conn_manager)
+        if sizes is None or sizes['records'] != 0:
+            logging.warning(f'{device.ip} - No se pudo confirmar la eliminacion de marcaciones')
+            return device.ip, FAILED
+        return device.ip, CLEARED
+    except Exception as e:
+        logging.warning(f'{device.ip} - Error al eliminar marcaciones: {e}')
+        return device.ip, FAILED
+    finally:
+        if conn_manager is not None:
+            try:
+                if disabled and conn_manager.is_connected():
+                    conn_manager.conn.enable_device()
+            except Exception as e:
+                logging.warning(f'{device.ip} - Error al rehabilitar el dispositivo: {e}')
+            try:
+                if conn_manager.is_connected():
+                    conn_manager.disconnect()
+            except Exception:
+                pass
@@ -0,0 +1,219 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import time
+from collections import deque
+
+CAPACITY_SECTION = 'Capacity_config'
+LEVEL_CRITICAL = 'critical'
+LEVEL_WARNING = 'warning'
+LEVEL_PRIORITY = {LEVEL_CRITICAL: 0, LEVEL_WARNING: 1}
+TRAY_MESSAGE_LIMIT = 1000  # The tray reads a single 1024-byte packet
+SECONDS_PER_DAY = 86400
+
+class CapacityMonitor:
+    """
+    Tracks how full the attendance log of each device is and how fast it fills up.
+
+    Each collection already reads the record count and capacity of the device (the
+    probe of `read_device_sizes`), so `observe` adds a point to an in-memory series per
+    device without any extra request. The fill rate is the least squares slope of the
+    points since the last drop of the count (a clear starts a new segment), and the
+    projected time to full follows from it. `alerts` returns the devices above the
+    thresholds, most urgent first.
+
+    Settings (section `[Capacity_config]` of config.ini, all optional):
+        warning_percent / critical_percent: Fill levels that raise an alert.
+        warning_days / critical_days: Projected days to full that raise an alert.
+    """
+
+    def __init__(self, window: int = 64, warning_percent: float = 80, critical_percent: float = 95,
+                 warning_days: float = 7, critical_days: float = 1):
+        """
+        Args:
+            window (int): Points kept per device.
+            warning_percent (float): Fill percentage of a warning.
+            critical_percent (float): Fill percentage of a critical alert.
+            warning_days (float): Projected days to full of a warning.
+            critical_days (float): Projected days to full of a critical alert.
+        """
+        self.window = window
+        self.warning_percent = warning_percent
+        self.critical_percent = critical_percent
+        self.warning_days = warning_days
+        self.critical_days = critical_days
+        self.series: dict[str, deque] = {}
+        self.capacities: dict[str, int] = {}
+        self.points: dict[str, str] = {}
+        self.notified: dict[str, str] = {}
+
+    @classmethod
+    def from_config(cls, config) -> 'CapacityMonitor':
+        return cls(
+            warning_percent=config.getfloat(CAPACITY_SECTION, 'warning_percent', fallback=80),
+            critical_percent=config.getfloat(CAPACITY_SECTION, 'critical_percent', fallback=95),
+            warning_days=config.getfloat(CAPACITY_SECTION, 'warning_days', fallback=7),
+            critical_days=config.getfloat(CAPACITY_SECTION, 'critical_days', fallback=1),
+        )
+
+    def configure(self, other: 'CapacityMonitor'):
+        """
+        Takes the thresholds of another monitor (e.g. reloaded from config.ini), keeping the series.
+        """
+        self.warning_percent = other.warning_percent
+        self.critical_percent = other.critical_percent
+        self.warning_days = other.warning_days
+        self.critical_days = other.critical_days
+
+    def observe(self, ip: str, records: int, capacity: int = None, point: str = None, when: float = None):
+        """
+        Adds the record count of a device read at `when` (default: now).
+
+        Only the worker of the device writes its series, so no lock is needed.
+
+        Args:
+            ip (str): The device.
+            records (int): Attendance records on the device.
+            capacity (int, optional): Record capacity; the last known one is kept if None.
+            point (str, optional): Point of the device, for the alerts.
+        """
+        if records is None:
+            return
+        series = self.series.get(ip)
+        if series is None:
+            series = self.series.setdefault(ip, deque(maxlen=self.window))
+        if series and records < series[-1][1]:
+            series.clear()  # Cleared (or replaced) device: the previous points no longer apply
+        series.append((time.time() if when is None else when, records))
+        if capacity:
+            self.capacities[ip] = capacity
+        if point is not None:
+            self.points[ip] = point
+
+    def fill_rate(self, ip: str) -> float:
+        """
+        Returns the records added per day (least squares over the current segment), or
+        None with fewer than two points.
+        """
+        points = list(self.series.get(ip, ()))
+        if len(points) < 2:
+            return None
+        origin = points[0][0]
+        xs = [(moment - origin) / SECONDS_PER_DAY for moment, _ in points]
+        ys = [records for _, records in points]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        spread = sum((x - mean_x) ** 2 for x in xs)
+        if spread == 0:
+            return None
+        return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread
+
+    def status(self, ip: str, now: float = None) -> dict:
+        """
+        Returns the state of a device: records, capacity, fill percentage, fill rate per
+        day, projected days to full and alert level (None if below the thresholds).
+        """
+        series = self.series.get(ip)
+        if not series:
+            return None
+        moment, records = series[-1]
+        capacity = self.capacities.get(ip)
+        rate = self.fill_rate(ip)
+        fill = 100.0 * records / capacity if capacity else None
+        days_to_full = None
+        if capacity and rate and rate > 0:
+            elapsed = ((now or time.time()) - moment) / SECONDS_PER_DAY
+            days_to_full = max(0.0, (capacity - records) / rate - elapsed)
+        level = None
+        if fill is not None:
+            if fill >= self.critical_percent or (days_to_full is not None and days_to_full <= self.critical_days):
+                level = LEVEL_CRITICAL
+            elif fill >= self.warning_percent or (days_to_full is not None and days_to_full <= self.warning_days):
+                level = LEVEL_WARNING
+        return {
+            'ip': ip, 'point': self.points.get(ip), 'records': records, 'capacity': capacity,
+            'fill_percent': round(fill, 1) if fill is not None else None,
+            'rate_per_day': round(rate, 1) if rate is not None else None,
+            'days_to_full': round(days_to_full, 2) if days_to_full is not None else None,
+            'level': level, 'observed': moment,
+        }
+
+    def snapshot(self, now: float = None) -> list[dict]:
+        statuses = [self.status(ip, now) for ip in list(self.series)]
+        return [status for status in statuses if status is not None]
+
+    def alerts(self, now: float = None) -> list[dict]:
+        """
+        Returns the devices with an alert, critical first, then by projected time to full.
+        """
+        alerts = [status for status in self.snapshot(now) if status['level']]
+        return sorted(alerts, key=lambda status: (
+            LEVEL_PRIORITY[status['level']],
+            status['days_to_full'] if status['days_to_full'] is not None else float('inf'),
+            -(status['fill_percent'] or 0),
+        ))
+
+    def new_alerts(self, now: float = None) -> list[dict]:
+        """
+        Returns the alerts not notified yet or whose level rose since the last notification,
+        and marks them as notified. A device back below the thresholds can alert again.
+        """
+        alerts = self.alerts(now)
+        active = {status['ip'] for status in alerts}
+        for ip in list(self.notified):
+            if ip not in active:
+                del self.notified[ip]
+        fresh = []
+        for status in alerts:
+            previous = self.notified.get(status['ip'])
+            if previous is None or LEVEL_PRIORITY[status['level']] < LEVEL_PRIORITY[previous]:
+                fresh.append(status)
+            self.notified[status['ip']] = status['level']
+        return fresh
+
+def describe(status: dict) -> str:
+    text = f'{status["ip"]}'
+    if status.get('point'):
+        text += f' ({status["point"]})'
+    text += f': {status["fill_percent"]:.0f}% lleno'
+    if status.get('days_to_full') is not None:
+        text += f', se llena en {status["days_to_full"]:.1f} dias'
+    return text
+
+def tray_message(alerts: list[dict]) -> str:
+    """
+    Builds the JSON message of the tray icon for a list of alerts (most urgent first),
+    keeping as many devices as fit in one packet.
+    """
+    level = alerts[0]['level']
+    title = 'Memoria de marcaciones casi llena' if level == LEVEL_CRITICAL else 'Memoria de marcaciones en aumento'
+    lines = []
+    for position, status in enumerate(alerts):
+        candidate = lines + [describe(status)]
+        remaining = len(alerts) - position - 1
+        suffix = [f'y {remaining} mas'] if remaining else []
+        message = json.dumps({'type': 'capacity', 'level': level, 'title': title, 'text': '\n'.join(candidate + suffix)}, ensure_ascii=False)
+        if len(message.encode('utf-8')) > TRAY_MESSAGE_LIMIT and lines:
+            break
+        lines = candidate
+    remaining = len(alerts) - len(lines)
+    if remaining:
+        lines.append(f'y {remaining} mas')
+    return json.dumps({'type': 'capacity', 'level': level, 'title': title, 'text': '\n'.join(lines)}, ensure_ascii=False)
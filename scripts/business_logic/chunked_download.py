@@ -0,0 +1,287 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from struct import pack, unpack
+from scripts.common.utils.file_manager import find_root_directory
+
+DOWNLOADS_FOLDER = 'downloads'
+
+# Protocol constants (same values as zk.const)
+CMD_PREPARE_BUFFER = 1503
+CMD_DATA = 1501
+CMD_ATTLOG_RRQ = 13
+MAX_CHUNK_TCP = 0xFFC0
+MAX_CHUNK_UDP = 16 * 1024
+RECORD_SIZES = (40, 16, 8)
+VERIFY_BYTES = 64  # Bytes re-read at the start of the log to check a partial download is still valid
+
+class ChunkedDownloadError(Exception):
+    pass
+
+def read_last_record(conn_manager, records: int) -> str:
+    """
+    Reads only the newest attendance record of a connected device.
+
+    Runs the exchange of `ResumableAttendanceDownload` (`CMD_PREPARE_BUFFER`), then reads
+    a single chunk holding the last record instead of the whole log. Two logs with the
+    same record count and the same last record hold the same punches, which the count
+    alone cannot tell once the device is full and overwrites its oldest records.
+
+    Args:
+        conn_manager (ConnectionManager): A connected connection manager.
+        records (int): Records on the device, as read by `read_device_sizes`.
+
+    Returns:
+        str: The raw last record, in hexadecimal, or None if it could not be read.
+    """
+    zk = getattr(conn_manager, 'conn', None)
+    if not records or zk is None:
+        return None
+    try:
+        response = zk._ZK__send_command(CMD_PREPARE_BUFFER, pack('<bhii', 1, CMD_ATTLOG_RRQ, 0, 0), 1024)
+        if not response.get('status'):
+            return None
+        if response['code'] == CMD_DATA:
+            # Small log answered at once: not worth parsing here, it is downloaded anyway
+            zk.free_data()
+            return None
+        size = unpack('I', zk._ZK__data[1:5])[0]
+        record_size = (size - 4) // records if (size - 4) % records == 0 else None
+        if record_size not in RECORD_SIZES:
+            zk.free_data()
+            return None
+        record = zk._ZK__read_chunk(size - record_size, record_size)
+        zk.free_data()
+        return bytes(record).hex()
+    except Exception as e:
+        logging.debug(f'{getattr(conn_manager, "ip", "")} - No se pudo leer la ultima marcacion: {e}')
+        return None
+
+class ResumableAttendanceDownload:
+    """
+    Downloads the attendance log of a device in chunks, spooling each chunk to disk.
+
+    pyzk's `read_with_buffer` prepares the whole log on the device and reads it in
+    chunks, but keeps them in memory: a dropped connection loses everything. This class
+    runs the same exchange (`CMD_PREPARE_BUFFER` + one read per chunk) and appends each
+    chunk to `downloads/<ip>.part`. If the transfer is interrupted, the next attempt,
+    in the same run or in a later one, prepares the log again and continues from the
+    size of the spool file. The attendance log is append-only until it is cleared, so
+    the downloaded prefix stays valid. This is checked by re-reading its first bytes,
+    and a smaller log (a clear) discards the spool.
+
+    The buffer is parsed by the regular `ConnectionManager.get_attendances()`, which gets
+    the spooled buffer through a one-shot override of the connection's `read_with_buffer`,
+    so the records are formatted exactly like a regular download.
+
+    This uses pyzk's private helpers (`_ZK__send_command`, `_ZK__read_chunk`, `_ZK__data`),
+    because pyzk offers no public chunked API.
+    """
+
+    def __init__(self, conn_manager, ip: str, root: str = None, chunk_size: int = None, resume_attempts: int = 2):
+        """
+        Args:
+            conn_manager (ConnectionManager): A connected connection manager.
+            ip (str): IP address of the device, used to name the spool files.
+            root (str, optional): Directory that contains the `downloads` folder.
+            chunk_size (int, optional): Bytes per chunk, capped to pyzk's maximum for TCP or UDP.
+            resume_attempts (int): Reconnections tried in this run after a failed chunk.
+        """
+        self.conn_manager = conn_manager
+        self.ip = ip
+        self.chunk_size = chunk_size
+        self.resume_attempts = resume_attempts
+        folder = os.path.join(root or find_root_directory(), DOWNLOADS_FOLDER)
+        self.part_path = os.path.join(folder, f'{ip}.part')
+        self.meta_path = os.path.join(folder, f'{ip}.json')
+
+    @staticmethod
+    def has_partial(ip: str, root: str = None) -> bool:
+        """
+        Returns True if an interrupted download of the device is waiting to be resumed.
+        """
+        return os.path.exists(os.path.join(root or find_root_directory(), DOWNLOADS_FOLDER, f'{ip}.part'))
+
+    def get_attendances(self) -> list:
+        """
+        Downloads (or resumes) the attendance log and parses it.
+
+        Returns:
+            list[Attendance]: The records, as returned by `ConnectionManager.get_attendances()`.
+
+        Raises:
+            ChunkedDownloadError: If the transfer fails after every resume attempt. The
+                spool is kept for the next run.
+        """
+        attempt = 0
+        while True:
+            try:
+                buffer = self.__download()
+                break
+            except ChunkedDownloadError:
+                raise
+            except Exception as e:
+                attempt += 1
+                done = self.__spooled_bytes()
+                if attempt > self.resume_attempts:
+                    raise ChunkedDownloadError(f'{self.ip} - Descarga interrumpida en {done} bytes: {e}') from e
+                logging.warning(f'{self.ip} - Descarga interrumpida en {done} bytes, reanudando ({attempt}/{self.resume_attempts}): {e}')
+                self.__reconnect()
+
+        if buffer is None:
+            # The device answered with the whole log at once (small log), use the regular path
+            return self.conn_manager.get_attendances()
+
+        attendances = self.__parse(buffer)
+        self.discard()
+        return attendances
+
+    def discard(self):
+        """
+        Removes the spool files of the device.
+        """
+        for path in (self.part_path, self.meta_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def __download(self) -> bytes:
+        zk = self.conn_manager.conn
+        max_chunk = MAX_CHUNK_TCP if zk.tcp else MAX_CHUNK_UDP
+        chunk_size = min(self.chunk_size or max_chunk, max_chunk)
+
+        response = zk._ZK__send_command(CMD_PREPARE_BUFFER, pack('<bhii', 1, CMD_ATTLOG_RRQ, 0, 0), 1024)
+        if not response.get('status'):
+            raise ChunkedDownloadError(f'{self.ip} - El dispositivo no admite la lectura por bloques')
+        if response['code'] == CMD_DATA:
+            zk.free_data()
+            self.discard()
+            return None
+        size = unpack('I', zk._ZK__data[1:5])[0]
+
+        done = self.__prepare_spool(zk, size)
+        if done:
+            logging.info(f'{self.ip} - Reanudando descarga de marcaciones en {done}/{size} bytes')
+
+        with open(self.part_path, 'ab') as part:
+            while done < size:
+                length = min(chunk_size, size - done)
+                chunk = zk._ZK__read_chunk(done, length)
+                part.write(chunk)
+                part.flush()
+                done += len(chunk)
+        zk.free_data()
+
+        with open(self.part_path, 'rb') as part:
+            return part.read()
+
+    def __prepare_spool(self, zk, size: int) -> int:
+        """
+        Validates the spool of a previous attempt against the log just prepared on the device.
+
+        Returns:
+            int: Bytes that can be reused (0 if the download starts from scratch).
+        """
+        os.makedirs(os.path.dirname(self.part_path), exist_ok=True)
+        done = self.__spooled_bytes()
+        meta = self.__load_meta()
+        if done and meta and done <= size and meta.get('size', 0) <= size:
+            head = zk._ZK__read_chunk(0, min(VERIFY_BYTES, done))
+            with open(self.part_path, 'r+b') as part:
+                saved_head = part.read(len(head))
+                # The first 4 bytes hold the total size, which grows with new punches
+                if head[4:] == saved_head[4:]:
+                    part.seek(0)
+                    part.write(head[:4])
+                    self.__save_meta(size)
+                    return done
+            logging.info(f'{self.ip} - El registro del dispositivo cambio, se descarta la descarga parcial')
+        elif done:
+            logging.info(f'{self.ip} - El registro del dispositivo se redujo, se descarta la descarga parcial')
+        self.discard()
+        self.__save_meta(size)
+        return 0
+
+    def __parse(self, buffer: bytes) -> list:
+        zk = self.conn_manager.conn
+        records = self.__records_in(buffer, zk)
+        original_read_with_buffer = zk.read_with_buffer
+        original_read_sizes = zk.read_sizes
+
+        def read_with_buffer(command, fct=0, ext=0):
+            if command == CMD_ATTLOG_RRQ:
+                return buffer, len(buffer)
+            return original_read_with_buffer(command, fct, ext)
+
+        def read_sizes():
+            result = original_read_sizes()
+            # Punches received after the download must not change the record size of this buffer
+            zk.records = records
+            return result
+
+        # The connection may already carry instance overrides (e.g. a session capture): restore them after
+        previous = {name: vars(zk)[name] for name in ('read_with_buffer', 'read_sizes') if name in vars(zk)}
+        zk.read_with_buffer = read_with_buffer
+        zk.read_sizes = read_sizes
+        try:
+            return self.conn_manager.get_attendances()
+        finally:
+            del zk.read_with_buffer
+            del zk.read_sizes
+            for name, value in previous.items():
+                setattr(zk, name, value)
+
+    def __records_in(self, buffer: bytes, zk) -> int:
+        total_size = unpack('I', buffer[:4])[0]
+        zk.read_sizes()
+        expected = getattr(zk, 'records', 0) or 0
+        candidates = [total_size // size for size in RECORD_SIZES if total_size % size == 0]
+        if not candidates:
+            raise ChunkedDownloadError(f'{self.ip} - Tamaño de registro desconocido ({total_size} bytes)')
+        return min(candidates, key=lambda count: abs(count - expected))
+
+    def __reconnect(self):
+        try:
+            if self.conn_manager.is_connected():
+                self.conn_manager.disconnect()
+        except Exception:
+            pass
+        self.conn_manager.connect_with_retry()
+
+    def __spooled_bytes(self) -> int:
+        try:
+            return os.path.getsize(self.part_path)
+        except OSError:
+            return 0
+
+    def __load_meta(self) -> dict:
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+    def __save_meta(self, size: int):
+        with open(self.meta_path, 'w', encoding='utf-8') as meta_file:
+            json.dump({'size': size, 'updated': datetime.now().isoformat(timespec='seconds')}, meta_file)
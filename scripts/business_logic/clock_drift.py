@@ -0,0 +1,230 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from scripts.business_logic.device_state import DeviceStateStore
+
+BATTERY_SECTION = 'Battery_config'
+SECONDS_PER_DAY = 86400
+HISTORY_SIZE = 30  # Samples kept per device, for display only: the predictor never reads them
+MIN_ELAPSED_SECONDS = 6 * 3600  # The device clock has a 1 s resolution: shorter intervals give too noisy a rate
+
+def read_clock_drift(conn_manager) -> float:
+    """
+    Reads the clock of a connected device and returns how far ahead (positive) or behind
+    (negative) of the local clock it is, in seconds. A single protocol exchange.
+
+    Returns:
+        float: The drift, or None if the time could not be read.
+    """
+    zk = getattr(conn_manager, 'conn', None)
+    if zk is None or not hasattr(zk, 'get_time'):
+        return None
+    try:
+        before = time.time()
+        device_time = zk.get_time()
+        local_time = (before + time.time()) / 2  # The device answered somewhere in the round trip
+        return device_time.timestamp() - local_time
+    except Exception as e:
+        logging.debug(f'{getattr(conn_manager, "ip", "")} - No se pudo leer la hora del dispositivo: {e}')
+        return None
+
+class ClockDriftStore(DeviceStateStore):
+    """
+    Per-device history of clock drift and an online predictor of failing RTC batteries.
+
+    Every session reads the device clock once, right before it is synchronized, so the
+    drift found is what accumulated since the previous sync: dividing it by the elapsed
+    time gives the drift rate (seconds per day). A healthy clock keeps a small, stable
+    rate; a weakening RTC battery shows up as a rate that grows. The predictor fits a
+    line to the rate over time by weighted least squares with exponential forgetting:
+    each sample only updates five running sums, so the update is O(1) and the history
+    is never reprocessed. A device is flagged when its current rate, or the rate
+    projected `horizon_days` ahead, exceeds `max_rate`, or when its clock jumped by
+    more than `reset_hours` (the clock lost its time, the usual sign of a dead battery).
+
+    Settings (section `[Battery_config]` of config.ini, all optional):
+        drift_sampling: Reads the device clock before each sync (one extra exchange).
+        drift_max_rate: Drift rate, in seconds per day, considered failing.
+        drift_horizon_days: Days ahead the trend is projected.
+        drift_forgetting: Weight kept by older samples at each new one (0-1).
+        drift_reset_hours: Clock jump considered a lost time.
+    """
+
+    def __init__(self, root: str = None, max_rate: float = 30.0, horizon_days: float = 7.0,
+                 forgetting: float = 0.9, reset_hours: float = 12.0):
+        super().__init__('clock_drift', root)
+        self.max_rate = max_rate
+        self.horizon_days = horizon_days
+        self.forgetting = forgetting
+        self.reset_hours = reset_hours
+        self.save_lock = threading.Lock()
+
+    def configure(self, config):
+        """
+        Reads the settings of the `[Battery_config]` section of a loaded ConfigParser.
+        """
+        self.max_rate = config.getfloat(BATTERY_SECTION, 'drift_max_rate', fallback=30.0)
+        self.horizon_days = config.getfloat(BATTERY_SECTION, 'drift_horizon_days', fallback=7.0)
+        self.forgetting = config.getfloat(BATTERY_SECTION, 'drift_forgetting', fallback=0.9)
+        self.reset_hours = config.getfloat(BATTERY_SECTION, 'drift_reset_hours', fallback=12.0)
+
+    def add_sample(self, ip: str, drift: float, now: float = None) -> dict:
+        """
+        Adds the drift read before a sync and updates the prediction of the device.
+
+        Args:
+            ip (str): The device.
+            drift (float): Seconds the device clock is ahead of the local one.
+            now (float, optional): Time of the reading (epoch seconds).
+
+        Returns:
+            dict: The entry of the device, with `rate`, `predicted_rate`, `days_to_limit`,
+            `at_risk` and `reason`.
+        """
+        now = time.time() if now is None else now
+        entry = dict(self.get(ip) or {})
+        history = list(entry.get('history', []))
+        last_sync = entry.get('last_sync')
+        rate = None
+        reason = None
+        if abs(drift) >= self.reset_hours * 3600:
+            reason = f'la hora del reloj difiere {drift / 3600:.1f} h (perdio la hora)'
+        elif last_sync is not None and now - last_sync >= MIN_ELAPSED_SECONDS:
+            rate = drift / ((now - last_sync) / SECONDS_PER_DAY)
+            self.__fit(entry, now / SECONDS_PER_DAY, rate)
+        history.append([round(now), round(drift, 1), round(rate, 2) if rate is not None else None])
+        entry['history'] = history[-HISTORY_SIZE:]
+        entry['drift'] = round(drift, 1)
+        entry['sampled'] = datetime.fromtimestamp(now).isoformat(timespec='seconds')
+        self.__predict(entry, now / SECONDS_PER_DAY, rate, reason)
+        self.set(ip, entry)
+        return entry
+
+    def mark_synced(self, ip: str, now: float = None):
+        """
+        Records that the device clock was just set: the next drift accumulates from here.
+        """
+        self.update(ip, last_sync=time.time() if now is None else now)
+
+    def __fit(self, entry: dict, day: float, rate: float):
+        # Exponentially weighted sums of (x, y) = (day, rate); x is taken relative to the
+        # first sample so the sums stay well conditioned
+        origin = entry.setdefault('origin', day)
+        x = day - origin
+        sums = entry.get('sums') or [0.0, 0.0, 0.0, 0.0, 0.0]
+        weight, sum_x, sum_y, sum_xx, sum_xy = (value * self.forgetting for value in sums)
+        entry['sums'] = [weight + 1, sum_x + x, sum_y + rate, sum_xx + x * x, sum_xy + x * rate]
+        entry['samples'] = entry.get('samples', 0) + 1
+
+    def __predict(self, entry: dict, day: float, rate: float, reason: str):
+        entry['rate'] = round(rate, 2) if rate is not None else entry.get('rate')
+        entry['predicted_rate'] = None
+        entry['days_to_limit'] = None
+        weight, sum_x, sum_y, sum_xx, sum_xy = entry.get('sums') or [0.0] * 5
+        if reason is None and entry.get('samples', 0) >= 3:
+            denominator = weight * sum_xx - sum_x * sum_x
+            if denominator > 1e-9:
+                slope = (weight * sum_xy - sum_x * sum_y) / denominator
+                intercept = (sum_y - slope * sum_x) / weight
+                x = day - entry['origin']
+                current = intercept + slope * x
+                projected = current + slope * self.horizon_days
+                entry['predicted_rate'] = round(projected, 2)
+                if slope and abs(current) < self.max_rate:
+                    limit = self.max_rate if slope > 0 else -self.max_rate
+                    days = (limit - current) / slope
+                    entry['days_to_limit'] = round(days, 1) if days > 0 else None
+                if abs(current) >= self.max_rate:
+                    reason = f'deriva de {current:.0f} s/dia'
+                elif abs(projected) >= self.max_rate:
+                    reason = f'deriva en aumento: {current:.0f} s/dia, {projected:.0f} s/dia en {self.horizon_days:.0f} dias'
+        elif reason is None and rate is not None and abs(rate) >= self.max_rate:
+            reason = f'deriva de {rate:.0f} s/dia'
+        entry['at_risk'] = reason is not None
+        entry['reason'] = reason
+
+    def at_risk(self) -> dict[str, dict]:
+        return {ip: entry for ip, entry in self.entries.items() if entry.get('at_risk')}
+
+    def save(self):
+        with self.save_lock:
+            super().save()
+
+def sample_clock_drift(store: ClockDriftStore, conn_manager, device, record: dict = None) -> dict:
+    """
+    Reads the drift of a connected device before its clock is set and adds it to the store,
+    logging when the device becomes at risk of a failing battery.
+
+    Returns:
+        dict: The entry of the device, or None if its time could not be read.
+    """
+    drift = read_clock_drift(conn_manager)
+    if drift is None:
+        return None
+    was_at_risk = (store.get(device.ip) or {}).get('at_risk')
+    entry = store.add_sample(device.ip, drift)
+    if record is not None:
+        record['drift'] = entry['drift']
+        if entry['at_risk']:
+            record['battery_risk'] = True
+    if entry['at_risk'] and not was_at_risk:
+        logging.warning(f'{device.ip} - Posible falla de la pila del reloj ({device.model_name}, {device.point}): {entry["reason"]}')
+    return entry
+
+def main(argv=None):
+    """
+    Shows the clock drift and battery prediction of the devices.
+
+    Usage:
+        python -m scripts.business_logic.clock_drift show
+        python -m scripts.business_logic.clock_drift show --at-risk --json
+    """
+    from scripts import config
+    from scripts.common.utils.file_manager import find_root_directory
+    parser = argparse.ArgumentParser(description='Deriva del reloj y prediccion de falla de pila')
+    parser.add_argument('--root', help='Directorio raiz (por defecto, el de la aplicacion)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show_parser = subparsers.add_parser('show', help='Muestra la deriva de cada dispositivo')
+    show_parser.add_argument('--at-risk', action='store_true', help='Solo dispositivos con riesgo de falla de pila')
+    show_parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    root = args.root or find_root_directory()
+    config.read(os.path.join(root, 'config.ini'))
+    store = ClockDriftStore(root)
+    store.configure(config)
+    entries = store.at_risk() if args.at_risk else store.entries
+    if args.json:
+        print(json.dumps(entries, indent=2, ensure_ascii=False))
+        return 0
+    for ip, entry in sorted(entries.items()):
+        print(f'{ip}\tderiva {entry.get("drift")} s\t{entry.get("rate")} s/dia\tproyectada {entry.get("predicted_rate")} s/dia\t'
+              f'{"RIESGO: " + entry["reason"] if entry.get("at_risk") else "ok"}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+import logging
+import socket
+import sys
+import threading
+import time
+
+COMMAND_HOST = 'localhost'
+COMMAND_PORT = 5001  # The tray listens on 5000, the service listens for commands on 5001
+
+class RunRequest:
+    """
+    Request to collect the attendances of a set of devices right away.
+
+    An empty request (no IPs and no points) targets every active device.
+    """
+
+    def __init__(self, ips=None, points=None, origin='cli'):
+        """
+        Args:
+            ips (iterable[str], optional): IP addresses of the target devices.
+            points (iterable[str], optional): Points (branches) of the target devices.
+            origin (str): Who requested the run, for the logs.
+        """
+        self.ips = frozenset(ips or ())
+        self.points = frozenset(points or ())
+        self.origin = origin
+        self.requested_at = time.time()
+
+    def is_full_run(self) -> bool:
+        return not self.ips and not self.points
+
+    def covers(self, other: 'RunRequest') -> bool:
+        """
+        Returns True if every device targeted by `other` is also targeted by this request.
+        """
+        return self.is_full_run() or (other.ips <= self.ips and other.points <= self.points and not other.is_full_run())
+
+    def to_dict(self) -> dict:
+        return {'ips': sorted(self.ips), 'points': sorted(self.points), 'origin': self.origin}
+
+    def __repr__(self):
+        return f'RunRequest(ips={sorted(self.ips)}, points={sorted(self.points)}, origin={self.origin})'
+
+class RunRequestQueue:
+    """
+    Queue of pending on-demand runs.
+
+    A request already covered by a pending one is not queued again, so
+    repeated clicks or commands never trigger duplicated runs.
+    """
+
+    def __init__(self):
+        self.pending: list[RunRequest] = []
+        self.condition = threading.Condition()
+        self.woken = False
+
+    def put(self, request: RunRequest) -> bool:
+        """
+        Queues a request unless a pending request already covers it.
+
+        Args:
+            request (RunRequest): The request to queue.
+
+        Returns:
+            bool: True if the request was queued, False if it was merged into a pending one.
+        """
+        with self.condition:
+            if any(pending.covers(request) for pending in self.pending):
+                return False
+            # A new full run makes every pending targeted run redundant
+            self.pending = [pending for pending in self.pending if not request.covers(pending)]
+            self.pending.append(request)
+            self.condition.notify_all()
+            return True
+
+    def get(self, timeout: float):
+        """
+        Waits up to `timeout` seconds for a request.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            RunRequest: The oldest pending request, or None if the wait timed out or `wake` was called.
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while not self.pending and not self.woken:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+            self.woken = False
+            return self.pending.pop(0) if self.pending else None
+
+    def wake(self):
+        """
+        Interrupts the current `get`, used when the service is stopping.
+        """
+        with self.condition:
+            self.woken = True
+            self.condition.notify_all()
+
+    def __len__(self):
+        with self.condition:
+            return len(self.pending)
+
+# Listens for JSON commands from the tray or the command line on a local TCP port.
+class CommandServer:
+    def __init__(self, handler, host=COMMAND_HOST, port=COMMAND_PORT):
+        """
+        Args:
+            handler (callable): Receives the command (dict) and returns the response (dict).
+            host (str): Interface to listen on. Defaults to 'localhost', commands are never accepted from the network.
+            port (int): The port number to listen on.
+        """
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self):
+        """
+        Binds the socket and starts serving commands in a background thread.
+        """
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((self.host, self.port))
+        self.server.listen(5)
+        thread = threading.Thread(target=self.serve_forever, name='CommandServer', daemon=True)
+        thread.start()
+
+    def stop(self):
+        if self.server:
+            self.server.close()
+            self.server = None
+
+    def serve_forever(self):
+        logging.debug(f'Escuchando comandos en {self.host}:{self.port}')
+        while self.server:
+            try:
+                client, addr = self.server.accept()
+            except OSError:
+                break
+            try:
+                with client:
+                    client.settimeout(5)
+                    request = json.loads(read_message(client))
+                    logging.debug(f'Comando recibido: {request}')
+                    response = self.handler(request)
+                    client.sendall((json.dumps(response) + '\n').encode('utf-8'))
+            except Exception as e:
+                logging.error(f'Error al procesar el comando: {e}')
+
+def read_message(connection: socket.socket) -> str:
+    """
+    Reads a newline terminated message from a socket.
+    """
+    chunks = []
+    while True:
+        data = connection.recv(4096)
+        if not data:
+            break
+        chunks.append(data)
+        if data.endswith(b'\n'):
+            break
+    return b''.join(chunks).decode('utf-8')
+
+def send_command(command: dict, host=COMMAND_HOST, port=COMMAND_PORT, timeout=5.0) -> dict:
+    """
+    Sends a command to the running service and returns its response.
+
+    Args:
+        command (dict): The command, e.g. {"command": "collect", "ips": ["10.0.0.5"]}.
+        host (str): The host where the service listens.
+        port (int): The port where the service listens.
+        timeout (float): Seconds to wait for the connection and the response.
+
+    Returns:
+        dict: The response of the service.
+
+    Raises:
+        OSError: If the service is not reachable.
+    """
+    with socket.create_connection((host, port), timeout=timeout) as client:
+        client.sendall((json.dumps(command) + '\n').encode('utf-8'))
+        return json.loads(read_message(client))
+
+def main(argv: list[str] = None):
+    """
+    Command line entry point to send commands to the running service.
+
+    Examples:
+        python -m scripts.business_logic.command_channel collect --ip 10.0.0.5 --ip 10.0.0.6
+        python -m scripts.business_logic.command_channel collect --point "Sucursal Centro"
+        python -m scripts.business_logic.command_channel status
+        python -m scripts.business_logic.command_channel next --count 10
+        python -m scripts.business_logic.command_channel capacity
+        python -m scripts.business_logic.command_channel --site Norte collect --point "Sucursal Norte"
+        python -m scripts.business_logic.command_channel sites
+    """
+    parser = argparse.ArgumentParser(description='Envia comandos al servicio en ejecucion')
+    parser.add_argument('--port', type=int, default=COMMAND_PORT, help='Puerto de comandos del servicio')
+    parser.add_argument('--site', help='En modo de varios sitios, sitio al que se envia el comando')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    collect_parser = subparsers.add_parser('collect', help='Obtener marcaciones ahora')
+    collect_parser.add_argument('--ip', action='append', default=[], help='IP del dispositivo (repetible)')
+    collect_parser.add_argument('--point', action='append', default=[], help='Punto de marcacion (repetible)')
+    subparsers.add_parser('status', help='Estado del servicio')
+    next_parser = subparsers.add_parser('next', help='Proximas tareas programadas y sus dispositivos')
+    next_parser.add_argument('--count', type=int, default=5, help='Cantidad de ejecuciones')
+    subparsers.add_parser('capacity', help='Ocupacion de la memoria de marcaciones de cada dispositivo')
+    subparsers.add_parser('sites', help='Sitios del servicio y su uso de las sesiones compartidas')
+    args = parser.parse_args(argv)
+
+    command = {'command': args.command}
+    if args.command == 'collect':
+        command.update({'ips': args.ip, 'points': args.point, 'origin': 'cli'})
+    elif args.command == 'next':
+        command['count'] = args.count
+    if args.site:
+        command['site'] = args.site
+    try:
+        response = send_command(command, port=args.port)
+    except OSError as e:
+        print(f'No se pudo conectar con el servicio: {e}', file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(response, indent=2, ensure_ascii=False))
+
+if __name__ == '__main__':
+    main()
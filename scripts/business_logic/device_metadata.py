@@ -0,0 +1,253 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from scripts.business_logic.device_probe import SIZE_FIELDS, read_device_sizes
+from scripts.business_logic.device_state import DeviceStateStore
+from scripts.business_logic.root_files import INVENTORY_LOCK
+
+DEFAULT_TTL_HOURS = 168
+SAVE_LOCK = threading.Lock()  # The collection and the background inventory refresh save the same file
+# Fields written together, with the timestamp that dates them
+FIELD_GROUPS = {
+    'refreshed': ('model_name', 'serial', 'firmware', 'platform', 'point'),
+    'sizes_read': SIZE_FIELDS,
+}
+
+class DeviceMetadataCache(DeviceStateStore):
+    """
+    Caches, per device, metadata that almost never changes: model name, serial number,
+    firmware and platform, together with the last record and user counters read.
+
+    The collection run reads the model name from here while the entry is younger
+    than `ttl_hours`, so the device is only asked for it (through
+    `ConnectionManager.update_device_name`) once per TTL instead of on every run.
+    `refresh_inventory` refreshes the whole fleet in parallel.
+
+    The service and the command line may update the cache at the same time, each from
+    its own copy in memory. `save` therefore reloads the file and applies only the fields
+    changed since this copy was loaded, so neither overwrites the entries refreshed by
+    the other; a field dated older than the one on disk is not applied.
+    """
+
+    def __init__(self, root: str = None, ttl_hours: float = DEFAULT_TTL_HOURS):
+        self.changes: dict[str, dict] = {}
+        super().__init__('device_metadata', root)
+        self.ttl_hours = ttl_hours
+        self.save_lock = SAVE_LOCK
+
+    def load(self):
+        super().load()
+        self.changes = {}
+
+    def update(self, ip: str, **values):
+        super().update(ip, **values)
+        self.changes.setdefault(ip, {}).update(values)
+
+    def is_fresh(self, ip: str, now: datetime = None) -> bool:
+        """
+        Returns True if the metadata of the device was refreshed within the TTL.
+        """
+        entry = self.get(ip)
+        if not entry or not entry.get('refreshed') or not entry.get('model_name'):
+            return False
+        now = now or datetime.now()
+        return now - datetime.fromisoformat(entry['refreshed']) < timedelta(hours=self.ttl_hours)
+
+    def model_name(self, ip: str) -> str:
+        entry = self.get(ip) or {}
+        return entry.get('model_name')
+
+    def record_sizes(self, ip: str, sizes: dict):
+        """
+        Stores the counters already read by the probe of a collection, without extra requests.
+        """
+        if sizes:
+            self.update(ip, **{field: sizes.get(field) for field in SIZE_FIELDS}, sizes_read=datetime.now().isoformat(timespec='seconds'))
+
+    def refresh(self, conn_manager, device, sizes: dict = None) -> dict:
+        """
+        Reads the metadata of a connected device and stores it.
+
+        The model name goes through `ConnectionManager.update_device_name`, which also
+        updates it in the device inventory, under the lock shared by every site of the
+        process (see `root_files`). Serial number, firmware and platform are
+        optional: a device that does not answer one of them keeps the cached value.
+
+        Args:
+            conn_manager (ConnectionManager): A connected connection manager.
+            device (Device): The device; its `model_name` is updated.
+            sizes (dict, optional): Counters already read; read from the device otherwise.
+
+        Returns:
+            dict: The stored entry.
+        """
+        with INVENTORY_LOCK:
+            values = {'model_name': conn_manager.update_device_name()}
+        device.model_name = values['model_name']
+        zk = getattr(conn_manager, 'conn', None)
+        for field, method in (('serial', 'get_serialnumber'), ('firmware', 'get_firmware_version'), ('platform', 'get_platform')):
+            try:
+                values[field] = getattr(zk, method)()
+            except Exception as e:
+                logging.debug(f'{device.ip} - No se pudo leer {field}: {e}')
+        values['point'] = device.point
+        values['refreshed'] = datetime.now().isoformat(timespec='seconds')
+        self.update(device.ip, **values)
+        self.record_sizes(device.ip, sizes or read_device_sizes(conn_manager))
+        return self.get(device.ip)
+
+    def save(self):
+        # Several workers of the inventory refresh, or two caches of the same process, may save at the same time
+        with self.save_lock:
+            if not self.dirty:
+                return
+            changes, self.changes = self.changes, {}
+            DeviceStateStore.load(self)
+            for ip, values in changes.items():
+                self.__merge(ip, values)
+            super().save()
+
+    def __merge(self, ip: str, values: dict):
+        entry = dict(self.get(ip) or {})
+        for stamp, fields in FIELD_GROUPS.items():
+            if stamp in values and (entry.get(stamp) or '') > (values[stamp] or ''):
+                values = {field: value for field, value in values.items() if field != stamp and field not in fields}
+        entry.update(values)
+        self.set(ip, entry)
+
+def refresh_inventory(devices: list, cache: DeviceMetadataCache, workers: int = 16, force: bool = False, connect=None, root: str = None, dispatch=None) -> dict:
+    """
+    Refreshes the metadata of many devices in parallel.
+
+    Args:
+        devices (list[Device]): Devices to refresh.
+        cache (DeviceMetadataCache): The cache to update; it is saved once at the end.
+        workers (int): Devices contacted at the same time.
+        force (bool): Also refresh the devices whose entry is still fresh.
+        connect (callable, optional): Builds a connected connection manager for a device.
+            Defaults to a `ConnectionManager` with retries and the transport profile of the
+            device (see `TransportProfiles`).
+        root (str, optional): Root directory of the transport profiles. Defaults to the
+            root directory of the application.
+        dispatch (callable, optional): Returns the context manager a device must hold while
+            it is contacted (see `DispatchPolicy.budgets`), so a refresh running next to a
+            collection respects its concurrency budgets.
+
+    Returns:
+        dict: Lists of IPs `refreshed`, `fresh` (skipped) and `failed`.
+    """
+    if connect is None:
+        from scripts.business_logic.transport_profiles import TransportProfiles, connect_with_profile
+        profiles = TransportProfiles(root)
+
+        def connect(device):
+            return connect_with_profile(device, profiles.resolve(device))
+
+    result = {'refreshed': [], 'fresh': [], 'failed': []}
+    pending = []
+    for device in devices:
+        if not force and cache.is_fresh(device.ip):
+            result['fresh'].append(device.ip)
+        else:
+            pending.append(device)
+
+    def refresh_one(device):
+        conn_manager = None
+        try:
+            conn_manager = connect(device)
+            cache.refresh(conn_manager, device)
+            return device.ip, True
+        except Exception as e:
+            logging.warning(f'{device.ip} - No se pudo actualizar el inventario: {e}')
+            return device.ip, False
+        finally:
+            try:
+                if conn_manager is not None and conn_manager.is_connected():
+                    conn_manager.disconnect()
+            except Exception:
+                pass
+
+    def refresh_in_slot(device):
+        with dispatch(device) if dispatch is not None else nullcontext():
+            return refresh_one(device)
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='inventory') as executor:
+            for ip, ok in executor.map(refresh_in_slot, pending):
+                result['refreshed' if ok else 'failed'].append(ip)
+    cache.save()
+    logging.info(f'Inventario: {len(result["refreshed"])} actualizados, {len(result["fresh"])} vigentes, {len(result["failed"])} con error')
+    return result
+
+def main(argv=None):
+    """
+    Command line access to the device metadata cache.
+
+    Usage:
+        python -m scripts.business_logic.device_metadata refresh --workers 16
+        python -m scripts.business_logic.device_metadata refresh --force --point "Sucursal Centro"
+        python -m scripts.business_logic.device_metadata show --json
+    """
+    from scripts import config
+    from scripts.common.utils.file_manager import find_root_directory
+    parser = argparse.ArgumentParser(description='Cache de metadatos de los dispositivos')
+    parser.add_argument('--root', help='Directorio raiz (por defecto, el de la aplicacion)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    refresh_parser = subparsers.add_parser('refresh', help='Actualiza el inventario de los dispositivos activos')
+    refresh_parser.add_argument('--workers', type=int, default=16)
+    refresh_parser.add_argument('--force', action='store_true', help='Incluye las entradas vigentes')
+    refresh_parser.add_argument('--ip', action='append')
+    refresh_parser.add_argument('--point', action='append')
+    show_parser = subparsers.add_parser('show', help='Muestra el inventario guardado')
+    show_parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    root = args.root or find_root_directory()
+    config.read(os.path.join(root, 'config.ini'))
+    cache = DeviceMetadataCache(root, config.getfloat('Device_config', 'metadata_ttl_hours', fallback=DEFAULT_TTL_HOURS))
+
+    if args.command == 'refresh':
+        from scripts.business_logic.service_manager import select_devices
+        from scripts.common.business_logic.device_manager import get_devices_info
+        devices = select_devices(get_devices_info(), args.ip, args.point)
+        result = refresh_inventory(devices, cache, args.workers, args.force, root=root)
+        for ip in result['failed']:
+            print(f'Error: {ip}')
+        print(f'{len(result["refreshed"])} actualizados, {len(result["fresh"])} vigentes, {len(result["failed"])} con error')
+        return 1 if result['failed'] else 0
+
+    if args.json:
+        print(json.dumps(cache.entries, indent=2, ensure_ascii=False))
+    else:
+        for ip, entry in sorted(cache.entries.items()):
+            print(f'{ip}\t{entry.get("point", "")}\t{entry.get("model_name", "")}\t{entry.get("serial", "")}\t'
+                  f'{entry.get("firmware", "")}\t{entry.get("records", "")}/{entry.get("rec_cap", "")}\t{entry.get("refreshed", "")}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
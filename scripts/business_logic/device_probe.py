@@ -0,0 +1,111 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+from datetime import datetime
+from scripts.business_logic.device_state import DeviceStateStore
+
+RECORD_SIZE = 40  # Bytes per attendance record in the protocol of current firmwares
+SIZE_FIELDS = ('records', 'rec_cap', 'users', 'users_cap', 'fingers', 'fingers_cap')
+
+def read_device_sizes(conn_manager) -> dict:
+    """
+    Reads the record counters of a connected device with a single protocol exchange.
+
+    Uses `read_sizes()` of the pyzk connection held by the `ConnectionManager`, which
+    returns the number of attendance records, users and fingerprints and their capacities
+    without transferring any record.
+
+    Args:
+        conn_manager (ConnectionManager): A connected connection manager.
+
+    Returns:
+        dict: The counters (see `SIZE_FIELDS`), or None if they could not be read.
+    """
+    zk = getattr(conn_manager, 'conn', None)
+    if zk is None or not hasattr(zk, 'read_sizes'):
+        return None
+    try:
+        zk.read_sizes()
+        return {field: getattr(zk, field, None) for field in SIZE_FIELDS}
+    except Exception as e:
+        logging.warning(f'{getattr(conn_manager, "ip", "")} - No se pudo leer la cantidad de registros: {e}')
+        return None
+
+class AttendanceCursorStore(DeviceStateStore):
+    """
+    Remembers, per device, how many attendance records were on the device after the last
+    successful collection.
+
+    If the device reports the same count in the next run, nothing was punched since then
+    and the download, format and write phases can be skipped. After a clear the cursor is
+    0, so an empty device is skipped too.
+
+    A full device keeps its count at its capacity while it overwrites its oldest records,
+    so it is never skipped. The newest record of the log is kept with the count, when it
+    could be read (see `read_last_record`), and must also match. It is only read when the
+    count matches, so a device whose count changed costs no extra exchange; a cursor saved
+    after such a download gets its last record the first time the device is skipped.
+    """
+
+    def __init__(self, root: str = None):
+        super().__init__('attendance_cursors', root)
+
+    def records(self, ip: str) -> int:
+        """
+        Returns the record count stored after the last successful collection, or None.
+        """
+        cursor = self.get(ip)
+        return cursor.get('records') if cursor else None
+
+    def unchanged(self, ip: str, records: int, rec_cap: int = None, last_record: str = None) -> bool:
+        """
+        Returns True if the device still holds exactly the records of the last collection.
+
+        Args:
+            ip (str): IP address of the device.
+            records (int): Current number of attendance records on the device.
+            rec_cap (int, optional): Record capacity of the device.
+            last_record (str, optional): Current last record of the device.
+        """
+        cursor = self.get(ip)
+        if records is None or cursor is None or cursor.get('records') != records:
+            return False
+        if rec_cap and records >= rec_cap:
+            return False
+        return cursor.get('last_record') is None or cursor['last_record'] == last_record
+
+    def advance(self, ip: str, records: int, last_record: str = None):
+        """
+        Stores the number of records left on the device after a successful collection.
+
+        Args:
+            ip (str): IP address of the device.
+            records (int): Records remaining on the device (0 after a clear).
+            last_record (str, optional): Last of those records (see `read_last_record`).
+        """
+        self.update(ip, records=records, last_record=last_record, updated=datetime.now().isoformat(timespec='seconds'))
+
+    def remember_last_record(self, ip: str, last_record: str):
+        """
+        Stores the last record of a skipped device whose cursor does not have one yet.
+        """
+        cursor = self.get(ip)
+        if last_record and cursor is not None and cursor.get('last_record') is None:
+            self.update(ip, last_record=last_record)
@@ -0,0 +1,123 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+from datetime import datetime
+from statistics import median
+from scripts.business_logic.run_journal import RunJournal, recent_months
+
+DEFAULT_DURATION = 30.0  # Seconds assumed for a device when the fleet has no history at all
+MIN_VOLUME_FACTOR = 0.25
+MAX_VOLUME_FACTOR = 4.0
+FLAKY_CONSECUTIVE_FAILURES = 3
+FLAKY_FAILURE_RATIO = 0.5
+FLAKY_MIN_RUNS = 4
+
+class DevicePrioritizer:
+    """
+    Orders the devices of a run so the longest jobs start first.
+
+    The expected duration of each device comes from the run journal: the moving
+    average of its successful runs, scaled by the expected record volume (time
+    since the last clear compared with the usual interval between runs). Devices
+    are sorted by expected duration, longest first (LPT scheduling), which keeps
+    slow WAN clocks from becoming the tail of the run. Known flaky devices
+    (several consecutive failures or a high failure ratio) are deferred to the
+    end so they never delay the healthy ones.
+    """
+
+    def __init__(self, journal: RunJournal, months: int = 3):
+        """
+        Args:
+            journal (RunJournal): Journal with the history of previous runs.
+            months (int): Number of months of history considered.
+        """
+        self.journal = journal
+        self.months = months
+
+    def order(self, devices: list, now: datetime = None) -> list:
+        """
+        Returns the devices in the order they should be dispatched.
+
+        Args:
+            devices (list[Device]): The devices of the run.
+            now (datetime, optional): Reference time. Defaults to the current time.
+
+        Returns:
+            list[Device]: The same devices, healthy ones by expected duration
+            (longest first) followed by the flaky ones.
+        """
+        now = now or datetime.now()
+        try:
+            history = self.journal.merged_index(recent_months(self.months, now))
+        except Exception as e:
+            logging.error(f'Error al leer el historial para priorizar dispositivos: {e}')
+            return list(devices)
+
+        estimates = {device.ip: self.expected_duration(history.get(device.ip), now) for device in devices}
+        known = [estimate for estimate in estimates.values() if estimate is not None]
+        default = median(known) if known else DEFAULT_DURATION
+
+        def sort_key(device):
+            estimate = estimates[device.ip]
+            return (self.is_flaky(history.get(device.ip)), -(estimate if estimate is not None else default))
+
+        # sorted() is stable, devices with equal keys keep their inventory order
+        ordered = sorted(devices, key=sort_key)
+        logging.debug('Orden de dispositivos: ' + ', '.join(
+            f'{device.ip} ({estimates[device.ip] if estimates[device.ip] is not None else default:.1f}s)' for device in ordered
+        ))
+        return ordered
+
+    def expected_duration(self, entry: dict, now: datetime):
+        """
+        Estimates the duration of the next run of a device.
+
+        Args:
+            entry (dict): Aggregates of the device in the run journal, or None.
+            now (datetime): Reference time.
+
+        Returns:
+            float: Expected seconds, or None if the device has no successful run.
+        """
+        if not entry or entry.get('ewma_duration') is None:
+            return None
+        expected = entry['ewma_duration']
+        interval = entry.get('ewma_interval_hours')
+        last_clear = entry.get('last_clear')
+        # Devices whose log is cleared download only the records since the last clear
+        if interval and last_clear:
+            hours_since_clear = (now - datetime.fromisoformat(last_clear)).total_seconds() / 3600
+            factor = min(MAX_VOLUME_FACTOR, max(MIN_VOLUME_FACTOR, hours_since_clear / interval))
+            expected *= factor
+        return expected
+
+    def is_flaky(self, entry: dict) -> bool:
+        """
+        Returns True if the history of a device shows it usually fails.
+
+        Args:
+            entry (dict): Aggregates of the device in the run journal, or None.
+        """
+        if not entry:
+            return False
+        if entry.get('consecutive_failures', 0) >= FLAKY_CONSECUTIVE_FAILURES:
+            return True
+        runs = entry.get('runs', 0)
+        return runs >= FLAKY_MIN_RUNS and entry.get('failures', 0) / runs >= FLAKY_FAILURE_RATIO
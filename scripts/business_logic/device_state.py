@@ -0,0 +1,92 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import logging
+import os
+from scripts.common.utils.file_manager import find_root_directory
+
+STATE_FOLDER = 'state'
+
+class DeviceStateStore:
+    """
+    Small persistent key-value store with one JSON entry per device IP.
+
+    The whole store is kept in memory while a run is in progress and written
+    back with `save()`, atomically (temporary file + rename), so a crash never
+    leaves a truncated file behind.
+    """
+
+    def __init__(self, name: str, root: str = None):
+        """
+        Args:
+            name (str): Name of the store, used as the file name (`state/<name>.json`).
+            root (str, optional): Directory that contains the `state` folder.
+                Defaults to the root directory of the application.
+        """
+        self.path = os.path.join(root or find_root_directory(), STATE_FOLDER, f'{name}.json')
+        self.entries: dict[str, dict] = {}
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """
+        Loads the store from disk, starting empty if the file is missing or damaged.
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as state_file:
+                self.entries = json.load(state_file)
+        except FileNotFoundError:
+            self.entries = {}
+        except ValueError as e:
+            logging.warning(f'Estado {self.path} corrupto, se descarta: {e}')
+            self.entries = {}
+        self.dirty = False
+
+    def get(self, ip: str) -> dict:
+        return self.entries.get(ip)
+
+    def set(self, ip: str, entry: dict):
+        self.entries[ip] = entry
+        self.dirty = True
+
+    def update(self, ip: str, **values):
+        """
+        Updates some fields of the entry of a device, creating it if needed.
+        """
+        entry = dict(self.entries.get(ip) or {})
+        entry.update(values)
+        self.set(ip, entry)
+
+    def remove(self, ip: str):
+        if self.entries.pop(ip, None) is not None:
+            self.dirty = True
+
+    def save(self):
+        """
+        Writes the store to disk if anything changed since the last load or save.
+        """
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as state_file:
+            json.dump(self.entries, state_file, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
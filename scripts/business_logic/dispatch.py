@@ -0,0 +1,165 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import ipaddress
+import logging
+import threading
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+
+DISPATCH_SECTION = 'Dispatch_config'
+SLOT_FRACTION = 0.25  # Maximum share of the slot that can be spent spreading the start of the devices
+
+class DispatchPolicy:
+    """
+    Staggers the start of each device and limits the concurrent connections per point and subnet.
+
+    Every device gets a start offset inside the spread window derived from a hash
+    of its IP, so each clock is contacted at the same offset from the start of the
+    run every day. The window is capped to a fraction of the time left until the
+    next scheduled job, so the run still finishes inside its slot. Devices must be
+    submitted to the pool in offset order (see `order`), so a worker never waits on
+    a late offset while an earlier one is queued behind it. Concurrency budgets cap the number
+    of devices of the same point (branch) or subnet that talk at the same time.
+
+    Settings (section `[Dispatch_config]` of config.ini, all optional):
+        spread_window_seconds: Length of the spread window. 0 disables the offsets.
+        max_per_point: Concurrent devices per point. 0 means unlimited.
+        max_per_subnet: Concurrent devices per subnet. 0 means unlimited.
+        subnet_prefix: Prefix length used to group devices by subnet.
+
+    In multi-site mode `shared` is set to a callable that returns the context manager of
+    a session of the site in the budget shared by every site (see `FairShare`); it is
+    entered last, so a device never holds a shared slot while it waits on its own budgets.
+    """
+
+    def __init__(self, spread_window=0.0, max_per_point=0, max_per_subnet=0, subnet_prefix=24):
+        self.spread_window = float(spread_window)
+        self.max_per_point = int(max_per_point)
+        self.max_per_subnet = int(max_per_subnet)
+        self.subnet_prefix = int(subnet_prefix)
+        self.window = self.spread_window
+        self.run_start = time.monotonic()
+        self.semaphores: dict[tuple, threading.BoundedSemaphore] = {}
+        self.shared = None
+
+    @classmethod
+    def from_config(cls, config) -> 'DispatchPolicy':
+        """
+        Builds the policy from the `[Dispatch_config]` section of a loaded ConfigParser.
+        """
+        return cls(
+            spread_window=config.getfloat(DISPATCH_SECTION, 'spread_window_seconds', fallback=0.0),
+            max_per_point=config.getint(DISPATCH_SECTION, 'max_per_point', fallback=0),
+            max_per_subnet=config.getint(DISPATCH_SECTION, 'max_per_subnet', fallback=0),
+            subnet_prefix=config.getint(DISPATCH_SECTION, 'subnet_prefix', fallback=24)
+        )
+
+    def begin_run(self, slot_seconds: float = None):
+        """
+        Prepares the policy for a new run.
+
+        Args:
+            slot_seconds (float, optional): Seconds until the next scheduled job. The spread
+                window never exceeds `SLOT_FRACTION` of it. On-demand runs pass None.
+        """
+        self.window = self.spread_window
+        if slot_seconds:
+            self.window = min(self.window, slot_seconds * SLOT_FRACTION)
+        self.run_start = time.monotonic()
+        self.semaphores = {}
+
+    def offset(self, ip: str) -> float:
+        """
+        Returns the deterministic start offset of a device inside the spread window.
+
+        Args:
+            ip (str): IP address of the device.
+
+        Returns:
+            float: Seconds to wait before contacting the device.
+        """
+        if self.window <= 0:
+            return 0.0
+        return (zlib.crc32(ip.encode('utf-8')) / 0xFFFFFFFF) * self.window
+
+    def order(self, devices: list) -> list:
+        """
+        Sorts the devices by start offset. The sort is stable, so the given order (longest
+        expected jobs first, see `DevicePrioritizer`) is kept among devices with the same
+        offset, and entirely when the spread window is disabled.
+
+        Args:
+            devices (list[Device]): The devices of the run.
+
+        Returns:
+            list[Device]: The devices in the order they should be submitted to the pool.
+        """
+        return sorted(devices, key=lambda device: self.offset(device.ip))
+
+    def budget_keys(self, device) -> list[tuple]:
+        keys = []
+        if self.max_per_point > 0:
+            keys.append(('point', str(device.point), self.max_per_point))
+        if self.max_per_subnet > 0:
+            try:
+                network = ipaddress.ip_network(f'{device.ip}/{self.subnet_prefix}', strict=False)
+                keys.append(('subnet', str(network), self.max_per_subnet))
+            except ValueError:
+                logging.warning(f'IP invalida para el presupuesto de subred: {device.ip}')
+        # Always acquire in the same order so two devices never wait on each other
+        return sorted(keys)
+
+    @contextmanager
+    def dispatch(self, device):
+        """
+        Waits until the start offset of the device, counted from the start of the run,
+        and for a free slot in its budgets.
+
+        Usage:
+            with policy.dispatch(device):
+                ...  # talk to the device
+
+        Args:
+            device (Device): The device about to be contacted.
+        """
+        delay = max(0.0, self.run_start + self.offset(device.ip) - time.monotonic())
+        if delay > 0:
+            time.sleep(delay)  # Cooperative under eventlet's monkey patching
+        with self.budgets(device):
+            yield delay
+
+    @contextmanager
+    def budgets(self, device):
+        """
+        Waits for a free slot in the budgets of the device, without its start offset.
+        Used by the phases that follow the collection in the same run, like the clear.
+
+        Args:
+            device (Device): The device about to be contacted.
+        """
+        with ExitStack() as stack:
+            for kind, name, limit in self.budget_keys(device):
+                semaphore = self.semaphores.setdefault((kind, name), threading.BoundedSemaphore(limit))
+                semaphore.acquire()
+                stack.callback(semaphore.release)
+            if self.shared is not None:
+                stack.enter_context(self.shared())
+            yield
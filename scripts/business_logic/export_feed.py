@@ -0,0 +1,319 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from scripts.business_logic.attendance_store import COLUMNS, AttendanceStore
+from scripts.common.utils.file_manager import find_root_directory
+
+EXPORT_SECTION = 'Export_config'
+EXPORT_PORT = 5002
+MAX_PAGE = 5000
+FORMAT_CSV = 'csv'
+FORMAT_JSONL = 'jsonl'
+FIELDS = ('id',) + COLUMNS
+
+CURSORS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS export_cursors (
+    consumer TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    updated TEXT NOT NULL
+);
+"""
+
+def format_records(records: list[dict], output_format: str, header: bool = True) -> str:
+    """
+    Serializes records as CSV (with an optional header row) or JSON Lines.
+    """
+    if output_format == FORMAT_JSONL:
+        return ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+    if output_format != FORMAT_CSV:
+        raise ValueError(f'Formato desconocido: {output_format}')
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS, lineterminator='\n')
+    if header:
+        writer.writeheader()
+    writer.writerows(records)
+    return buffer.getvalue()
+
+class ExportFeed:
+    """
+    Incremental feed of the attendances stored in the SQLite sink, with a durable cursor per consumer.
+
+    A consumer (e.g. the payroll sync) reads a page of records after its cursor
+    with `changes_since`, processes it and then confirms it with `ack`. The cursor
+    only moves on `ack`, so a consumer that crashes before confirming gets the same
+    page again (at-least-once delivery, records carry their `id` to deduplicate).
+    Cursors live in the `export_cursors` table of the same database, so they survive
+    restarts and are consistent with the records. Every read is bounded by `limit`
+    (capped to `max_page`): a slow consumer only pulls what it can handle and each
+    read costs O(page), never a rescan.
+    """
+
+    def __init__(self, store: AttendanceStore, max_page: int = MAX_PAGE):
+        self.store = store
+        self.max_page = max_page
+        with self.store.lock:
+            self.store.connect().executescript(CURSORS_SCHEMA)
+
+    def position(self, consumer: str) -> int:
+        """
+        Returns the id of the last record confirmed by a consumer (0 if it never confirmed one).
+        """
+        with self.store.lock:
+            row = self.store.connect().execute('SELECT last_id FROM export_cursors WHERE consumer = ?', (consumer,)).fetchone()
+        return row[0] if row else 0
+
+    def consumers(self) -> list[dict]:
+        with self.store.lock:
+            rows = self.store.connect().execute('SELECT consumer, last_id, updated FROM export_cursors ORDER BY consumer').fetchall()
+        return [{'consumer': consumer, 'last_id': last_id, 'updated': updated} for consumer, last_id, updated in rows]
+
+    def changes_since(self, consumer: str, limit: int = None, cursor: int = None) -> tuple[list[dict], int]:
+        """
+        Returns the records stored after the cursor of a consumer, without moving it.
+
+        Args:
+            consumer (str): Name of the consumer.
+            limit (int, optional): Maximum records to return (capped to `max_page`).
+            cursor (int, optional): Read after this id instead of the stored cursor.
+
+        Returns:
+            tuple[list[dict], int]: The records and the cursor to `ack` once they are processed.
+        """
+        after = self.position(consumer) if cursor is None else cursor
+        limit = min(limit or self.max_page, self.max_page)
+        records = self.store.fetch_since(after, limit)
+        return records, (records[-1]['id'] if records else after)
+
+    def ack(self, consumer: str, cursor: int) -> int:
+        """
+        Confirms that a consumer processed every record up to `cursor`.
+
+        The cursor never moves backwards, so a late or repeated confirmation is harmless.
+
+        Returns:
+            int: The cursor stored for the consumer.
+        """
+        updated = datetime.now().isoformat(timespec='seconds')
+        with self.store.lock:
+            connection = self.store.connect()
+            with connection:
+                connection.execute(
+                    'INSERT INTO export_cursors (consumer, last_id, updated) VALUES (?, ?, ?) '
+                    'ON CONFLICT (consumer) DO UPDATE SET last_id = MAX(last_id, excluded.last_id), updated = excluded.updated',
+                    (consumer, int(cursor), updated)
+                )
+            return connection.execute('SELECT last_id FROM export_cursors WHERE consumer = ?', (consumer,)).fetchone()[0]
+
+    def reset(self, consumer: str, cursor: int = 0):
+        """
+        Moves the cursor of a consumer to any position (e.g. 0 to export everything again).
+        """
+        with self.store.lock:
+            connection = self.store.connect()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO export_cursors (consumer, last_id, updated) VALUES (?, ?, ?)',
+                    (consumer, int(cursor), datetime.now().isoformat(timespec='seconds'))
+                )
+
+    def pull_to_file(self, consumer: str, path: str, output_format: str = FORMAT_CSV, limit: int = None) -> int:
+        """
+        Appends every new record of a consumer to a file, page by page, confirming each page
+        once it is on disk.
+
+        Returns:
+            int: Number of records written.
+        """
+        written = 0
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        with open(path, 'a', encoding='utf-8', newline='') as output:
+            while True:
+                records, cursor = self.changes_since(consumer, limit)
+                if not records:
+                    return written
+                output.write(format_records(records, output_format, header=new_file))
+                output.flush()
+                os.fsync(output.fileno())
+                new_file = False
+                self.ack(consumer, cursor)
+                written += len(records)
+
+class ExportRequestHandler(BaseHTTPRequestHandler):
+    """
+    Loopback HTTP access to an `ExportFeed`.
+
+    GET  /changes?consumer=<name>[&limit=N][&cursor=ID][&format=csv|jsonl]
+         Returns the next page; the cursor to confirm is in the `X-Next-Cursor` header.
+    POST /ack?consumer=<name>&cursor=ID
+         Confirms a page.
+    GET  /consumers
+         Lists the cursors of every consumer.
+    """
+
+    feed: ExportFeed = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == '/changes':
+                output_format = params.get('format', FORMAT_JSONL)
+                records, cursor = self.feed.changes_since(
+                    params['consumer'],
+                    int(params['limit']) if 'limit' in params else None,
+                    int(params['cursor']) if 'cursor' in params else None
+                )
+                content_type = 'text/csv' if output_format == FORMAT_CSV else 'application/x-ndjson'
+                self.__reply(200, format_records(records, output_format), content_type, {'X-Next-Cursor': str(cursor)})
+            elif url.path == '/consumers':
+                self.__reply(200, json.dumps(self.feed.consumers()), 'application/json')
+            else:
+                self.__reply(404, 'No encontrado')
+        except (KeyError, ValueError) as e:
+            self.__reply(400, f'Parametros invalidos: {e}')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path != '/ack':
+            self.__reply(404, 'No encontrado')
+            return
+        try:
+            cursor = self.feed.ack(params['consumer'], int(params['cursor']))
+            self.__reply(200, json.dumps({'consumer': params['consumer'], 'last_id': cursor}), 'application/json')
+        except (KeyError, ValueError) as e:
+            self.__reply(400, f'Parametros invalidos: {e}')
+
+    def __reply(self, status: int, body: str, content_type: str = 'text/plain', headers: dict = None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug(f'Exportacion HTTP: {format % args}')
+
+class ExportServer:
+    """
+    Serves an `ExportFeed` over HTTP on the loopback interface only, in a background thread.
+    """
+
+    def __init__(self, feed: ExportFeed, host: str = '127.0.0.1', port: int = EXPORT_PORT):
+        handler = type('BoundExportRequestHandler', (ExportRequestHandler,), {'feed': feed})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread: threading.Thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='export-http', daemon=True)
+        self.thread.start()
+        logging.info(f'Exportacion HTTP escuchando en {self.server.server_address[0]}:{self.server.server_address[1]}')
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def open_feed(config, root: str = None) -> ExportFeed:
+    """
+    Opens the export feed of the SQLite sink configured in config.ini.
+
+    Returns:
+        ExportFeed: The feed, or None if the SQLite sink is disabled.
+    """
+    store = AttendanceStore.from_config(config, root)
+    if store is None:
+        return None
+    return ExportFeed(store, config.getint(EXPORT_SECTION, 'max_page', fallback=MAX_PAGE))
+
+def main(argv=None):
+    """
+    Command line access to the export feed.
+
+    Usage:
+        python -m scripts.business_logic.export_feed pull payroll --output marcaciones.csv
+        python -m scripts.business_logic.export_feed peek payroll --limit 20 --format jsonl
+        python -m scripts.business_logic.export_feed consumers
+        python -m scripts.business_logic.export_feed reset payroll --cursor 0
+        python -m scripts.business_logic.export_feed serve
+    """
+    from scripts import config
+    parser = argparse.ArgumentParser(description='Exportacion incremental de marcaciones')
+    parser.add_argument('--root', help='Directorio raiz (por defecto, el de la aplicacion)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    pull_parser = subparsers.add_parser('pull', help='Agrega las marcaciones nuevas a un archivo y confirma el cursor')
+    pull_parser.add_argument('consumer')
+    pull_parser.add_argument('--output', required=True)
+    pull_parser.add_argument('--format', choices=(FORMAT_CSV, FORMAT_JSONL), default=FORMAT_CSV)
+    pull_parser.add_argument('--limit', type=int, help='Marcaciones por pagina')
+    peek_parser = subparsers.add_parser('peek', help='Muestra las marcaciones nuevas sin mover el cursor')
+    peek_parser.add_argument('consumer')
+    peek_parser.add_argument('--format', choices=(FORMAT_CSV, FORMAT_JSONL), default=FORMAT_JSONL)
+    peek_parser.add_argument('--limit', type=int, default=100)
+    subparsers.add_parser('consumers', help='Lista los consumidores y sus cursores')
+    reset_parser = subparsers.add_parser('reset', help='Mueve el cursor de un consumidor')
+    reset_parser.add_argument('consumer')
+    reset_parser.add_argument('--cursor', type=int, default=0)
+    serve_parser = subparsers.add_parser('serve', help='Sirve la exportacion por HTTP en localhost')
+    serve_parser.add_argument('--port', type=int)
+    args = parser.parse_args(argv)
+
+    root = args.root or find_root_directory()
+    config.read(os.path.join(root, 'config.ini'))
+    feed = open_feed(config, root)
+    if feed is None:
+        print('La base de datos de marcaciones no esta habilitada (sqlite_enabled en [Storage_config])', file=sys.stderr)
+        return 1
+
+    if args.command == 'pull':
+        written = feed.pull_to_file(args.consumer, args.output, args.format, args.limit)
+        print(f'{written} marcaciones nuevas - cursor {feed.position(args.consumer)}')
+    elif args.command == 'peek':
+        records, cursor = feed.changes_since(args.consumer, args.limit)
+        sys.stdout.write(format_records(records, args.format))
+        print(f'# siguiente cursor: {cursor}', file=sys.stderr)
+    elif args.command == 'consumers':
+        for consumer in feed.consumers():
+            print(f'{consumer["consumer"]}\t{consumer["last_id"]}\t{consumer["updated"]}')
+    elif args.command == 'reset':
+        feed.reset(args.consumer, args.cursor)
+    elif args.command == 'serve':
+        server = ExportServer(feed, port=args.port or config.getint(EXPORT_SECTION, 'http_port', fallback=EXPORT_PORT))
+        try:
+            server.server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
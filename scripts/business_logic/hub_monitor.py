@@ -0,0 +1,158 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import sys
+import time
+import traceback
+
+DEBUG_SECTION = 'Debug_config'
+
+def eventlet_active() -> bool:
+    """
+    Returns True if the process runs under eventlet's monkey patching of threads.
+    """
+    eventlet = sys.modules.get('eventlet')
+    if eventlet is None:
+        return False
+    try:
+        return eventlet.patcher.is_monkey_patched('thread')
+    except Exception:
+        return False
+
+def offload(function, *args, **kwargs):
+    """
+    Runs a blocking call (C extensions such as sqlite3, heavy compression) in eventlet's
+    native thread pool, so the green threads keep running meanwhile.
+
+    Without eventlet's monkey patching the call runs directly.
+    """
+    if eventlet_active():
+        from eventlet import tpool
+        return tpool.execute(function, *args, **kwargs)
+    return function(*args, **kwargs)
+
+class HubBlockingDetector:
+    """
+    Detects calls that block eventlet's hub, i.e. that stop every green thread at once.
+
+    A green heartbeat wakes up every `interval` seconds and stamps the time. A native
+    (not monkey patched) watchdog thread checks the stamp: if the heartbeat is late by
+    more than `threshold`, the hub is blocked by whatever code the hub thread is
+    running. The watchdog logs its stack trace (taken with `sys._current_frames`)
+    once per stall, and the total duration when the hub recovers.
+
+    eventlet's own `eventlet.debug.hub_blocking_detection` relies on SIGALRM, which
+    does not exist on Windows; this detector works on every platform.
+
+    Settings (section `[Debug_config]` of config.ini, all optional):
+        hub_blocking_detection: Enables the detector in the service.
+        hub_blocking_threshold_ms: Minimum stall reported.
+    """
+
+    def __init__(self, threshold: float = 0.2, interval: float = None, on_stall=None):
+        """
+        Args:
+            threshold (float): Minimum stall, in seconds, that is reported.
+            interval (float, optional): Heartbeat period. Defaults to a quarter of the threshold.
+            on_stall (callable, optional): Called with (duration, stack) when a stall ends,
+                in addition to logging it.
+        """
+        self.threshold = threshold
+        self.interval = interval or threshold / 4
+        self.on_stall = on_stall
+        self.stalls: list[tuple[float, str]] = []
+        self.last_beat = time.monotonic()
+        self.running = False
+        self.hub_thread_id = None
+        self.heartbeat = None
+        self.watchdog = None
+
+    @classmethod
+    def from_config(cls, config) -> 'HubBlockingDetector':
+        """
+        Builds the detector from the `[Debug_config]` section of a loaded ConfigParser.
+
+        Returns:
+            HubBlockingDetector: The detector, or None if it is disabled.
+        """
+        if not config.getboolean(DEBUG_SECTION, 'hub_blocking_detection', fallback=False):
+            return None
+        return cls(config.getint(DEBUG_SECTION, 'hub_blocking_threshold_ms', fallback=200) / 1000)
+
+    def start(self) -> bool:
+        """
+        Starts the heartbeat and the watchdog. Must be called from the thread that runs the hub.
+
+        Returns:
+            bool: False if eventlet's monkey patching is not active (nothing to watch).
+        """
+        if not eventlet_active():
+            logging.warning('La deteccion de bloqueos requiere eventlet.monkey_patch()')
+            return False
+        import eventlet
+        from eventlet import patcher
+        native_threading = patcher.original('threading')
+        native_thread = patcher.original('_thread')
+
+        self.running = True
+        self.hub_thread_id = native_thread.get_ident()
+        self.last_beat = time.monotonic()
+        self.heartbeat = eventlet.spawn(self.__beat)
+        self.watchdog = native_threading.Thread(target=self.__watch, name='hub-watchdog', daemon=True)
+        self.watchdog.start()
+        logging.info(f'Deteccion de bloqueos del hub activa (umbral {self.threshold * 1000:.0f} ms)')
+        return True
+
+    def stop(self):
+        self.running = False
+        if self.heartbeat is not None:
+            self.heartbeat.kill()
+            self.heartbeat = None
+
+    def __beat(self):
+        import eventlet
+        while self.running:
+            self.last_beat = time.monotonic()
+            eventlet.sleep(self.interval)
+
+    def __watch(self):
+        # Runs in a native thread, which has its own hub: under monkey patching time.sleep here is
+        # eventlet's, but it only yields to the hub of this thread, never to the one being watched
+        stall_stack = None
+        stall_start = None
+        while self.running:
+            time.sleep(self.interval)
+            late = time.monotonic() - self.last_beat - self.interval
+            if late > self.threshold:
+                if stall_stack is None:
+                    stall_start = self.last_beat + self.interval
+                    frame = sys._current_frames().get(self.hub_thread_id)
+                    stall_stack = ''.join(traceback.format_stack(frame)) if frame is not None else '(sin pila)'
+                    logging.warning(f'Hub bloqueado hace {late * 1000:.0f} ms en:\n{stall_stack}')
+            elif stall_stack is not None:
+                duration = self.last_beat - stall_start
+                self.stalls.append((duration, stall_stack))
+                logging.warning(f'Hub bloqueado durante {duration * 1000:.0f} ms')
+                if self.on_stall:
+                    try:
+                        self.on_stall(duration, stall_stack)
+                    except Exception as e:
+                        logging.error(f'Error en el aviso de bloqueo: {e}')
+                stall_stack = None
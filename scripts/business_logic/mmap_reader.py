@@ -0,0 +1,283 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import mmap
+import os
+import re
+import sys
+from datetime import date, datetime, timedelta
+
+# Timestamps recognized in the lines, as (year, month, day, hour, minute, second) keys
+ISO_PATTERN = re.compile(rb'(\d{4})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2})(?::(\d{2}))?')
+DMY_PATTERN = re.compile(rb'(\d{2})/(\d{2})/(\d{4}) (\d{2}):(\d{2})(?::(\d{2}))?')
+
+def log_timestamp(line) -> tuple:
+    """
+    Timestamp of a log line ('2024-05-02 08:00:01,123 - DEBUG - ...'). Lines that do
+    not start with one (e.g. the rest of a traceback) have none.
+    """
+    match = ISO_PATTERN.match(line)
+    if match is None:
+        return None
+    return tuple(int(value or 0) for value in match.groups())
+
+def attendance_timestamp(line) -> tuple:
+    """
+    Timestamp of an attendance line: the first date and time found in it, either
+    'YYYY-MM-DD HH:MM[:SS]' or 'DD/MM/YYYY HH:MM[:SS]'.
+    """
+    match = ISO_PATTERN.search(line)
+    if match is not None:
+        return tuple(int(value or 0) for value in match.groups())
+    match = DMY_PATTERN.search(line)
+    if match is not None:
+        day, month, year, hour, minute, second = match.groups()
+        return int(year), int(month), int(day), int(hour), int(minute), int(second or 0)
+    return None
+
+TIMESTAMP_PARSERS = {
+    'attendance': attendance_timestamp,
+    'log': log_timestamp,
+}
+
+def timestamp_key(value) -> tuple:
+    if isinstance(value, datetime):
+        return value.year, value.month, value.day, value.hour, value.minute, value.second
+    return value.year, value.month, value.day, 0, 0, 0
+
+class MappedRecordFile:
+    """
+    Read-only, memory-mapped view of a large line-oriented file (global attendance
+    files, monthly debug logs).
+
+    Line boundaries are found with `mmap.find`, in C, and lines are only copied out of
+    the mapping when they are returned. On a file sorted by time, `lower_bound`
+    binary-searches the byte offset of the first line at or after a timestamp, so
+    `range` reads only the lines of the requested period, whatever the size of the file.
+    Lines without a timestamp (e.g. traceback lines in a log) belong to the previous one.
+
+    Usage:
+        with MappedRecordFile(path) as records:
+            for line in records.range(date(2026, 9, 1), date(2026, 9, 16)):
+                ...
+    """
+
+    def __init__(self, path: str, kind: str = 'attendance'):
+        """
+        Args:
+            path (str): The file.
+            kind (str): How timestamps are found in the lines (see `TIMESTAMP_PARSERS`).
+        """
+        self.path = path
+        self.timestamp = TIMESTAMP_PARSERS[kind]
+        self.file = None
+        self.map = None
+        self.size = 0
+
+    def open(self) -> 'MappedRecordFile':
+        self.file = open(self.path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size:  # An empty file cannot be mapped
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def line_start(self, offset: int) -> int:
+        """
+        Returns the offset of the first line that starts at or after `offset`.
+        """
+        if offset <= 0:
+            return 0
+        position = self.map.find(b'\n', offset - 1)
+        return self.size if position < 0 else position + 1
+
+    def line_end(self, start: int) -> int:
+        position = self.map.find(b'\n', start)
+        return self.size if position < 0 else position + 1
+
+    def iter_spans(self, start: int = 0, end: int = None):
+        """
+        Yields (start, end) byte offsets of the lines in [start, end), without copying them.
+        """
+        end = self.size if end is None else end
+        position = self.line_start(start)
+        while position < end:
+            line_end = self.line_end(position)
+            yield position, line_end
+            position = line_end
+
+    def iter_lines(self, start: int = 0, end: int = None):
+        """
+        Yields the lines (bytes, with their line break) in [start, end).
+        """
+        for line_start, line_end in self.iter_spans(start, end):
+            yield self.map[line_start:line_end]
+
+    def __first_timestamped(self, offset: int) -> tuple:
+        # First line starting at or after offset that has a timestamp: (start, key)
+        for line_start, line_end in self.iter_spans(offset):
+            key = self.timestamp(self.map[line_start:line_end])
+            if key is not None:
+                return line_start, key
+        return self.size, None
+
+    def lower_bound(self, when) -> int:
+        """
+        Returns the offset of the first line with a timestamp at or after `when`
+        (the end of the file if there is none). The file must be sorted by time.
+
+        Args:
+            when (date | datetime): The timestamp searched.
+        """
+        if self.map is None:
+            return 0
+        target = timestamp_key(when)
+        low, high = 0, self.size
+        # Smallest offset whose first timestamped line is not before the target
+        while low < high:
+            middle = (low + high) // 2
+            _, key = self.__first_timestamped(middle)
+            if key is None or key >= target:
+                high = middle
+            else:
+                low = middle + 1
+        return self.__first_timestamped(low)[0]
+
+    def range_offsets(self, start=None, end=None) -> tuple[int, int]:
+        """
+        Returns the byte offsets [first, last) of the lines in [start, end) of a sorted file.
+        """
+        first = self.lower_bound(start) if start is not None else 0
+        last = self.lower_bound(end) if end is not None else self.size
+        return first, max(first, last)
+
+    def range(self, start=None, end=None, sorted_file: bool = True):
+        """
+        Yields the lines with a timestamp in [start, end).
+
+        On a sorted file only the lines of the period are read. Otherwise
+        (`sorted_file=False`) every line is checked; lines without a timestamp are skipped.
+        """
+        if self.map is None:
+            return
+        if sorted_file:
+            first, last = self.range_offsets(start, end)
+            yield from self.iter_lines(first, last)
+            return
+        low = timestamp_key(start) if start is not None else None
+        high = timestamp_key(end) if end is not None else None
+        for line in self.iter_lines():
+            key = self.timestamp(line)
+            if key is not None and (low is None or key >= low) and (high is None or key < high):
+                yield line
+
+    def copy_range(self, output, start=None, end=None) -> int:
+        """
+        Writes the lines of [start, end) of a sorted file to a binary stream in one slice.
+
+        Returns:
+            int: Bytes written.
+        """
+        if self.map is None:
+            return 0
+        first, last = self.range_offsets(start, end)
+        with memoryview(self.map) as view:
+            output.write(view[first:last])
+        return last - first
+
+    def is_sorted(self) -> tuple[bool, int]:
+        """
+        Checks that the timestamps never go back in time.
+
+        Returns:
+            tuple[bool, int]: Whether the file is sorted and, if not, the offset of the
+            first line out of order.
+        """
+        previous = None
+        for line_start, line_end in self.iter_spans():
+            key = self.timestamp(self.map[line_start:line_end])
+            if key is None:
+                continue
+            if previous is not None and key < previous:
+                return False, line_start
+            previous = key
+        return True, -1
+
+def parse_day(value: str) -> date:
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def main(argv=None):
+    """
+    Extracts periods from large attendance files and logs without reading them whole.
+
+    Usage:
+        python -m scripts.business_logic.mmap_reader range marcaciones.txt --from 2026-09-01 --to 2026-09-15
+        python -m scripts.business_logic.mmap_reader range debug.log --kind log --from 2026-09-10 --to 2026-09-10
+        python -m scripts.business_logic.mmap_reader check marcaciones.txt
+    """
+    parser = argparse.ArgumentParser(description='Lectura por periodos de archivos de marcaciones y logs grandes')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    range_parser = subparsers.add_parser('range', help='Muestra las lineas de un periodo (fechas inclusive)')
+    range_parser.add_argument('file')
+    range_parser.add_argument('--kind', choices=sorted(TIMESTAMP_PARSERS), default='attendance')
+    range_parser.add_argument('--from', dest='start', type=parse_day)
+    range_parser.add_argument('--to', dest='end', type=parse_day)
+    range_parser.add_argument('--unsorted', action='store_true', help='El archivo no esta ordenado: recorre todas las lineas')
+    range_parser.add_argument('--count', action='store_true', help='Solo muestra la cantidad de lineas')
+    check_parser = subparsers.add_parser('check', help='Verifica que el archivo este ordenado por fecha')
+    check_parser.add_argument('file')
+    check_parser.add_argument('--kind', choices=sorted(TIMESTAMP_PARSERS), default='attendance')
+    args = parser.parse_args(argv)
+
+    with MappedRecordFile(args.file, args.kind) as records:
+        if args.command == 'check':
+            ordered, offset = records.is_sorted()
+            if ordered:
+                print('Ordenado')
+                return 0
+            line = records.map[records.line_start(offset):records.line_end(offset)]
+            print(f'Desordenado a partir del byte {offset}: {line.decode("utf-8", "replace").rstrip()}')
+            return 1
+
+        end = args.end + timedelta(days=1) if args.end else None
+        if args.count:
+            print(sum(1 for _ in records.range(args.start, end, not args.unsorted)))
+        elif args.unsorted:
+            for line in records.range(args.start, end, sorted_file=False):
+                sys.stdout.buffer.write(line)
+        else:
+            records.copy_range(sys.stdout.buffer, args.start, end)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,516 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import configparser
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
+
+from scripts.business_logic.command_channel import RunRequest
+from scripts.business_logic.export_feed import EXPORT_PORT, EXPORT_SECTION
+from scripts.business_logic.scheduler_core import PlatformAdapter, SchedulerCore
+from scripts.common.utils.file_manager import find_root_directory
+
+SITES_FILE = 'sites.ini'
+SITES_SECTION = 'Sites_config'
+SITE_PREFIX = 'site:'
+DEFAULT_MAX_SESSIONS = 16
+STOP_TIMEOUT = 60  # Seconds to wait for the current run of each site when stopping
+
+class SiteConfigError(ValueError):
+    """
+    Invalid section or option of the sites file.
+    """
+
+    def __init__(self, section: str, reason: str):
+        self.section = section
+        self.reason = reason
+        super().__init__(f'[{section}]: {reason}')
+
+class Site:
+    """
+    A site hosted by the multi-site mode.
+
+    Fields:
+        name: Name of the site, used in the logs and in the commands.
+        root: Root directory of the site: its config.ini, schedule.txt, state, journal,
+            SQLite database and captures.
+        points: Points of the device inventory that belong to the site (None: every point,
+            only allowed when there is a single site).
+        weight: Share of the sessions shared by every site that the site gets when
+            several sites are waiting for one.
+        max_sessions: Devices of the site talking at the same time. 0 means only the
+            shared budget applies.
+    """
+
+    def __init__(self, name: str, root: str, points=None, weight: float = 1.0, max_sessions: int = 0):
+        self.name = name
+        self.root = root
+        self.points = frozenset(points) if points is not None else None
+        self.weight = float(weight)
+        self.max_sessions = int(max_sessions)
+
+    @classmethod
+    def from_section(cls, name: str, section, base: str) -> 'Site':
+        """
+        Builds a site from its section of the sites file.
+
+        Args:
+            name (str): Name of the site (the section name without `site:`).
+            section (SectionProxy): The options of the section.
+            base (str): Directory relative roots are resolved against (the folder of the file).
+
+        Raises:
+            SiteConfigError: On a missing or invalid option.
+        """
+        section_name = f'{SITE_PREFIX}{name}'
+        unknown = set(section) - {'root', 'points', 'weight', 'max_sessions'} - set(section.parser.defaults())
+        if unknown:
+            raise SiteConfigError(section_name, f'opciones desconocidas {sorted(unknown)}')
+        root = section.get('root', '').strip()
+        if not root:
+            raise SiteConfigError(section_name, 'falta root')
+        root = os.path.normpath(os.path.join(base, root))
+        if not os.path.isdir(root):
+            raise SiteConfigError(section_name, f'el directorio {root} no existe')
+        points = [point.strip() for point in section.get('points', '').split(',') if point.strip()] or None
+        try:
+            weight = section.getfloat('weight', fallback=1.0)
+            max_sessions = section.getint('max_sessions', fallback=0)
+        except ValueError as e:
+            raise SiteConfigError(section_name, str(e)) from None
+        if weight <= 0:
+            raise SiteConfigError(section_name, 'weight debe ser mayor que 0')
+        if max_sessions < 0:
+            raise SiteConfigError(section_name, 'max_sessions no puede ser negativo')
+        return cls(name, root, points, weight, max_sessions)
+
+    def export_port(self) -> int:
+        """
+        Returns the port of the HTTP export feed of the site (see `SchedulerCore.start_export_server`),
+        or None if the feed is disabled in its config.ini.
+        """
+        parser = configparser.ConfigParser()
+        parser.read(os.path.join(self.root, 'config.ini'), encoding='utf-8')
+        try:
+            if not parser.getboolean(EXPORT_SECTION, 'http_enabled', fallback=False):
+                return None
+            return parser.getint(EXPORT_SECTION, 'http_port', fallback=EXPORT_PORT)
+        except ValueError as e:
+            raise SiteConfigError(f'{SITE_PREFIX}{self.name}', f'config.ini: {e}') from None
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'root': self.root,
+            'points': sorted(self.points) if self.points is not None else None,
+            'weight': self.weight,
+            'max_sessions': self.max_sessions
+        }
+
+    def __repr__(self):
+        return f'Site({self.name!r}, root={self.root!r}, points={self.to_dict()["points"]}, weight={self.weight})'
+
+def load_sites(path: str) -> tuple[list[Site], int]:
+    """
+    Reads the sites file.
+
+    Format:
+        [Sites_config]
+        max_sessions = 16        ; devices of every site talking at the same time (0: unlimited)
+
+        [site:Norte]
+        root = sitios/norte      ; relative to the folder of the file
+        points = Sucursal Norte, Deposito Norte
+        weight = 1
+        max_sessions = 8
+
+    Returns:
+        tuple: (sites, shared max_sessions).
+
+    Raises:
+        SiteConfigError: If a section is invalid, two sites share a root, a point or the
+            port of their export feed, or several sites are defined and one of them has no points.
+    """
+    parser = configparser.ConfigParser()
+    if not parser.read(path, encoding='utf-8'):
+        raise SiteConfigError(SITES_SECTION, f'no se encontro {path}')
+    base = os.path.dirname(os.path.abspath(path))
+    try:
+        max_sessions = parser.getint(SITES_SECTION, 'max_sessions', fallback=DEFAULT_MAX_SESSIONS)
+    except ValueError as e:
+        raise SiteConfigError(SITES_SECTION, str(e)) from None
+    if max_sessions < 0:
+        raise SiteConfigError(SITES_SECTION, 'max_sessions no puede ser negativo')
+
+    sites: list[Site] = []
+    for section_name in parser.sections():
+        if section_name == SITES_SECTION:
+            continue
+        if not section_name.startswith(SITE_PREFIX) or not section_name[len(SITE_PREFIX):].strip():
+            raise SiteConfigError(section_name, f'se esperaba [{SITES_SECTION}] o [{SITE_PREFIX}<nombre>]')
+        sites.append(Site.from_section(section_name[len(SITE_PREFIX):].strip(), parser[section_name], base))
+    if not sites:
+        raise SiteConfigError(SITES_SECTION, 'no hay sitios definidos')
+
+    roots: dict[str, str] = {}
+    owners: dict[str, str] = {}
+    ports: dict[int, str] = {}
+    for site in sites:
+        section_name = f'{SITE_PREFIX}{site.name}'
+        key = os.path.normcase(site.root)
+        if key in roots:
+            raise SiteConfigError(section_name, f'comparte el directorio raiz con el sitio {roots[key]}')
+        roots[key] = site.name
+        port = site.export_port()
+        if port is not None and port in ports:
+            raise SiteConfigError(section_name, f'la exportacion HTTP usa el puerto {port} del sitio {ports[port]}: indique otro http_port en [{EXPORT_SECTION}]')
+        if port is not None:
+            ports[port] = site.name
+        if site.points is None:
+            if len(sites) > 1:
+                raise SiteConfigError(section_name, 'con varios sitios, cada uno debe indicar sus points')
+            continue
+        for point in site.points:
+            if point in owners:
+                raise SiteConfigError(section_name, f'el punto {point!r} ya pertenece al sitio {owners[point]}')
+            owners[point] = site.name
+    return sites, max_sessions
+
+class SiteShare:
+    """
+    Accounting of one site in the shared session budget.
+    """
+
+    def __init__(self, site: Site, order: int):
+        self.site = site
+        self.order = order
+        self.active = 0
+        self.waiting: deque = deque()
+        self.virtual = 0.0
+        self.served = 0
+        self.waited = 0.0
+
+    def eligible(self) -> bool:
+        return bool(self.waiting) and (not self.site.max_sessions or self.active < self.site.max_sessions)
+
+    def to_dict(self) -> dict:
+        return {
+            'site': self.site.name,
+            'weight': self.site.weight,
+            'max_sessions': self.site.max_sessions,
+            'active': self.active,
+            'waiting': len(self.waiting),
+            'served': self.served,
+            'mean_wait_seconds': round(self.waited / self.served, 3) if self.served else 0.0
+        }
+
+class FairShare:
+    """
+    Budget of device sessions shared by every site, handed out fairly between the sites.
+
+    Each device session of a site takes one slot of the shared budget (and of the budget
+    of its site). When several sites are waiting, the next free slot goes to the site that
+    received the least service relative to its weight (stride scheduling): every session
+    advances the virtual time of its site by 1/weight, and the waiting site with the
+    lowest virtual time is served. A site that was idle restarts at the current virtual
+    time, so it cannot bank idle time and later monopolize the budget. A site with
+    thousands of queued devices therefore gets its share, not the whole budget, and the
+    devices of a small site wait at most a few sessions.
+    """
+
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        """
+        Args:
+            max_sessions (int): Sessions of every site at the same time. 0 means unlimited,
+                only the budgets of the sites apply.
+        """
+        self.max_sessions = int(max_sessions)
+        self.condition = threading.Condition()
+        self.shares: dict[str, SiteShare] = {}
+        self.granted: set = set()
+        self.active = 0
+        self.virtual = 0.0
+
+    def add_site(self, site: Site):
+        with self.condition:
+            self.shares[site.name] = SiteShare(site, len(self.shares))
+
+    def slots(self, name: str):
+        """
+        Returns the callable a `DispatchPolicy` of the site uses to take its sessions.
+        """
+        return partial(self.session, name)
+
+    @contextmanager
+    def session(self, name: str):
+        """
+        Waits for a slot of the shared budget for a device of a site.
+
+        Usage:
+            with fair_share.session('Norte'):
+                ...  # talk to the device
+
+        Args:
+            name (str): Name of the site.
+        """
+        share = self.shares[name]
+        ticket = object()
+        start = time.monotonic()
+        with self.condition:
+            if not share.active and not share.waiting:
+                share.virtual = max(share.virtual, self.virtual)  # No credit for the idle time
+            share.waiting.append(ticket)
+            self.__grant()
+            try:
+                while ticket not in self.granted:
+                    self.condition.wait()
+            except BaseException:
+                # Interrupted while waiting: give the slot back or leave the queue
+                if ticket in self.granted:
+                    self.granted.discard(ticket)
+                    self.__release(share)
+                else:
+                    share.waiting.remove(ticket)
+                raise
+            self.granted.discard(ticket)
+            share.waited += time.monotonic() - start
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.__release(share)
+
+    def __release(self, share: SiteShare):
+        share.active -= 1
+        self.active -= 1
+        self.__grant()
+
+    def __grant(self):
+        # Called with the condition held
+        granted = False
+        while not self.max_sessions or self.active < self.max_sessions:
+            eligible = [share for share in self.shares.values() if share.eligible()]
+            if not eligible:
+                break
+            share = min(eligible, key=lambda candidate: (candidate.virtual, candidate.order))
+            self.granted.add(share.waiting.popleft())
+            share.active += 1
+            share.served += 1
+            self.active += 1
+            self.virtual = share.virtual
+            share.virtual += 1.0 / share.site.weight
+            granted = True
+        if granted:
+            self.condition.notify_all()
+
+    def snapshot(self) -> list[dict]:
+        with self.condition:
+            return [share.to_dict() for share in self.shares.values()]
+
+class MultiSiteHost(SchedulerCore):
+    """
+    Hosts several sites in a single service process.
+
+    Every site is a `SchedulerCore` with its own root directory (config.ini,
+    schedule.txt, state, journal, database), its own configuration parser and
+    managers, and its own loop in a dedicated thread, so the runs of one site never
+    wait for the runs of another. The devices of every site share the session budget
+    of `FairShare`. The host keeps what is unique to the process: the log files (in
+    the folder of the sites file), the command channel, which routes the commands to
+    the sites, and the hub blocking detector. Each site serves the export feed of its
+    own database, on its own port (`load_sites` rejects two sites on the same port).
+
+    The device inventory and the attendance text files are handled by the common
+    package, which always uses the root directory of the application. Each site
+    therefore keeps the devices of its `points` from the shared inventory, and the
+    managers of every site write the inventory and the global attendance file under
+    the process-wide locks of `root_files`, so two sites never interleave their writes.
+    """
+
+    def __init__(self, sites_file: str = None, platform: PlatformAdapter = None):
+        """
+        Args:
+            sites_file (str, optional): Path of the sites file. Defaults to `sites.ini` in the
+                root directory of the application.
+            platform (PlatformAdapter, optional): The host. Defaults to a headless host.
+        """
+        self.sites_file = os.path.abspath(sites_file or os.path.join(find_root_directory(), SITES_FILE))
+        super().__init__(os.path.dirname(self.sites_file), platform)
+        self.sites: list[Site] = []
+        self.fair_share: FairShare = None
+        self.cores: dict[str, SchedulerCore] = {}
+        self.threads: list[threading.Thread] = []
+
+    def load_sites(self):
+        """
+        Reads the sites file and creates the core of every site.
+
+        Raises:
+            SiteConfigError: If the sites file is invalid.
+        """
+        self.sites, max_sessions = load_sites(self.sites_file)
+        self.fair_share = FairShare(max_sessions)
+        self.cores = {}
+        for site in self.sites:
+            self.fair_share.add_site(site)
+            self.cores[site.name] = SchedulerCore(site.root, self.platform, configparser.ConfigParser(),
+                                                  site.points, self.fair_share.slots(site.name))
+        logging.info(f'Sitios: {", ".join(site.name for site in self.sites)} - Sesiones compartidas: {max_sessions or "sin limite"}')
+
+    def configure_schedule(self):
+        """
+        Loads the sites and starts the loop of every site in its own thread. The host
+        has no schedule of its own.
+        """
+        self.load_sites()
+        self.threads = []
+        for name, core in self.cores.items():
+            thread = threading.Thread(target=self.run_site, args=(name, core), name=f'site-{name}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def run_site(self, name: str, core: SchedulerCore):
+        """
+        Runs the schedule, the on-demand runs and the background stages of a site.
+        """
+        try:
+            core.configure_schedule()
+            if core.schedule_index is not None:
+                logging.debug(f'[{name}] Tareas programadas: {len(core.schedule_index.plan.entries)}')
+        except Exception as e:
+            logging.error(f'[{name}] Error al configurar el horario: {e}')
+        try:
+            core.start_export_server()
+        except Exception as e:
+            logging.error(f'[{name}] Error al iniciar la exportacion HTTP: {e}')
+        try:
+            core.run_loop(manage_logs=False)
+        except Exception as e:
+            logging.error(f'[{name}] Error inesperado en el sitio: {e}')
+
+    def start_export_server(self):
+        pass  # Each site starts the feed of its own database (see `run_site`)
+
+    def stop(self):
+        """
+        Stops the sites, waiting for their current run, then the host.
+        """
+        for core in self.cores.values():
+            core.stop()
+        for thread in self.threads:
+            thread.join(STOP_TIMEOUT)
+        super().stop()
+
+    def run_once(self, ips=None, points=None) -> bool:
+        """
+        Collects the attendances of every site once, the sites in parallel.
+
+        Returns:
+            bool: True if every site executed its run.
+        """
+        self.load_sites()
+        results: dict[str, bool] = {}
+
+        def collect(name: str, core: SchedulerCore):
+            core.run_requests.put(RunRequest(ips, points, 'headless'))
+            results[name] = core.run_requested_collection(timeout=0)
+
+        threads = [threading.Thread(target=collect, args=item, name=f'site-{item[0]}') for item in self.cores.items()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return all(results.get(name) for name in self.cores)
+
+    def targeted_sites(self, command: dict) -> list[str]:
+        site = command.get('site')
+        if site:
+            return [site] if site in self.cores else []
+        points = set(command.get('points') or ())
+        if command.get('command') == 'collect' and points and not command.get('ips'):
+            return [site.name for site in self.sites if site.points is None or site.points & points]
+        return list(self.cores)
+
+    def handle_command(self, command: dict) -> dict:
+        """
+        Handles a command of the command channel (see `SchedulerCore.handle_command`).
+
+        A command with a `site` field goes to that site; otherwise it goes to every site
+        (a collect of points only goes to the sites of those points) and the responses
+        are returned by site. The `sites` command returns the sites and their use of the
+        shared session budget.
+        """
+        name = command.get('command')
+        if name == 'sites':
+            shares = {share['site']: share for share in self.fair_share.snapshot()} if self.fair_share else {}
+            return {
+                'ok': True,
+                'max_sessions': self.fair_share.max_sessions if self.fair_share else None,
+                'sites': [{**site.to_dict(), **shares.get(site.name, {})} for site in self.sites]
+            }
+        names = self.targeted_sites(command)
+        if command.get('site') and not names:
+            return {'ok': False, 'error': f'Sitio desconocido: {command["site"]}'}
+        if command.get('site'):
+            return self.cores[names[0]].handle_command(command)
+        responses = {site: self.cores[site].handle_command(command) for site in names}
+        return {'ok': all(response.get('ok') for response in responses.values()), 'sites': responses}
+
+def main(argv=None):
+    """
+    Checks the sites file.
+
+    Usage:
+        python -m scripts.business_logic.multi_site check
+        python -m scripts.business_logic.multi_site check --sites D:/sitios/sites.ini --json
+    """
+    parser = argparse.ArgumentParser(description='Configuracion de varios sitios en un mismo servicio')
+    parser.add_argument('--sites', help=f'Archivo de sitios (por defecto, {SITES_FILE} en el directorio raiz)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    check_parser = subparsers.add_parser('check', help='Valida el archivo de sitios y muestra los sitios')
+    check_parser.add_argument('--json', action='store_true')
+    args = parser.parse_args(argv)
+
+    path = args.sites or os.path.join(find_root_directory(), SITES_FILE)
+    try:
+        sites, max_sessions = load_sites(path)
+    except SiteConfigError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps({'max_sessions': max_sessions, 'sites': [site.to_dict() for site in sites]}, indent=2, ensure_ascii=False))
+        return 0
+    for site in sites:
+        points = ', '.join(sorted(site.points)) if site.points is not None else 'todos'
+        missing = [name for name in ('config.ini', 'schedule.txt') if not os.path.isfile(os.path.join(site.root, name))]
+        print(f'{site.name}\t{site.root}\tpuntos: {points}\tpeso {site.weight:g}\tsesiones {site.max_sessions or "-"}'
+              + (f'\tfalta {", ".join(missing)}' if missing else ''))
+    print(f'{path}: {len(sites)} sitios, sesiones compartidas: {max_sessions or "sin limite"}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,30 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+# Locks of the files the common package always writes under the root directory of the
+# application, whatever the root of the manager. The sites of the multi-site mode run
+# their managers in the same process, so every manager takes these process-wide locks
+# instead of its own. The per-device attendance files need none: a device belongs to a
+# single site (see `multi_site.load_sites`).
+
+import threading
+
+INVENTORY_LOCK = threading.Lock()  # Device inventory: model names and battery status
+GLOBAL_ATTENDANCES_LOCK = threading.Lock()  # Global attendance file
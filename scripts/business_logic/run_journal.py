@@ -0,0 +1,478 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timedelta
+from scripts.common.utils.file_manager import find_root_directory
+
+JOURNAL_FOLDER = 'journal'
+MONTH_FORMAT = '%Y-%m'
+
+OUTCOME_OK = 'ok'
+OUTCOME_CONNECTION_FAILED = 'connection failed'
+OUTCOME_BATTERY_FAILING = 'battery failing'
+OUTCOME_ERROR = 'error'
+
+TASK_ATTENDANCES = 'attendances'
+
+EWMA_ALPHA = 0.3  # Weight of the newest sample in the moving averages kept by the index
+# Fields carried over from the previous month so the averages do not restart with each segment
+CARRIED_FIELDS = ('ewma_duration', 'ewma_interval_hours', 'consecutive_failures', 'last_success', 'last_clear')
+
+def new_journal_record(task: str, device) -> dict:
+    """
+    Builds an empty journal record for a device taking part in a run.
+
+    Args:
+        task (str): The task that produced the record ('attendances' or 'hour').
+        device (Device): The device the record belongs to.
+
+    Returns:
+        dict: A record with every field initialized, ready to be filled in by the worker.
+    """
+    return {
+        'ts': datetime.now().isoformat(timespec='seconds'),
+        'task': task,
+        'ip': device.ip,
+        'point': device.point,
+        'model': device.model_name,
+        'outcome': OUTCOME_OK,
+        'attendances': 0,
+        'with_error': 0,
+        'duration': 0.0,
+        'error': None,
+        'cleared': False,
+        'skipped': False,
+        'bytes_saved': 0,
+    }
+
+class RunJournal:
+    """
+    Append-only journal with one structured record per device and run.
+
+    Records are stored as JSON lines in one segment per month
+    (`journal/<YYYY-MM>.jsonl`). Next to each segment an index
+    (`journal/<YYYY-MM>.idx.json`) keeps per-device aggregates that are updated
+    on every append, so queries over a whole year only read twelve small files
+    instead of scanning every record.
+
+    The aggregates of each device are kept per task: the fields of the entry of an IP
+    describe the collection ('attendances') and the other tasks (the time
+    synchronization, 'hour') are kept under `tasks`, so a device whose time sync
+    succeeds while its collection keeps failing is still reported, and its
+    durations and intervals are not mixed with the ones of the sync.
+    """
+
+    def __init__(self, root: str = None):
+        """
+        Initializes the journal.
+
+        Args:
+            root (str, optional): Directory that contains the `journal` folder.
+                Defaults to the root directory of the application.
+        """
+        self.folder = os.path.join(root or find_root_directory(), JOURNAL_FOLDER)
+
+    def new_run_id(self) -> str:
+        """
+        Returns an identifier for a new run, based on the current timestamp.
+        """
+        return datetime.now().strftime('%Y%m%d%H%M%S%f')
+
+    def segment_path(self, month: str) -> str:
+        return os.path.join(self.folder, f'{month}.jsonl')
+
+    def index_path(self, month: str) -> str:
+        return os.path.join(self.folder, f'{month}.idx.json')
+
+    def append_run(self, run_id: str, records: list[dict]):
+        """
+        Appends the records of a finished run and updates the monthly indexes.
+
+        Args:
+            run_id (str): Identifier shared by every record of the run.
+            records (list[dict]): Records built with `new_journal_record`.
+        """
+        if not records:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+
+        by_month: dict[str, list[dict]] = {}
+        for record in records:
+            record['run_id'] = run_id
+            month = record['ts'][:7]
+            by_month.setdefault(month, []).append(record)
+
+        for month, month_records in by_month.items():
+            with open(self.segment_path(month), 'a', encoding='utf-8') as segment:
+                for record in month_records:
+                    segment.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+            index = self.load_index(month)
+            previous_index = None
+            for record in month_records:
+                entry = task_entry(index, record)
+                if entry is None:
+                    if previous_index is None:
+                        previous_index = self.load_index(month_range_offset(month, -1))
+                    previous_entry = task_entry(previous_index, record) or {}
+                    entry = task_entry(index, record, {key: previous_entry[key] for key in CARRIED_FIELDS if key in previous_entry})
+                self.__update_index_entry(entry, record)
+            self.__write_index(month, index)
+
+    def load_index(self, month: str) -> dict:
+        """
+        Loads the per-device aggregates of a month.
+
+        Args:
+            month (str): Month in `YYYY-MM` format.
+
+        Returns:
+            dict: Aggregates keyed by device IP, empty if the month has no records.
+        """
+        try:
+            with open(self.index_path(month), 'r', encoding='utf-8') as index_file:
+                return json.load(index_file)
+        except FileNotFoundError:
+            return {}
+        except ValueError as e:
+            # A damaged index can always be rebuilt from its segment
+            logging.warning(f'Indice del diario {month} corrupto, reconstruyendo: {e}')
+            return self.rebuild_index(month)
+
+    def rebuild_index(self, month: str) -> dict:
+        """
+        Rebuilds the index of a month from its JSON lines segment.
+
+        Args:
+            month (str): Month in `YYYY-MM` format.
+
+        Returns:
+            dict: The rebuilt aggregates keyed by device IP.
+        """
+        index: dict = {}
+        for record in self.iter_records([month]):
+            self.__update_index_entry(task_entry(index, record) or task_entry(index, record, {}), record)
+        if index:
+            self.__write_index(month, index)
+        return index
+
+    def iter_records(self, months: list[str], ip: str = None):
+        """
+        Iterates over the raw records of the given months.
+
+        Args:
+            months (list[str]): Months in `YYYY-MM` format.
+            ip (str, optional): If given, only records of this device are yielded.
+
+        Yields:
+            dict: Journal records in the order they were written.
+        """
+        for month in months:
+            try:
+                with open(self.segment_path(month), 'r', encoding='utf-8') as segment:
+                    for line in segment:
+                        if ip and f'"ip":"{ip}"' not in line:
+                            continue
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            # Partially written line from an interrupted run
+                            continue
+            except FileNotFoundError:
+                continue
+
+    def available_months(self) -> list[str]:
+        """
+        Returns the months that have an index, sorted in ascending order.
+        """
+        if not os.path.isdir(self.folder):
+            return []
+        return sorted(name[:-len('.idx.json')] for name in os.listdir(self.folder) if name.endswith('.idx.json'))
+
+    def merged_index(self, months: list[str], task: str = TASK_ATTENDANCES) -> dict:
+        """
+        Merges the per-device aggregates of a task over several months.
+
+        Args:
+            months (list[str]): Months in `YYYY-MM` format.
+            task (str): 'attendances' (collection) or 'hour' (time synchronization).
+
+        Returns:
+            dict: Aggregates keyed by device IP covering every given month.
+        """
+        merged: dict = {}
+        for month in months:
+            for ip, device_entry in self.load_index(month).items():
+                entry = device_entry if task == TASK_ATTENDANCES else device_entry.get('tasks', {}).get(task)
+                if not entry or not entry.get('runs'):
+                    continue
+                target = merged.setdefault(ip, {})
+                for key in ('runs', 'failures', 'attendances', 'empty_runs', 'skipped', 'bytes_saved'):
+                    target[key] = target.get(key, 0) + entry.get(key, 0)
+                target['total_duration'] = target.get('total_duration', 0.0) + entry.get('total_duration', 0.0)
+                target['max_duration'] = max(target.get('max_duration', 0.0), entry.get('max_duration', 0.0))
+                for key in ('last_run', 'last_success', 'last_clear'):
+                    if entry.get(key) and entry[key] > (target.get(key) or ''):
+                        target[key] = entry[key]
+                if entry.get('last_run') and entry['last_run'] >= (target.get('last_run') or ''):
+                    # Moving averages and streaks come from the most recent month
+                    for key in ('last_outcome', 'consecutive_failures', 'ewma_duration', 'ewma_interval_hours'):
+                        if key in entry:
+                            target[key] = entry[key]
+                target['point'] = entry.get('point', target.get('point'))
+                target['model'] = entry.get('model', target.get('model'))
+                errors = target.setdefault('errors', {})
+                for code, count in entry.get('errors', {}).items():
+                    errors[code] = errors.get(code, 0) + count
+        return merged
+
+    def failures(self, months: list[str], min_failures: int = 1, task: str = TASK_ATTENDANCES) -> list[tuple[str, dict]]:
+        """
+        Returns the devices that failed at least `min_failures` times.
+
+        Args:
+            months (list[str]): Months in `YYYY-MM` format.
+            min_failures (int): Minimum number of failed runs.
+            task (str): Task of the runs (see `merged_index`).
+
+        Returns:
+            list[tuple[str, dict]]: (ip, aggregates) pairs sorted by failures, descending.
+        """
+        index = self.merged_index(months, task)
+        result = [(ip, entry) for ip, entry in index.items() if entry.get('failures', 0) >= min_failures]
+        return sorted(result, key=lambda item: (-item[1]['failures'], item[0]))
+
+    def slowest(self, months: list[str], top: int = 10, task: str = TASK_ATTENDANCES) -> list[tuple[str, dict]]:
+        """
+        Returns the devices with the highest average run duration.
+
+        Args:
+            months (list[str]): Months in `YYYY-MM` format.
+            top (int): Maximum number of devices returned.
+            task (str): Task of the runs (see `merged_index`).
+
+        Returns:
+            list[tuple[str, dict]]: (ip, aggregates) pairs sorted by average duration, descending.
+        """
+        index = self.merged_index(months, task)
+        for entry in index.values():
+            entry['avg_duration'] = entry['total_duration'] / entry['runs'] if entry.get('runs') else 0.0
+        result = sorted(index.items(), key=lambda item: -item[1]['avg_duration'])
+        return result[:top]
+
+    def missing_data(self, months: list[str], days: int = 7, task: str = TASK_ATTENDANCES) -> list[tuple[str, dict]]:
+        """
+        Returns the devices without a successful collection (or run of `task`) in the last `days` days.
+
+        Args:
+            months (list[str]): Months in `YYYY-MM` format.
+            days (int): Number of days without a successful run to report a device.
+            task (str): Task of the runs (see `merged_index`).
+
+        Returns:
+            list[tuple[str, dict]]: (ip, aggregates) pairs, devices that never succeeded first.
+        """
+        limit = (datetime.now() - timedelta(days=days)).isoformat(timespec='seconds')
+        index = self.merged_index(months, task)
+        result = [(ip, entry) for ip, entry in index.items() if (entry.get('last_success') or '') < limit]
+        return sorted(result, key=lambda item: (item[1].get('last_success') or '', item[0]))
+
+    def __update_index_entry(self, entry: dict, record: dict):
+        entry['point'] = record.get('point')
+        entry['model'] = record.get('model')
+        entry['runs'] = entry.get('runs', 0) + 1
+        entry['total_duration'] = round(entry.get('total_duration', 0.0) + record.get('duration', 0.0), 3)
+        entry['max_duration'] = max(entry.get('max_duration', 0.0), record.get('duration', 0.0))
+        entry['last_run'] = record['ts']
+        entry['last_outcome'] = record['outcome']
+        if record.get('skipped'):
+            entry['skipped'] = entry.get('skipped', 0) + 1
+            entry['bytes_saved'] = entry.get('bytes_saved', 0) + record.get('bytes_saved', 0)
+        if record['outcome'] == OUTCOME_OK:
+            duration = record.get('duration', 0.0)
+            # Skipped runs say nothing about how long a download takes
+            if not record.get('skipped'):
+                entry['ewma_duration'] = round(ewma(entry.get('ewma_duration'), duration), 3)
+            if entry.get('last_success'):
+                hours = (datetime.fromisoformat(record['ts']) - datetime.fromisoformat(entry['last_success'])).total_seconds() / 3600
+                if hours > 0:
+                    entry['ewma_interval_hours'] = round(ewma(entry.get('ewma_interval_hours'), hours), 3)
+            entry['consecutive_failures'] = 0
+            entry['last_success'] = record['ts']
+            entry['attendances'] = entry.get('attendances', 0) + record.get('attendances', 0)
+            if task_of(record) == TASK_ATTENDANCES and not record.get('attendances'):
+                entry['empty_runs'] = entry.get('empty_runs', 0) + 1
+        else:
+            entry['failures'] = entry.get('failures', 0) + 1
+            entry['consecutive_failures'] = entry.get('consecutive_failures', 0) + 1
+        if record.get('cleared'):
+            entry['last_clear'] = record['ts']
+        if record.get('error') is not None:
+            errors = entry.setdefault('errors', {})
+            code = str(record['error'])
+            errors[code] = errors.get(code, 0) + 1
+
+    def __write_index(self, month: str, index: dict):
+        # Write to a temporary file first so a crash never leaves a truncated index
+        path = self.index_path(month)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as index_file:
+            json.dump(index, index_file, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+def task_of(record: dict) -> str:
+    # Records written before the task field existed are collections
+    return record.get('task') or TASK_ATTENDANCES
+
+def task_entry(index: dict, record: dict, new_entry: dict = None) -> dict:
+    """
+    Returns the aggregates of the device and task of a record in a monthly index, or None
+    if there are none yet. With `new_entry`, stores it as those aggregates and returns it.
+    """
+    task = task_of(record)
+    if new_entry is not None:
+        device_entry = index.setdefault(record['ip'], {})
+        if task == TASK_ATTENDANCES:
+            device_entry.update(new_entry)
+            return device_entry
+        return device_entry.setdefault('tasks', {}).setdefault(task, new_entry)
+    device_entry = index.get(record['ip'])
+    if device_entry is None:
+        return None
+    if task == TASK_ATTENDANCES:
+        return device_entry if 'runs' in device_entry else None
+    return device_entry.get('tasks', {}).get(task)
+
+def ewma(previous, sample: float) -> float:
+    """
+    Exponentially weighted moving average update with weight `EWMA_ALPHA`.
+    """
+    if previous is None:
+        return sample
+    return EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * previous
+
+def recent_months(count: int, now: datetime = None) -> list[str]:
+    """
+    Returns the last `count` months (including the current one) in `YYYY-MM` format.
+    """
+    current_month = (now or datetime.now()).strftime(MONTH_FORMAT)
+    return month_range(month_range_offset(current_month, 1 - count), current_month)
+
+def month_range_offset(month: str, offset: int) -> str:
+    """
+    Returns the month `offset` months away from `month` (both in `YYYY-MM` format).
+    """
+    year, number = map(int, month.split('-'))
+    total = year * 12 + (number - 1) + offset
+    return f'{total // 12:04d}-{total % 12 + 1:02d}'
+
+def month_range(start: str, end: str) -> list[str]:
+    """
+    Returns every month between `start` and `end`, both included.
+
+    Args:
+        start (str): First month in `YYYY-MM` format.
+        end (str): Last month in `YYYY-MM` format.
+
+    Returns:
+        list[str]: Months in `YYYY-MM` format.
+    """
+    year, month = map(int, start.split('-'))
+    end_year, end_month = map(int, end.split('-'))
+    months = []
+    while (year, month) <= (end_year, end_month):
+        months.append(f'{year:04d}-{month:02d}')
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return months
+
+def main(argv: list[str] = None):
+    """
+    Command line entry point to query the run journal.
+
+    Examples:
+        python -m scripts.business_logic.run_journal failures --min 3
+        python -m scripts.business_logic.run_journal slowest --top 5 --from 2025-11
+        python -m scripts.business_logic.run_journal missing --days 7
+        python -m scripts.business_logic.run_journal --task hour failures
+        python -m scripts.business_logic.run_journal rebuild --from 2025-01
+    """
+    current_month = datetime.now().strftime(MONTH_FORMAT)
+    parser = argparse.ArgumentParser(description='Consultas sobre el diario de ejecuciones')
+    parser.add_argument('--root', help='Directorio raiz de la aplicacion')
+    parser.add_argument('--from', dest='start', help='Primer mes (YYYY-MM)')
+    parser.add_argument('--to', dest='end', default=current_month, help='Ultimo mes (YYYY-MM)')
+    parser.add_argument('--json', action='store_true', help='Salida en formato JSON')
+    parser.add_argument('--task', choices=(TASK_ATTENDANCES, 'hour'), default=TASK_ATTENDANCES,
+                        help='Tarea consultada: obtencion de marcaciones o sincronizacion de hora')
+    subparsers = parser.add_subparsers(dest='query', required=True)
+    failures_parser = subparsers.add_parser('failures', help='Dispositivos con fallas')
+    failures_parser.add_argument('--min', type=int, default=1, help='Cantidad minima de fallas')
+    slowest_parser = subparsers.add_parser('slowest', help='Dispositivos mas lentos')
+    slowest_parser.add_argument('--top', type=int, default=10, help='Cantidad de dispositivos')
+    missing_parser = subparsers.add_parser('missing', help='Dispositivos sin datos recientes')
+    missing_parser.add_argument('--days', type=int, default=7, help='Dias sin una ejecucion exitosa')
+    subparsers.add_parser('rebuild', help='Reconstruye los indices mensuales desde los registros')
+    args = parser.parse_args(argv)
+
+    journal = RunJournal(args.root)
+    if args.start:
+        months = month_range(args.start, args.end)
+    elif args.query == 'failures':
+        months = [args.end]
+    else:
+        months = [month for month in journal.available_months() if month <= args.end][-12:]
+
+    if args.query == 'rebuild':
+        for month in months:
+            index = journal.rebuild_index(month)
+            print(f'{month}: {len(index)} dispositivos')
+        return
+
+    if args.query == 'failures':
+        result = journal.failures(months, args.min, args.task)
+        columns = ('failures', 'runs', 'skipped', 'last_outcome', 'errors')
+    elif args.query == 'slowest':
+        result = journal.slowest(months, args.top, args.task)
+        columns = ('avg_duration', 'max_duration', 'runs')
+    else:
+        result = journal.missing_data(months, args.days, args.task)
+        columns = ('last_success', 'last_outcome', 'runs')
+
+    if args.json:
+        json.dump([{'ip': ip, **entry} for ip, entry in result], sys.stdout, indent=2)
+        print()
+        return
+
+    print(f'Meses: {months[0] if months else "-"} .. {months[-1] if months else "-"} - Dispositivos: {len(result)}')
+    for ip, entry in result:
+        values = []
+        for column in columns:
+            value = entry.get(column)
+            values.append(f'{column}={value:.2f}' if isinstance(value, float) else f'{column}={value}')
+        print(f'{ip:<16} {str(entry.get("point")):<20} ' + ' '.join(values))
+
+if __name__ == '__main__':
+    main()
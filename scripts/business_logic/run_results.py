@@ -0,0 +1,116 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+
+class DeviceResult:
+    """
+    Outcome of one device in a run, filled by the worker that processes the device.
+
+    The worker owns the object while it works, so setting its fields needs no
+    lock. When the device is done, the result is added to a `ResultBuffers`; the
+    shared dicts of the run are only built from them, in a single merge, once the
+    workers are done (see `merge_results`), so readers never see a half-written
+    entry and workers never write to a shared dict.
+    """
+
+    __slots__ = ('ip', 'connection_failed', 'battery_failing', 'attendance_count')
+
+    def __init__(self, ip: str):
+        self.ip = ip
+        self.connection_failed: bool = None
+        self.battery_failing: bool = None
+        self.attendance_count: int = None
+
+    def attendance_entry(self) -> dict:
+        """
+        Returns the entry of `attendances_count_devices` for the device, or None if the
+        device did not reach any outcome (unexpected error).
+        """
+        if self.connection_failed:
+            return {"connection failed": True}
+        if self.attendance_count is not None:
+            return {"attendance count": str(self.attendance_count)}
+        return None
+
+    def error_entry(self) -> dict:
+        """
+        Returns the entry of `devices_errors` for the device, with every field that was
+        determined, or None if none was.
+        """
+        entry = {}
+        if self.connection_failed is not None:
+            entry["connection failed"] = self.connection_failed
+        if self.battery_failing is not None:
+            entry["battery failing"] = self.battery_failing
+        return entry or None
+
+class ResultBuffers:
+    """
+    Collects items (e.g. journal records) produced by concurrent workers without a shared lock.
+
+    Each worker (thread or, under eventlet, green thread) appends to its own list.
+    `drain` merges every list once, at the end of the run.
+    """
+
+    def __init__(self):
+        self.buffers: dict[int, list] = {}
+
+    def add(self, item):
+        ident = threading.get_ident()
+        buffer = self.buffers.get(ident)
+        if buffer is None:
+            # setdefault is atomic: the buffer of a worker is created only once
+            buffer = self.buffers.setdefault(ident, [])
+        buffer.append(item)
+
+    def items(self) -> list:
+        """
+        Returns every item collected so far, in no particular order, without removing them.
+        """
+        return [item for buffer in list(self.buffers.values()) for item in list(buffer)]
+
+    def drain(self) -> list:
+        """
+        Returns every item collected so far, in no particular order, and starts over.
+        """
+        buffers, self.buffers = self.buffers, {}
+        return [item for buffer in buffers.values() for item in buffer]
+
+    def __len__(self) -> int:
+        return sum(len(buffer) for buffer in list(self.buffers.values()))
+
+def merge_results(target: dict, results: list[DeviceResult], entry) -> dict:
+    """
+    Publishes the results of the devices of a run in a dict keyed by IP.
+
+    Args:
+        target (dict): The dict of the run (`attendances_count_devices` or `devices_errors`).
+        results (list[DeviceResult]): The results collected by the workers.
+        entry (callable): Builds the entry of a result (`DeviceResult.attendance_entry`
+            or `DeviceResult.error_entry`); results without an entry are left out.
+
+    Returns:
+        dict: `target`, updated.
+    """
+    for result in results:
+        value = entry(result)
+        if value is not None:
+            target[result.ip] = value
+    return target
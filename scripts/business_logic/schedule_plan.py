@@ -0,0 +1,382 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import heapq
+import itertools
+import os
+import re
+import sys
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+
+TASK_ATTENDANCES = 'attendances'
+TASK_TIME = 'time'
+# Headers of schedule.txt (a comment line) and the task of the lines that follow them
+TASK_HEADERS = {
+    'gestionar_marcaciones_dispositivos': TASK_ATTENDANCES,
+    'actualizar_hora_dispositivos': TASK_TIME,
+}
+# Monday = 0, as datetime.weekday()
+DAY_NAMES = {
+    'lun': 0, 'mar': 1, 'mie': 2, 'mié': 2, 'jue': 3, 'vie': 4, 'sab': 5, 'sáb': 5, 'dom': 6,
+    'mon': 0, 'tue': 1, 'wed': 2, 'thu': 3, 'fri': 4, 'sat': 5, 'sun': 6,
+}
+SECONDS_PER_DAY = 24 * 60 * 60
+CALENDAR_SEARCH_DAYS = 366 * 8  # Covers a 29th of February in a leap year
+TIME_PATTERN = re.compile(r'^(\d{1,2}):(\d{2})(?::(\d{2}))?$')
+CRON_FIELD_PATTERN = re.compile(r'^[\d*/,\-]+$')
+
+class ScheduleError(ValueError):
+    """
+    Invalid line of the schedule file.
+    """
+
+    def __init__(self, line: int, text: str, reason: str):
+        self.line = line
+        self.text = text
+        self.reason = reason
+        super().__init__(f'Linea {line} ({text!r}): {reason}')
+
+class ScheduleEntry:
+    """
+    One validated line of the schedule: when a task runs and on which devices.
+
+    `seconds` holds the seconds of the day (0-86399) of the runs. The day rules follow
+    cron: `weekdays`, `monthdays` and `months` are None when unrestricted; when both
+    `weekdays` and `monthdays` are given, a day matches if it matches either of them.
+    An entry without `monthdays` and `months` repeats every week ("weekly").
+    """
+
+    __slots__ = ('task', 'seconds', 'weekdays', 'monthdays', 'months', 'points', 'line', 'text')
+
+    def __init__(self, task: str, seconds, weekdays=None, monthdays=None, months=None, points=None, line: int = 0, text: str = ''):
+        self.task = task
+        self.seconds = tuple(sorted(set(seconds)))
+        self.weekdays = frozenset(weekdays) if weekdays is not None else None
+        self.monthdays = frozenset(monthdays) if monthdays is not None else None
+        self.months = frozenset(months) if months is not None else None
+        self.points = tuple(points or ())
+        self.line = line
+        self.text = text
+
+    @property
+    def weekly(self) -> bool:
+        return self.monthdays is None and self.months is None
+
+    def matches_day(self, day: date) -> bool:
+        if self.months is not None and day.month not in self.months:
+            return False
+        if self.weekdays is None and self.monthdays is None:
+            return True
+        if self.monthdays is None:
+            return day.weekday() in self.weekdays
+        if self.weekdays is None:
+            return day.day in self.monthdays
+        return day.weekday() in self.weekdays or day.day in self.monthdays
+
+    def next_after(self, after: datetime) -> datetime:
+        """
+        Returns the first run strictly after `after`, or None if the entry never runs.
+        """
+        day = after.date()
+        for _ in range(CALENDAR_SEARCH_DAYS):
+            if self.matches_day(day):
+                midnight = datetime.combine(day, datetime.min.time())
+                for second in self.seconds:
+                    run = midnight + timedelta(seconds=second)
+                    if run > after:
+                        return run
+            day += timedelta(days=1)
+        return None
+
+    def to_dict(self) -> dict:
+        return {'task': self.task, 'line': self.line, 'text': self.text, 'points': list(self.points)}
+
+    def __repr__(self):
+        return f'ScheduleEntry({self.task}, linea {self.line}: {self.text!r})'
+
+class SchedulePlan:
+    """
+    Compiled content of `schedule.txt`.
+
+    The file keeps its original layout: a header comment names the task and each
+    following line is one run. A line may add days and points to the time, or be a
+    cron expression (minute hour day-of-month month day-of-week):
+
+        # gestionar_marcaciones_dispositivos
+        08:00
+        13:30 lun-vie
+        12:00:30
+        18:00 lun,mie,vie @Sucursal Centro, Deposito
+        */30 8-18 * * 1-5 @Sucursal Norte
+        # actualizar_hora_dispositivos
+        12:00
+
+    Points follow an `@`, separated by commas; without points the run targets every
+    active device. Any other comment line is ignored.
+    """
+
+    def __init__(self, entries: list[ScheduleEntry] = None, errors: list[ScheduleError] = None):
+        self.entries = entries or []
+        self.errors = errors or []
+
+    @classmethod
+    def parse(cls, lines, strict: bool = False) -> 'SchedulePlan':
+        """
+        Compiles the lines of a schedule file.
+
+        Args:
+            lines (iterable[str]): The lines of the file.
+            strict (bool): Raise the first `ScheduleError` instead of collecting it in
+                `errors` and skipping the line.
+
+        Returns:
+            SchedulePlan: The valid entries, in file order.
+        """
+        plan = cls()
+        task = None
+        for number, raw in enumerate(lines, start=1):
+            line = raw.strip()
+            if not line:
+                continue
+            try:
+                if line.startswith('#'):
+                    words = line.lstrip('#').split()
+                    if words and words[0] in TASK_HEADERS:
+                        task = TASK_HEADERS[words[0]]
+                    continue
+                if task is None:
+                    raise ScheduleError(number, line, 'horario antes de la linea de tarea (# gestionar_marcaciones_dispositivos o # actualizar_hora_dispositivos)')
+                entry = parse_entry(task, line, number)
+                if entry.next_after(datetime(2000, 1, 1)) is None:
+                    raise ScheduleError(number, line, 'la expresion nunca se cumple')
+                plan.entries.append(entry)
+            except ScheduleError as e:
+                if strict:
+                    raise
+                plan.errors.append(e)
+        return plan
+
+    @classmethod
+    def load(cls, path: str, strict: bool = False) -> 'SchedulePlan':
+        with open(path, encoding='utf-8') as file:
+            return cls.parse(file.read().splitlines(), strict)
+
+    def tasks(self, task: str) -> list[ScheduleEntry]:
+        return [entry for entry in self.entries if entry.task == task]
+
+def parse_entry(task: str, line: str, number: int) -> ScheduleEntry:
+    """
+    Parses one run line: `HH:MM[:SS] [days] [@points]` or `<cron> [@points]`.
+
+    Raises:
+        ScheduleError: If the line is not valid.
+    """
+    when, separator, points_text = line.partition('@')
+    points = [point.strip() for point in points_text.split(',') if point.strip()]
+    if separator and not points:
+        raise ScheduleError(number, line, 'falta el punto despues de @')
+    fields = when.split()
+    if not fields:
+        raise ScheduleError(number, line, 'falta el horario')
+
+    time_match = TIME_PATTERN.match(fields[0])
+    if time_match:
+        hour, minute, second = (int(value or 0) for value in time_match.groups())
+        if hour > 23 or minute > 59 or second > 59:
+            raise ScheduleError(number, line, f'hora invalida {fields[0]}')
+        if len(fields) > 2:
+            raise ScheduleError(number, line, 'se esperaba HH:MM[:SS] [dias] [@puntos]')
+        weekdays = parse_days(fields[1], number, line) if len(fields) == 2 else None
+        return ScheduleEntry(task, [(hour * 60 + minute) * 60 + second], weekdays, points=points, line=number, text=line)
+
+    if len(fields) == 5 and all(CRON_FIELD_PATTERN.match(field) for field in fields):
+        minutes = parse_cron_field(fields[0], 0, 59, number, line)
+        hours = parse_cron_field(fields[1], 0, 23, number, line)
+        monthdays = parse_cron_field(fields[2], 1, 31, number, line)
+        months = parse_cron_field(fields[3], 1, 12, number, line)
+        weekdays = parse_cron_field(fields[4], 0, 7, number, line)
+        if weekdays is not None:
+            weekdays = {(day - 1) % 7 for day in weekdays}  # cron: 0 and 7 are Sunday
+        hours = range(24) if hours is None else hours
+        minutes = range(60) if minutes is None else minutes
+        return ScheduleEntry(task, [(hour * 60 + minute) * 60 for hour in hours for minute in minutes],
+                             weekdays, monthdays, months, points, number, line)
+
+    raise ScheduleError(number, line, 'se esperaba HH:MM[:SS] [dias] [@puntos] o una expresion cron de 5 campos')
+
+def parse_days(text: str, number: int, line: str) -> set[int]:
+    """
+    Parses days of the week: names (Spanish or English, three letters), lists and ranges,
+    e.g. `lun-vie` or `sab,dom`.
+    """
+    days = set()
+    for part in text.lower().split(','):
+        first, _, last = part.partition('-')
+        if first not in DAY_NAMES or (last and last not in DAY_NAMES):
+            raise ScheduleError(number, line, f'dia invalido {part!r}')
+        start = DAY_NAMES[first]
+        end = DAY_NAMES[last] if last else start
+        days.update((start + offset) % 7 for offset in range((end - start) % 7 + 1))
+    return days
+
+def parse_cron_field(text: str, low: int, high: int, number: int, line: str) -> set[int]:
+    """
+    Parses a cron field (`*`, `*/n`, `a`, `a-b`, `a-b/n` and lists of them).
+
+    Returns:
+        set[int]: The values, or None for an unrestricted field (`*`).
+    """
+    if text == '*':
+        return None
+    values = set()
+    for part in text.split(','):
+        base, _, step_text = part.partition('/')
+        try:
+            step = int(step_text) if step_text else 1
+            if base == '*':
+                start, end = low, high
+            else:
+                first, _, last = base.partition('-')
+                start = int(first)
+                end = int(last) if last else (high if step_text else start)
+        except ValueError:
+            raise ScheduleError(number, line, f'campo cron invalido {part!r}')
+        if step < 1 or start < low or end > high or start > end:
+            raise ScheduleError(number, line, f'campo cron fuera de rango {part!r} ({low}-{high})')
+        values.update(range(start, end + 1, step))
+    return values
+
+class ScheduleIndex:
+    """
+    Answers "what runs next" for a compiled plan in O(log n).
+
+    Weekly entries (every day, or some days of the week) are expanded once into a
+    sorted list of seconds of the week; the next run after any instant is a bisection
+    on that list. The few entries bound to the calendar (cron with day of month or
+    month) are merged through a heap of their next runs.
+    """
+
+    def __init__(self, plan: SchedulePlan):
+        self.plan = plan
+        slots: dict[int, list[ScheduleEntry]] = {}
+        self.calendar_entries: list[ScheduleEntry] = []
+        for entry in plan.entries:
+            if not entry.weekly:
+                self.calendar_entries.append(entry)
+                continue
+            for weekday in (entry.weekdays if entry.weekdays is not None else range(7)):
+                for second in entry.seconds:
+                    slots.setdefault(weekday * SECONDS_PER_DAY + second, []).append(entry)
+        self.keys = sorted(slots)
+        self.slots = {key: tuple(entries) for key, entries in slots.items()}
+
+    def __len__(self) -> int:
+        return len(self.keys) + len(self.calendar_entries)
+
+    def __iter_weekly(self, after: datetime):
+        if not self.keys:
+            return
+        week_start = datetime.combine(after.date() - timedelta(days=after.weekday()), datetime.min.time())
+        position = bisect_right(self.keys, (after - week_start).total_seconds())
+        while True:
+            if position == len(self.keys):
+                position = 0
+                week_start += timedelta(days=7)
+            key = self.keys[position]
+            yield week_start + timedelta(seconds=key), self.slots[key]
+            position += 1
+
+    def __iter_calendar(self, after: datetime):
+        sequence = itertools.count()
+        pending = []
+        for entry in self.calendar_entries:
+            run = entry.next_after(after)
+            if run is not None:
+                pending.append((run, next(sequence), entry))
+        heapq.heapify(pending)
+        while pending:
+            run, _, entry = heapq.heappop(pending)
+            yield run, (entry,)
+            following = entry.next_after(run)
+            if following is not None:
+                heapq.heappush(pending, (following, next(sequence), entry))
+
+    def iter_runs(self, after: datetime):
+        """
+        Yields (run time, entries) strictly after `after`, in order, one item per instant.
+        """
+        merged = heapq.merge(self.__iter_weekly(after), self.__iter_calendar(after), key=lambda item: item[0])
+        for run, group in itertools.groupby(merged, key=lambda item: item[0]):
+            yield run, tuple(entry for _, entries in group for entry in entries)
+
+    def next_runs(self, after: datetime, count: int = 1) -> list[tuple[datetime, tuple]]:
+        return list(itertools.islice(self.iter_runs(after), count))
+
+    def next_run(self, after: datetime) -> datetime:
+        runs = self.next_runs(after)
+        return runs[0][0] if runs else None
+
+    def due(self, since: datetime, until: datetime) -> list[tuple[datetime, ScheduleEntry]]:
+        """
+        Returns the runs in (since, until], each entry once (at its last run in the
+        window), like a missed job of a scheduler that runs it once and moves on.
+        """
+        since = max(since, until - timedelta(days=7))
+        latest: dict[int, tuple[datetime, ScheduleEntry]] = {}
+        for run, entries in self.iter_runs(since):
+            if run > until:
+                break
+            for entry in entries:
+                latest[id(entry)] = (run, entry)
+        return sorted(latest.values(), key=lambda item: (item[0], item[1].line))
+
+def main(argv=None):
+    """
+    Validates a schedule file and shows its next runs.
+
+    Usage:
+        python -m scripts.business_logic.schedule_plan check
+        python -m scripts.business_logic.schedule_plan next --count 10
+    """
+    from scripts.common.utils.file_manager import find_root_directory
+    parser = argparse.ArgumentParser(description='Valida schedule.txt y muestra las proximas ejecuciones')
+    parser.add_argument('--file', help='Archivo de horarios (por defecto, schedule.txt en la raiz)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('check', help='Valida el archivo')
+    next_parser = subparsers.add_parser('next', help='Muestra las proximas ejecuciones')
+    next_parser.add_argument('--count', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    plan = SchedulePlan.load(args.file or os.path.join(find_root_directory(), 'schedule.txt'))
+    for error in plan.errors:
+        print(f'Error: {error}', file=sys.stderr)
+    if args.command == 'check':
+        for task in (TASK_ATTENDANCES, TASK_TIME):
+            print(f'{task}: {len(plan.tasks(task))} lineas')
+    else:
+        for run, entries in ScheduleIndex(plan).next_runs(datetime.now(), args.count):
+            for entry in entries:
+                points = ', '.join(entry.points) or 'todos'
+                print(f'{run:%Y-%m-%d %a %H:%M:%S}\t{entry.task}\t{points}\t(linea {entry.line})')
+    return 1 if plan.errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
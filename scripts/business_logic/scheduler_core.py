@@ -0,0 +1,641 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock 
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import locale
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+
+from scripts import config
+from scripts.business_logic.archiver import ARCHIVE_SECTION, Archiver
+from scripts.business_logic.capacity_monitor import describe, tray_message
+from scripts.business_logic.device_metadata import DEFAULT_TTL_HOURS, DeviceMetadataCache, refresh_inventory
+from scripts.business_logic.hub_monitor import HubBlockingDetector
+from scripts.business_logic.export_feed import EXPORT_PORT, EXPORT_SECTION, ExportServer, open_feed
+from scripts.business_logic.command_channel import CommandServer, RunRequest, RunRequestQueue
+from scripts.business_logic.schedule_plan import TASK_ATTENDANCES, ScheduleIndex, SchedulePlan
+from scripts.business_logic.service_manager import AttendancesManager, HourManager, restrict_devices, select_devices
+from scripts.common.utils.file_manager import find_root_directory, load_from_file
+from version import SERVICE_VERSION
+
+INVENTORY_CHECK_SECONDS = 3600  # How often a disabled inventory refresh checks config.ini again
+
+# Spanish (Argentina) month names in the log folders; names differ between Windows and POSIX
+LOCALE_CANDIDATES = ('Spanish_Argentina.1252', 'es_AR.UTF-8', 'es_AR.utf8', 'es_AR', 'es_ES.UTF-8', 'es_ES.utf8')
+
+def set_time_locale(candidates=LOCALE_CANDIDATES) -> str:
+    """
+    Sets the time locale to the first available candidate.
+
+    Returns:
+        str: The locale set, or None if none is available (the default locale is kept).
+    """
+    for candidate in candidates:
+        try:
+            return locale.setlocale(locale.LC_TIME, candidate)
+        except locale.Error:
+            continue
+    logging.warning(f'Ningun locale disponible entre {", ".join(candidates)}, se usa el predeterminado')
+    return None
+
+class PlatformAdapter:
+    """
+    What the scheduling core needs from the host that runs it.
+
+    The default adapter runs headless: lifecycle events only go to the log and
+    there is no tray icon to update. The Windows service provides its own adapter
+    (see `schedulerService.py`) that reports to the service control manager.
+    """
+
+    name = 'headless'
+    has_tray_icon = False
+
+    def started(self, core: 'SchedulerCore'):
+        logging.info(f'Planificador iniciado ({self.name})')
+
+    def stopping(self, core: 'SchedulerCore'):
+        logging.info(f'Deteniendo planificador ({self.name})')
+
+class SchedulerCore:
+    """
+    Scheduling and collection core of the service, independent of the platform.
+
+    Runs the scheduled jobs of `schedule.txt`, the on-demand runs of the command
+    channel and the background stages (archival, export, blocking detection).
+    `schedulerService.py` hosts it as a Windows service and `schedulerHeadless.py`
+    runs it in the foreground on any platform.
+    """
+
+    def __init__(self, path: str = None, platform: PlatformAdapter = None, config_parser=None, points=None, shared_slots=None):
+        """
+        Initializes the scheduling core.
+        Args:
+            path (str, optional): Root directory (config.ini, schedule.txt, logs). Defaults to
+                the root directory of the application.
+            platform (PlatformAdapter, optional): The host. Defaults to a headless host.
+            config_parser (ConfigParser, optional): Parser config.ini is read into. Defaults to
+                the shared one; each site of the multi-site mode has its own (see `multi_site`).
+            points (iterable[str], optional): If given, only the devices of these points are processed.
+            shared_slots (callable, optional): Session budget shared with other sites (see `DispatchPolicy`).
+        This method performs the following:
+            - Creates the queue of on-demand runs fed by the command channel.
+            - Sets the Spanish time locale used to name the monthly log folders.
+        """
+        self.path = path or find_root_directory()
+        self.platform = platform or PlatformAdapter()
+        self.config = config_parser or config
+        self.points = set(points) if points is not None else None
+        self.shared_slots = shared_slots
+        self.is_running = True
+        self.run_requests = RunRequestQueue()
+        self.command_server = None
+        self.export_server = None
+        self.hub_detector = None
+        self.attendances_manager = None
+        self.hour_manager = None
+        self.schedule_index: ScheduleIndex = None
+        self.schedule_checked: datetime = None
+        self.archiver = None
+        self.last_archive_day = None
+        self.inventory_thread: threading.Thread = None
+        self.next_inventory_refresh = 0.0
+        set_time_locale()
+        self.current_log_month = datetime.today().strftime("%Y-%b")
+
+    def setup_logging(self):
+        """
+        Creates the logs folder of the current month and configures the debug and error log files.
+        """
+        logs_month_folder = os.path.join(self.path, 'logs', self.current_log_month)
+        os.makedirs(logs_month_folder, exist_ok=True)
+        debug_log_file = os.path.join(logs_month_folder, 'servicio_reloj_de_asistencias_'+SERVICE_VERSION+'_debug.log')
+        error_log_file = os.path.join(logs_month_folder, 'servicio_reloj_de_asistencias_'+SERVICE_VERSION+'_error.log')
+        self.configure_logging(debug_log_file, error_log_file)
+
+    def stop(self):
+        """
+        Stops the main loop and the background stages. The current run, if any, finishes first.
+        """
+        self.platform.stopping(self)
+        self.is_running = False
+        self.run_requests.wake()  # Do not wait for the end of the current idle period
+        if self.command_server:
+            self.command_server.stop()
+        if self.export_server:
+            self.export_server.stop()
+        if self.hub_detector:
+            self.hub_detector.stop()
+        if self.archiver:
+            self.archiver.stop()
+
+    def main(self):
+        """
+        Main method to manage the scheduling service.
+        This method configures the schedule, monitors and executes scheduled jobs,
+        and handles logging reconfiguration. It also updates the status icon based
+        on job execution status.
+        Workflow:
+        0. Starts the hub blocking detector if enabled (see `HubBlockingDetector`).
+        1. Configures the schedule using `self.configure_schedule()`.
+        2. Starts the command channel that accepts on-demand runs and, if enabled,
+           the HTTP export feed.
+        3. Continuously runs while `self.is_running` is True:
+            - Reconfigures logging if needed (e.g., on month change).
+            - Starts the daily archival of closed months in the background.
+            - Executes the scheduled jobs that are due (see `run_due_jobs`).
+            - Waits for an on-demand run, up to 60 seconds or until the next scheduled
+              job, and executes it right away.
+            - Updates the status icon to indicate job execution status.
+        Scheduled jobs and on-demand runs are executed one after the other by this
+        loop, so they never overlap and an on-demand run never cancels a scheduled one.
+        Exception Handling:
+        - Logs any errors encountered during schedule configuration, logging
+          reconfiguration, job execution, or icon updates.
+        Attributes:
+        - `self.is_running` (bool): Controls the execution loop.
+        - `self.schedule_index` (ScheduleIndex): The compiled schedule.
+        - `self.send_icon_update(status: str)`: Updates the status icon with the
+          given color ('yellow' for running, 'green' for idle).
+        Raises:
+        - Logs unexpected exceptions during execution.
+        """
+        #logging.debug("Path: "+os.path.abspath(__file__))
+        self.platform.started(self)
+
+        try:
+            self.config.read(os.path.join(self.path, 'config.ini'))
+            self.hub_detector = HubBlockingDetector.from_config(self.config)
+            if self.hub_detector:
+                self.hub_detector.start()
+        except Exception as e:
+            logging.error(f'Error al iniciar la deteccion de bloqueos: {e}')
+        
+        try:
+            self.configure_schedule()
+        except Exception as e:
+            logging.error(e)
+
+        if self.schedule_index is not None:
+            logging.debug(f'Tareas programadas: {len(self.schedule_index.plan.entries)}\n{self.schedule_index.plan.entries}')
+
+        try:
+            self.command_server = CommandServer(self.handle_command)
+            self.command_server.start()
+        except Exception as e:
+            logging.error(f'Error al iniciar el canal de comandos: {e}')
+
+        try:
+            self.start_export_server()
+        except Exception as e:
+            logging.error(f'Error al iniciar la exportacion HTTP: {e}')
+        
+        self.run_loop()
+
+    def run_loop(self, manage_logs: bool = True):
+        """
+        Runs the scheduled jobs and the on-demand runs until `stop` is called (step 3 of `main`).
+
+        Args:
+            manage_logs (bool): Reconfigure the log files on month change. The sites of the
+                multi-site mode share the logs of their host and pass False.
+        """
+        while self.is_running:
+            if manage_logs:
+                try:
+                    self.reconfigure_logging_if_needed()  # Check for month change.
+                except Exception as e:
+                    logging.error(f'Error al reconfigurar los logs: {e}')
+
+            try:
+                self.archive_closed_months_if_due()
+            except Exception as e:
+                logging.error(f'Error al iniciar el archivado: {e}')
+
+            try:
+                self.refresh_inventory_if_due()
+            except Exception as e:
+                logging.error(f'Error al iniciar la actualizacion del inventario: {e}')
+
+            try:
+                logging.debug('Ejecutando servicio...')
+                job_running = False
+                job_running = self.run_due_jobs()
+                if self.run_requested_collection(timeout=self.seconds_until_next_job(limit=60)):
+                    job_running = True
+            except Exception as e:
+                logging.error('Error inesperado: %s %s', e, e.__cause__)
+
+            try:
+                if job_running:
+                    self.send_icon_update('green')
+            except Exception as e:
+                logging.error(f'Error al enviar actualizacion de icono: {e}')
+            finally:
+                job_running = False
+
+    def reconfigure_logging_if_needed(self):
+        """
+        Reconfigures the logging system if the current month has changed.
+
+        This method checks if the current month is different from the last recorded
+        logging month. If so, it creates a new directory for the logs of the new month,
+        generates new log file paths for debug and error logs, and reconfigures the
+        logging system to use these new files.
+
+        The log files are named using the current service version and are stored in
+        a "logs" subdirectory under the specified path.
+
+        Side Effects:
+            - Creates a new directory for the current month's logs if it doesn't exist.
+            - Updates the logging configuration to use new log files.
+            - Updates the `current_log_month` attribute to the new month.
+
+        Attributes:
+            self.path (str): The base path where the logs directory is located.
+            self.current_log_month (str): The month of the currently active log files.
+            SERVICE_VERSION (str): The version of the service, used in log file names.
+
+        Raises:
+            OSError: If the directory creation fails.
+        """
+        new_month = datetime.today().strftime("%Y-%b")
+        if new_month != self.current_log_month:
+            month_folder = os.path.join(self.path, 'logs', new_month)
+            os.makedirs(month_folder, exist_ok=True)
+            debug_file = os.path.join(month_folder, f'servicio_reloj_de_asistencias_{SERVICE_VERSION}_debug.log')
+            error_file = os.path.join(month_folder, f'servicio_reloj_de_asistencias_{SERVICE_VERSION}_error.log')
+            self.configure_logging(debug_file, error_file)
+            self.current_log_month = new_month
+
+    def start_export_server(self):
+        """
+        Starts the loopback HTTP export feed (see `ExportFeed`) if `http_enabled` is set in the
+        `[Export_config]` section of config.ini and the SQLite sink is enabled.
+        """
+        config = self.config
+        config.read(os.path.join(self.path, 'config.ini'))
+        if not config.getboolean(EXPORT_SECTION, 'http_enabled', fallback=False):
+            return
+        feed = open_feed(config, self.path)
+        if feed is None:
+            logging.warning('La exportacion HTTP requiere sqlite_enabled en [Storage_config]')
+            return
+        self.export_server = ExportServer(feed, port=config.getint(EXPORT_SECTION, 'http_port', fallback=EXPORT_PORT))
+        self.export_server.start()
+
+    def archive_closed_months_if_due(self):
+        """
+        Starts the archival of closed months (see `Archiver`) once a day, in a background thread.
+
+        The files of months that are over (the logs by default) are compressed into
+        `archive/`. Opt-in: enabled with `enabled = True` in the `[Archive_config]`
+        section of config.ini.
+        """
+        today = datetime.today().date()
+        if self.last_archive_day == today:
+            return
+        self.last_archive_day = today
+        self.config.read(os.path.join(self.path, 'config.ini'))
+        if not self.config.getboolean(ARCHIVE_SECTION, 'enabled', fallback=False):
+            return
+        if self.archiver is None or not (self.archiver.thread and self.archiver.thread.is_alive()):
+            self.archiver = Archiver.from_config(self.config, self.path)
+        self.archiver.start_background()
+
+    def refresh_inventory_if_due(self):
+        """
+        Starts the refresh of the device inventory (see `refresh_inventory`) every
+        `inventory_refresh_hours` hours, in a background thread.
+
+        Low priority: only the entries older than `metadata_ttl_hours` are refreshed, with
+        `inventory_refresh_workers` devices at a time (2 by default), and each device waits
+        for a free slot in the concurrency budgets of the collection (see
+        `DispatchPolicy.budgets`). Opt-in: disabled while `inventory_refresh_hours` in the
+        `[Device_config]` section of config.ini is 0.
+        """
+        now = time.monotonic()
+        if now < self.next_inventory_refresh or self.attendances_manager is None:
+            return
+        if self.inventory_thread is not None and self.inventory_thread.is_alive():
+            return
+        self.config.read(os.path.join(self.path, 'config.ini'))
+        hours = self.config.getfloat('Device_config', 'inventory_refresh_hours', fallback=0)
+        if hours <= 0:
+            self.next_inventory_refresh = now + INVENTORY_CHECK_SECONDS
+            return
+        self.next_inventory_refresh = now + hours * 3600
+        workers = self.config.getint('Device_config', 'inventory_refresh_workers', fallback=2)
+        ttl_hours = self.config.getfloat('Device_config', 'metadata_ttl_hours', fallback=DEFAULT_TTL_HOURS)
+        self.inventory_thread = threading.Thread(target=self.refresh_inventory, args=(workers, ttl_hours),
+                                                 name='inventory', daemon=True)
+        self.inventory_thread.start()
+
+    def refresh_inventory(self, workers: int, ttl_hours: float):
+        """
+        Refreshes the stale metadata of the active devices of the core (step of `refresh_inventory_if_due`).
+        """
+        from scripts.common.business_logic.device_manager import get_devices_info
+        try:
+            devices = select_devices(restrict_devices(get_devices_info(), self.points))
+            cache = DeviceMetadataCache(self.path, ttl_hours)
+            cache.load()
+            refresh_inventory(devices, cache, workers, root=self.path,
+                              dispatch=lambda device: self.attendances_manager.dispatch.budgets(device))
+        except Exception as e:
+            logging.error(f'Error al actualizar el inventario: {e}')
+
+    def configure_schedule(self):
+        """
+        Compiles the schedule file into the index of scheduled jobs.
+        The schedule file groups execution times under comments that indicate the task
+        type (see `SchedulePlan` for days, points and cron expressions). For example:
+            # gestionar_marcaciones_dispositivos
+            08:00
+            14:00 lun-vie
+            # actualizar_hora_dispositivos
+            12:00
+        Invalid lines are logged and skipped; the valid ones are still scheduled.
+        Raises:
+            Exception: If there is an error loading the schedule file.
+        Notes:
+            - The schedule file must be named 'schedule.txt' and located in the root directory
+              of the core (`self.path`).
+            - Lines starting with '#' are task type indicators or comments.
+        """
+        # Path to the text file containing execution times
+        file_path = os.path.join(self.path, 'schedule.txt')
+
+        try:
+            content = load_from_file(file_path)  # Load content from the file
+        except Exception as e:
+            logging.error(e)  # Log error if the operation fails
+            return
+
+        plan = SchedulePlan.parse(content)
+        for error in plan.errors:
+            logging.error(f'Horario invalido en schedule.txt: {error}')
+        self.create_managers()
+        self.schedule_index = ScheduleIndex(plan)
+        self.schedule_checked = datetime.now()
+
+    def create_managers(self):
+        """
+        Creates the attendance and time managers, rooted at the root directory of the core
+        and restricted to its points.
+        """
+        self.attendances_manager = AttendancesManager(self.path, self.config)
+        self.hour_manager = HourManager(self.path, self.config)
+        for manager in (self.attendances_manager, self.hour_manager):
+            manager.points = self.points
+            manager.shared_slots = self.shared_slots
+
+    def run_due_jobs(self, now: datetime = None) -> bool:
+        """
+        Executes the scheduled jobs due since the last check, one after the other.
+
+        A job missed while another run was in progress is executed once, late, like
+        the `schedule` library did. Each job receives the seconds until the next job of
+        any kind (its slot), so the staggered start of its devices ends in time.
+
+        Returns:
+            bool: True if a job was executed.
+        """
+        if self.schedule_index is None:
+            return False
+        now = now or datetime.now()
+        due = self.schedule_index.due(self.schedule_checked, now)
+        self.schedule_checked = now
+        for run, entry in due:
+            logging.debug(f'Ejecutando tarea {entry}...')
+            self.send_icon_update('yellow')
+            following = self.schedule_index.next_run(run)
+            slot = (following - run).total_seconds() if following else None
+            points = list(entry.points) or None
+            if entry.task == TASK_ATTENDANCES:
+                self.safe_execute(self.attendances_manager.manage_devices_attendances, points=points, slot_seconds=slot)
+                self.report_capacity_alerts()
+            else:
+                self.safe_execute(self.hour_manager.manage_hour_devices, points=points, slot_seconds=slot)
+        return bool(due)
+
+    def seconds_until_next_job(self, limit: float) -> float:
+        """
+        Returns the seconds until the next scheduled job, at most `limit`.
+        """
+        if self.schedule_index is None:
+            return limit
+        now = datetime.now()
+        following = self.schedule_index.next_run(now)
+        if following is None:
+            return limit
+        return min(limit, max(0.0, (following - now).total_seconds()))
+
+    def upcoming_jobs(self, count: int = 5, resolve_devices: bool = True) -> list[dict]:
+        """
+        Returns the next scheduled jobs and, if possible, the devices each one targets.
+
+        Args:
+            count (int): Number of runs returned.
+            resolve_devices (bool): Resolve the points of each job to the active devices.
+
+        Returns:
+            list[dict]: One item per job: time, task, points, schedule line and device IPs.
+        """
+        if self.schedule_index is None:
+            return []
+        devices = None
+        if resolve_devices:
+            try:
+                from scripts.common.business_logic.device_manager import get_devices_info
+                devices = restrict_devices(get_devices_info(), self.points)
+            except Exception as e:
+                logging.warning(f'No se pudieron leer los dispositivos: {e}')
+        jobs = []
+        for run, entries in self.schedule_index.next_runs(datetime.now(), count):
+            for entry in entries:
+                job = {'time': run.isoformat(), **entry.to_dict()}
+                if devices is not None:
+                    job['ips'] = [device.ip for device in select_devices(devices, points=entry.points)]
+                jobs.append(job)
+        return jobs
+    
+    def run_requested_collection(self, timeout: float) -> bool:
+        """
+        Waits up to `timeout` seconds for an on-demand run and executes it.
+
+        The run uses the same `AttendancesManager` (and therefore the same engine and
+        persistence) as the scheduled jobs, restricted to the requested devices.
+
+        Args:
+            timeout (float): Maximum number of seconds to wait for a request.
+
+        Returns:
+            bool: True if a run was executed.
+        """
+        request = self.run_requests.get(timeout)
+        if request is None:
+            return False
+        if self.attendances_manager is None:
+            self.create_managers()
+        logging.info(f'Ejecutando obtencion de marcaciones a pedido: {request}')
+        self.send_icon_update('yellow')
+        self.safe_execute(self.attendances_manager.manage_devices_attendances, ips=request.ips, points=request.points)
+        self.report_capacity_alerts()
+        return True
+
+    def report_capacity_alerts(self):
+        """
+        Logs the new or escalated capacity alerts of the devices (see `CapacityMonitor`)
+        and shows them in the tray icon, most urgent first.
+        """
+        if self.attendances_manager is None:
+            return
+        try:
+            alerts = self.attendances_manager.capacity.new_alerts()
+            for status in alerts:
+                logging.warning(f'Capacidad de marcaciones ({status["level"]}): {describe(status)}')
+            if alerts:
+                self.send_icon_update(tray_message(alerts))
+        except Exception as e:
+            logging.error(f'Error al informar la capacidad de los dispositivos: {e}')
+
+    def handle_command(self, command: dict) -> dict:
+        """
+        Handles a command received through the command channel.
+
+        Supported commands:
+            - {"command": "collect", "ips": [...], "points": [...]}: queues an on-demand run
+              for the given devices (every active device if both lists are empty).
+            - {"command": "status"}: returns the pending requests and the next scheduled run.
+            - {"command": "next", "count": 5}: returns the next scheduled jobs and their devices.
+            - {"command": "capacity"}: returns the fill level, fill rate and projected time to
+              full of every device, and the current alerts.
+
+        Args:
+            command (dict): The received command.
+
+        Returns:
+            dict: The response sent back to the client.
+        """
+        name = command.get('command')
+        if name == 'collect':
+            request = RunRequest(command.get('ips'), command.get('points'), command.get('origin', 'cli'))
+            queued = self.run_requests.put(request)
+            return {'ok': True, 'queued': queued, 'pending': len(self.run_requests), 'request': request.to_dict()}
+        if name == 'status':
+            next_run = self.schedule_index.next_run(datetime.now()) if self.schedule_index else None
+            return {
+                'ok': True,
+                'pending': len(self.run_requests),
+                'jobs': len(self.schedule_index.plan.entries) if self.schedule_index else 0,
+                'next_run': next_run.isoformat() if next_run else None
+            }
+        if name == 'capacity':
+            if self.attendances_manager is None:
+                return {'ok': True, 'devices': [], 'alerts': []}
+            capacity = self.attendances_manager.capacity
+            return {'ok': True, 'devices': capacity.snapshot(), 'alerts': capacity.alerts()}
+        if name == 'next':
+            return {'ok': True, 'jobs': self.upcoming_jobs(int(command.get('count', 5)), command.get('devices', True))}
+        return {'ok': False, 'error': f'Comando desconocido: {name}'}
+
+    def send_icon_update(self, color: str, host='localhost', port=5000):
+        """
+        Sends an icon update message to a specified host and port using a TCP socket.
+
+        Args:
+            color (str): The color to be sent as an update, or a JSON notification (see
+                `report_capacity_alerts`). It is encoded as a UTF-8 string.
+            host (str, optional): The hostname or IP address of the server to connect to. Defaults to 'localhost'.
+            port (int, optional): The port number of the server to connect to. Defaults to 5000.
+
+        Logs:
+            - Logs a debug message indicating the start of the icon update process.
+            - Logs an error message if an exception occurs during the process.
+
+        Raises:
+            Exception: If there is an error in creating the socket, connecting to the server, 
+                       or sending the data, it will be logged as an error.
+        """
+        if not self.platform.has_tray_icon:
+            return
+        logging.debug("Envio de actualizacion de icono")
+        # Create a TCP client socket to send the update message.
+        try:
+            client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            client.connect((host, port))
+            client.sendall(color.encode('utf-8'))
+            client.close()
+        except Exception as e:
+            logging.error(f"Error al enviar actualizacion: {e}")
+
+    def configure_logging(self, debug_file, error_file):
+        """
+        Configures logging for the application by setting up a debug log file and an error log file.
+        This method clears any existing logging handlers to avoid duplicate or stale streams,
+        then configures a debug log file for detailed logging and an error log file for warnings
+        and errors.
+        Args:
+            debug_file (str): The file path for the debug log file where detailed logs will be written.
+            error_file (str): The file path for the error log file where warnings and errors will be logged.
+        Behavior:
+            - Removes all existing logging handlers to ensure a clean logging configuration.
+            - Sets up a debug log file with DEBUG level logging and a specific format.
+            - Adds a separate handler for warnings and errors, writing them to the specified error log file.
+        """
+        # Always clear existing handlers to avoid stale streams
+        logger = logging.getLogger()
+        for handler in logger.handlers[:]:
+            logger.removeHandler(handler)
+            handler.close()
+
+        # Configure basic debug log file
+        logging.basicConfig(
+            filename=debug_file,
+            level=logging.DEBUG,
+            format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s'
+        )
+
+        # Add handler for warnings and errors
+        error_handler = logging.FileHandler(error_file)
+        error_handler.setLevel(logging.WARNING)
+        error_handler.setFormatter(
+            logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        )
+        logger.addHandler(error_handler)
+
+    def safe_execute(self, func, *args, **kwargs):
+        """
+        Executes a given function safely, catching and logging any exceptions that occur.
+
+        Args:
+            func (callable): The function to be executed.
+            *args: Positional arguments to pass to the function.
+            **kwargs: Keyword arguments to pass to the function.
+
+        Logs:
+            Logs an error message if an exception is raised during the execution of the function.
+        """
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logging.error(f"Error ejecutando {func.__name__}: {e}")
@@ -0,0 +1,364 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import threading
+import time
+
+# Same values as the win32service SERVICE_* constants, plus one for a missing service
+SERVICE_NOT_INSTALLED = 0
+SERVICE_STOPPED = 1
+SERVICE_START_PENDING = 2
+SERVICE_STOP_PENDING = 3
+SERVICE_RUNNING = 4
+
+STATE_NAMES = {
+    SERVICE_NOT_INSTALLED: 'no instalado',
+    SERVICE_STOPPED: 'detenido',
+    SERVICE_START_PENDING: 'iniciando',
+    SERVICE_STOP_PENDING: 'deteniendo',
+    SERVICE_RUNNING: 'en ejecucion',
+}
+
+class ServiceNotInstalledError(Exception):
+    pass
+
+class ServiceBackend:
+    """
+    Operations on the operating system service, independent of the platform.
+
+    Subclasses implement `query_state`, `install`, `start`, `stop` and `remove`.
+    `wait_for_state` waits on an event, so a cancellation wakes it up at once;
+    backends that get notified of state changes can override it to avoid
+    querying the service at all.
+    """
+    poll_interval = 0.25
+
+    def query_state(self, service_name: str) -> int:
+        raise NotImplementedError
+
+    def install(self):
+        raise NotImplementedError
+
+    def start(self, service_name: str):
+        raise NotImplementedError
+
+    def stop(self, service_name: str):
+        raise NotImplementedError
+
+    def remove(self, service_name: str):
+        raise NotImplementedError
+
+    def wake(self):
+        """
+        Wakes up any `wait_for_state` in progress so it can observe a cancellation.
+        """
+        pass
+
+    def wait_for_state(self, service_name: str, states: tuple, timeout: float, cancel_event: threading.Event) -> int:
+        """
+        Waits until the service reaches one of `states`, the timeout expires or the wait is cancelled.
+
+        Args:
+            service_name (str): The name of the service.
+            states (tuple): Accepted states (SERVICE_* constants).
+            timeout (float): Maximum number of seconds to wait.
+            cancel_event (threading.Event): Event that interrupts the wait when set.
+
+        Returns:
+            int: The last state observed.
+        """
+        deadline = time.monotonic() + timeout
+        state = self.query_state(service_name)
+        while state not in states and not cancel_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            cancel_event.wait(min(self.poll_interval, remaining))
+            state = self.query_state(service_name)
+        return state
+
+class WindowsServiceBackend(ServiceBackend):
+    """
+    Backend for the Windows Service Control Manager, based on `win32serviceutil`.
+    """
+
+    def __init__(self, service_manager):
+        """
+        Args:
+            service_manager (ServiceManager): Manager with the service configuration, used to install it.
+        """
+        self.service_manager = service_manager
+
+    def query_state(self, service_name: str) -> int:
+        import win32service
+        import win32serviceutil
+
+        try:
+            return win32serviceutil.QueryServiceStatus(service_name)[1]
+        except win32service.error as e:
+            if e.winerror == 1060:  # ERROR_SERVICE_DOES_NOT_EXIST
+                return SERVICE_NOT_INSTALLED
+            raise
+
+    def install(self):
+        self.service_manager.check_and_install_service()
+
+    def start(self, service_name: str):
+        import win32service
+        import win32serviceutil
+        from scripts.common.utils.file_manager import find_marker_directory
+
+        try:
+            win32serviceutil.StartService(service_name, find_marker_directory(service_name))
+        except win32service.error as e:
+            if e.winerror == 1060:
+                raise ServiceNotInstalledError(e.strerror) from e
+            raise
+
+    def stop(self, service_name: str):
+        import win32serviceutil
+
+        win32serviceutil.StopService(service_name)
+
+    def remove(self, service_name: str):
+        import win32serviceutil
+
+        win32serviceutil.RemoveService(service_name)
+
+class FakeServiceBackend(ServiceBackend):
+    """
+    In-memory backend that simulates the service transitions, for tests on any platform.
+
+    State changes are notified through a condition, so waits never poll.
+    """
+
+    def __init__(self, installed=True, state=SERVICE_STOPPED, start_delay=0.1, stop_delay=0.1, fail_starts=0):
+        """
+        Args:
+            installed (bool): Whether the service starts installed.
+            state (int): Initial state of the service.
+            start_delay (float): Seconds spent in SERVICE_START_PENDING.
+            stop_delay (float): Seconds spent in SERVICE_STOP_PENDING.
+            fail_starts (int): Number of start requests that are ignored, to simulate retries.
+        """
+        self.state = state if installed else SERVICE_NOT_INSTALLED
+        self.start_delay = start_delay
+        self.stop_delay = stop_delay
+        self.fail_starts = fail_starts
+        self.calls: list[str] = []
+        self.condition = threading.Condition()
+
+    def query_state(self, service_name: str) -> int:
+        with self.condition:
+            return self.state
+
+    def install(self):
+        self.calls.append('install')
+        with self.condition:
+            if self.state == SERVICE_NOT_INSTALLED:
+                self.__set_state(SERVICE_STOPPED)
+
+    def start(self, service_name: str):
+        self.calls.append('start')
+        with self.condition:
+            if self.state == SERVICE_NOT_INSTALLED:
+                raise ServiceNotInstalledError(service_name)
+            if self.fail_starts > 0:
+                self.fail_starts -= 1
+                return
+            if self.state == SERVICE_STOPPED:
+                self.__set_state(SERVICE_START_PENDING)
+                self.__transition_later(self.start_delay, SERVICE_RUNNING)
+
+    def stop(self, service_name: str):
+        self.calls.append('stop')
+        with self.condition:
+            if self.state == SERVICE_RUNNING:
+                self.__set_state(SERVICE_STOP_PENDING)
+                self.__transition_later(self.stop_delay, SERVICE_STOPPED)
+
+    def remove(self, service_name: str):
+        self.calls.append('remove')
+        with self.condition:
+            self.__set_state(SERVICE_NOT_INSTALLED)
+
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def wait_for_state(self, service_name: str, states: tuple, timeout: float, cancel_event: threading.Event) -> int:
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while self.state not in states and not cancel_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return self.state
+
+    def __set_state(self, state: int):
+        self.state = state
+        self.condition.notify_all()
+
+    def __transition_later(self, delay: float, state: int):
+        def transition():
+            with self.condition:
+                self.__set_state(state)
+        timer = threading.Timer(delay, transition)
+        timer.daemon = True
+        timer.start()
+
+class ServiceController:
+    """
+    High level service operations (start, stop, restart, reinstall, uninstall).
+
+    Every operation reports its progress through the `on_progress(message)` and
+    `on_state(state)` callbacks and waits for state changes with
+    `ServiceBackend.wait_for_state`, which returns as soon as the state is
+    reached or `cancel()` is called.
+    """
+
+    def __init__(self, backend: ServiceBackend, service_name: str, max_retries=30, retry_timeout=5.0, stop_timeout=60.0, on_progress=None, on_state=None):
+        """
+        Args:
+            backend (ServiceBackend): Backend used to operate the service.
+            service_name (str): The name of the service.
+            max_retries (int): Maximum number of attempts to start the service.
+            retry_timeout (float): Seconds to wait for the service to run after each attempt.
+            stop_timeout (float): Seconds to wait for the service to stop.
+            on_progress (callable, optional): Called with a progress message.
+            on_state (callable, optional): Called with each new state observed.
+        """
+        self.backend = backend
+        self.service_name = service_name
+        self.max_retries = max_retries
+        self.retry_timeout = retry_timeout
+        self.stop_timeout = stop_timeout
+        self.on_progress = on_progress or (lambda message: None)
+        self.on_state = on_state or (lambda state: None)
+        self.cancel_event = threading.Event()
+        self.last_state = None
+
+    def cancel(self):
+        """
+        Interrupts the operation in progress at its next wait.
+        """
+        self.cancel_event.set()
+        self.backend.wake()
+
+    def state(self) -> int:
+        state = self.backend.query_state(self.service_name)
+        self.__report_state(state)
+        return state
+
+    def start(self, install=False) -> bool:
+        """
+        Starts the service, retrying up to `max_retries` times.
+
+        Args:
+            install (bool): If True, the service is installed first when it is missing.
+
+        Returns:
+            bool: True if the service is running.
+        """
+        if install:
+            self.on_progress('Verificando la instalación del servicio')
+            self.backend.install()
+
+        for attempt in range(1, self.max_retries + 1):
+            if self.cancel_event.is_set():
+                return False
+            try:
+                if self.state() == SERVICE_RUNNING:
+                    logging.info("El servicio se inicio correctamente")
+                    return True
+                logging.info(f"Intentando iniciar el servicio... Intento {attempt}/{self.max_retries}")
+                self.on_progress(f'Iniciando el servicio... Intento {attempt}/{self.max_retries}')
+                self.backend.start(self.service_name)
+            except ServiceNotInstalledError as e:
+                logging.error(f'Error al iniciar el servicio {self.service_name}: {e}')
+                return False
+            except Exception as e:
+                logging.error(f"Error al intentar iniciar el servicio: {e}")
+            if self.__wait((SERVICE_RUNNING,), self.retry_timeout) == SERVICE_RUNNING:
+                logging.info("El servicio se inicio correctamente")
+                return True
+
+        logging.critical("No se pudo iniciar el servicio despues de multiples intentos")
+        return False
+
+    def stop(self) -> bool:
+        """
+        Stops the service and waits until it is stopped.
+
+        Returns:
+            bool: True if the service is stopped (or not installed).
+        """
+        state = self.state()
+        if state in (SERVICE_STOPPED, SERVICE_NOT_INSTALLED):
+            return True
+        self.on_progress('Deteniendo el servicio')
+        logging.debug("Deteniendo el servicio")
+        if state != SERVICE_STOP_PENDING:
+            self.backend.stop(self.service_name)
+        stopped = self.__wait((SERVICE_STOPPED, SERVICE_NOT_INSTALLED), self.stop_timeout) in (SERVICE_STOPPED, SERVICE_NOT_INSTALLED)
+        if stopped:
+            logging.debug("Se detuvo el servicio")
+        else:
+            logging.error(f'El servicio no se detuvo en {self.stop_timeout} segundos')
+        return stopped
+
+    def restart(self) -> bool:
+        return self.stop() and self.start()
+
+    def uninstall(self) -> bool:
+        """
+        Stops and removes the service.
+
+        Returns:
+            bool: True if the service is no longer installed.
+        """
+        self.stop()
+        self.on_progress('Desinstalando el servicio')
+        self.backend.remove(self.service_name)
+        return self.__wait((SERVICE_NOT_INSTALLED,), self.stop_timeout) == SERVICE_NOT_INSTALLED
+
+    def reinstall(self) -> bool:
+        """
+        Stops, removes, installs and starts the service again.
+
+        Returns:
+            bool: True if the service is running after the reinstallation.
+        """
+        try:
+            self.uninstall()
+        except Exception as e:
+            logging.error(f"Error al remover el servicio: {e}")
+        return self.start(install=True)
+
+    def __wait(self, states: tuple, timeout: float) -> int:
+        state = self.backend.wait_for_state(self.service_name, states, timeout, self.cancel_event)
+        self.__report_state(state)
+        return state
+
+    def __report_state(self, state: int):
+        if state != self.last_state:
+            self.last_state = state
+            self.on_state(state)
@@ -21,6 +21,24 @@ import configparser
 import logging
 from logging import config
 import os
+import sqlite3
+import time
+from scripts.business_logic.windows_service import ServiceManager
+from scripts.business_logic.attendance_analytics import AttendanceAnalytics, refresh_analytics
+from scripts.business_logic.attendance_store import AttendanceStore, store_attendances
+from scripts.business_logic.bulk_clear import CLEARED, ClearCandidate, clear_verified, verify_download
+from scripts.business_logic.capacity_monitor import CapacityMonitor
+from scripts.business_logic.chunked_download import ChunkedDownloadError, ResumableAttendanceDownload, read_last_record
+from scripts.business_logic.clock_drift import ClockDriftStore, sample_clock_drift
+from scripts.business_logic.device_metadata import DEFAULT_TTL_HOURS, DeviceMetadataCache
+from scripts.business_logic.device_probe import RECORD_SIZE, AttendanceCursorStore, read_device_sizes
+from scripts.business_logic.device_scheduler import DevicePrioritizer
+from scripts.business_logic.dispatch import DispatchPolicy
+from scripts.business_logic.run_results import DeviceResult, ResultBuffers, merge_results
+from scripts.business_logic.root_files import GLOBAL_ATTENDANCES_LOCK, INVENTORY_LOCK
+from scripts.business_logic.run_journal import OUTCOME_BATTERY_FAILING, OUTCOME_CONNECTION_FAILED, OUTCOME_ERROR, RunJournal, new_journal_record
+from scripts.business_logic.session_replay import CAPTURES_FOLDER, REPLAY_SECTION, UserIdAnonymizer, finish_capture, start_capture
+from scripts.business_logic.transport_profiles import TransportProfile, TransportProfiles, apply_timeout
 from scripts.common.business_logic.attendances_manager import AttendancesManagerBase
 from scripts.common.business_logic.connection_manager import ConnectionManager
 from scripts.common.business_logic.device_manager import get_devices_info
@@ -31,11 +49,9 @@ from scripts.common.business_logic.shared_state import SharedState
 from scripts.common.utils.errors import BatteryFailingError, NetworkError, ConnectionFailedError, BaseError, ObtainAttendancesError, OutdatedTimeError
 from scripts.common.utils.file_manager import find_root_directory
 config = configparser.ConfigParser()
-import win32serviceutil
-import win32service
 
 class AttendancesManager(AttendancesManagerBase):
-    def __init__(self):
+    def __init__(self, root: str = None, config_parser: configparser.ConfigParser = None):
         """
         Initializes the ServiceManager instance.
 
@@ -43,44 +59,333 @@ class AttendancesManager(AttendancesManagerBase):
         by creating an instance of `SharedState` and passing it to the
         superclass initializer.
 
+        Args:
+            root (str, optional): Root directory of config.ini and of the stores (state,
+                journal, database, captures). Defaults to the root directory of the application.
+            config_parser (ConfigParser, optional): Parser config.ini is read into. Defaults to
+                the parser of this module; each site of the multi-site mode has its own.
+
         Attributes:
             state (SharedState): The shared state object used to manage
             the service's state.
+            points (set[str]): If set, only the devices of these points are ever processed
+                (the site of the multi-site mode, see `multi_site`).
+            shared_slots (callable): Session budget shared with the other sites (see `DispatchPolicy`).
         """
+        self.root = root or find_root_directory()
+        self.config = config_parser or config
+        self.points: set[str] = None
+        self.shared_slots = None
         self.state = SharedState()
+        self.journal = RunJournal(self.root)
+        self.journal_records: list[dict] = []
+        self.run_records = ResultBuffers()
+        self.device_results = ResultBuffers()
+        self.prioritizer = DevicePrioritizer(self.journal)
+        self.dispatch = DispatchPolicy()
+        self.cursors = AttendanceCursorStore(self.root)
+        self.metadata = DeviceMetadataCache(self.root)
+        self.probe_before_download = True
+        self.chunked_download_min_bytes = 0
+        self.download_chunk_size = 0
+        self.store: AttendanceStore = None
+        self.analytics: AttendanceAnalytics = None
+        self.clear_candidates = ResultBuffers()
+        self.clear_workers = 16
+        self.capacity = CapacityMonitor()
+        self.drift = ClockDriftStore(self.root)
+        self.sample_drift = True
+        self.capture_sessions = False
+        self.capture_anonymize = True
+        self.capture_folder: str = None
+        self.anonymizer = UserIdAnonymizer()
+        self.transport = TransportProfiles(self.root)
         super().__init__(self.state)
 
-    def manage_devices_attendances(self):
+    @property
+    def attendances_count_devices(self) -> dict:
+        """
+        Attendance count (or connection failure) by IP of the devices of the run.
+
+        Workers never write this dict: each one adds its `DeviceResult` to `device_results`,
+        and the results are merged into the dict when it is read, which the base class does
+        once its pool of workers is done.
+        """
+        return merge_results(self.__dict__.setdefault('attendance_counts', {}), self.device_results.items(),
+                             DeviceResult.attendance_entry)
+
+    @attendances_count_devices.setter
+    def attendances_count_devices(self, value: dict):
+        self.attendance_counts = value
+
+    def manage_devices_attendances(self, ips=None, points=None, slot_seconds=None):
         """
         Manages the attendance data for devices.
         This method reads configuration settings, resets the state, retrieves
         device information, and processes attendance data for active devices.
+        Args:
+            ips (iterable[str], optional): If given, only the active devices with these IPs are processed.
+            points (iterable[str], optional): If given, only the active devices of these points are processed.
+                When both are given, a device is processed if it matches either of them.
+            slot_seconds (float, optional): Seconds until the next scheduled job, used to keep
+                the staggered start of the devices inside the slot (see `DispatchPolicy`).
         Raises:
             BaseError: If there is an error while retrieving device information.
         Returns:
             The result of the parent class's `manage_devices_attendances` method,
-            called with the IP addresses of active devices.
+            called with the IP addresses of the selected active devices, ordered by
+            start offset (see `DispatchPolicy.order`) and, among equal offsets, by
+            `DevicePrioritizer` (longest expected jobs first, flaky devices last).
+            When `clear_attendance_service` is enabled, the devices verified during the
+            run are cleared afterwards, in parallel (see `clear_verified_devices`).
         """
-        config.read(os.path.join(find_root_directory(), 'config.ini'))
+        config = self.config
+        config.read(os.path.join(self.root, 'config.ini'))
         self.clear_attendance: bool = config.getboolean('Device_config', 'clear_attendance_service')
+        self.clear_workers = config.getint('Device_config', 'clear_workers', fallback=16)
+        self.probe_before_download = config.getboolean('Device_config', 'probe_before_download', fallback=True)
+        self.chunked_download_min_bytes = config.getint('Device_config', 'chunked_download_min_bytes', fallback=262144)
+        self.download_chunk_size = config.getint('Device_config', 'download_chunk_size', fallback=0)
+        self.metadata.ttl_hours = config.getfloat('Device_config', 'metadata_ttl_hours', fallback=DEFAULT_TTL_HOURS)
+        self.capacity.configure(CapacityMonitor.from_config(config))
+        self.sample_drift = config.getboolean('Battery_config', 'drift_sampling', fallback=True)
+        self.drift.configure(config)
+        self.capture_sessions = config.getboolean(REPLAY_SECTION, 'capture', fallback=False)
+        self.capture_anonymize = config.getboolean(REPLAY_SECTION, 'anonymize', fallback=True)
+        self.capture_folder = os.path.join(self.root, config.get(REPLAY_SECTION, 'capture_folder', fallback=CAPTURES_FOLDER))
+        self.__configure_store(AttendanceStore.from_config(config, self.root))
+        self.__configure_analytics(config)
+        self.dispatch = DispatchPolicy.from_config(config)
+        self.dispatch.shared = self.shared_slots
+        self.dispatch.begin_run(slot_seconds)
         self.state.reset()
         all_devices: list[Device] = []
         try:
-            all_devices = get_devices_info()
+            all_devices = restrict_devices(get_devices_info(), self.points)
         except Exception as e:
             raise BaseError(3001, str(e))
         
         if len(all_devices) > 0:
-            selected_ips: list[str] = [device.ip for device in all_devices if device.active]
-            return super().manage_devices_attendances(selected_ips)
+            selected_devices: list[Device] = self.dispatch.order(self.prioritizer.order(select_devices(all_devices, ips, points)))
+            selected_ips: list[str] = [device.ip for device in selected_devices]
+            if not selected_ips:
+                logging.warning(f'Ningun dispositivo activo coincide con IPs {ips} o puntos {points}')
+                return
+            self.run_records.drain()
+            self.device_results.drain()
+            self.clear_candidates.drain()
+            self.cursors.load()
+            self.metadata.load()
+            self.drift.load()
+            self.transport.load()
+            try:
+                result = super().manage_devices_attendances(selected_ips)
+                self.clear_verified_devices()
+                return result
+            finally:
+                self.journal_records = self.run_records.drain()
+                write_journal(self.journal, self.journal_records)
+                self.__save_cursors()
+                self.__log_run_summary()
+
+    def __save_cursors(self):
+        try:
+            self.cursors.save()
+        except Exception as e:
+            logging.error(f'Error al guardar los cursores de marcaciones: {e}')
+        try:
+            self.metadata.save()
+        except Exception as e:
+            logging.error(f'Error al guardar los metadatos de los dispositivos: {e}')
+        save_drift(self.drift)
+
+    def __log_run_summary(self):
+        skipped = [record for record in self.journal_records if record.get('skipped')]
+        bytes_saved = sum(record.get('bytes_saved', 0) for record in skipped)
+        logging.info(f'Dispositivos procesados: {len(self.journal_records)} - Sin cambios (omitidos): {len(skipped)} - Bytes ahorrados (estimados): {bytes_saved}')
     
+    def verify_for_clear(self, device: Device, device_records: int, downloaded: int, record: dict):
+        """
+        Phase one of the clear: once the attendances of a device are persisted, checks that
+        every record on the device was downloaded and formatted. A verified device is
+        cleared at the end of the run; otherwise error 2004 is reported and its log is kept.
+
+        Args:
+            device (Device): The device.
+            device_records (int): Records reported by the device when downloading.
+            downloaded (int): Records downloaded.
+            record (dict): The journal record of the device.
+        """
+        reason = verify_download(device_records, downloaded, record.get('with_error', 0))
+        if reason is not None:
+            logging.debug(f'No se eliminaran las marcaciones correspondientes al dispositivo {device.ip}: {reason}')
+            if device_records is not None and device_records != downloaded:
+                record['error'] = 2004
+                BaseError(2004, f'{device.model_name}, {device.point}, {device.ip}: {reason}', level="warning")
+            return
+        self.clear_candidates.add(ClearCandidate(device, downloaded, record))
+
+    def observe_capacity(self, device: Device, records: int, capacity: int = None):
+        """
+        Adds the record count read during the collection to the capacity series of the
+        device (see `CapacityMonitor`), with the capacity cached in the device metadata
+        when the device did not report it.
+        """
+        if not capacity:
+            capacity = (self.metadata.get(device.ip) or {}).get('rec_cap')
+        self.capacity.observe(device.ip, records, capacity, device.point)
+
+    def clear_verified_devices(self):
+        """
+        Phase two of the clear: clears in parallel the devices verified during the run
+        (see `clear_verified`). A device is only cleared if its record count did not
+        change since the download; its cursor then goes back to zero. Each device waits
+        for a free slot in its point and subnet budgets (see `DispatchPolicy.budgets`);
+        the start offsets were already spent in the collection.
+        """
+        candidates: list[ClearCandidate] = self.clear_candidates.drain()
+        if not candidates:
+            return
+
+        def connect(device: Device) -> ConnectionManager:
+            profile = self.transport.resolve(device)
+            conn_manager = ConnectionManager(device.ip, profile.port, profile.communication)
+            conn_manager.connect_with_retry()
+            apply_timeout(conn_manager, profile.timeout)
+            return conn_manager
+
+        for ip, outcome in clear_verified(candidates, connect, self.clear_workers, self.dispatch.budgets).items():
+            if outcome == CLEARED:
+                self.cursors.advance(ip, 0)
+                self.capacity.observe(ip, 0)
+
     def manage_attendances_of_one_device(self, device: Device):
+        """
+        Manages the attendance records of a single device once its dispatch slot is available.
+
+        The device waits for its deterministic start offset and for a free slot in the
+        concurrency budgets of its point and subnet (see `DispatchPolicy`), then its
+        attendances are collected by `collect_attendances_of_one_device`.
+
+        Args:
+            device (Device): The device to process.
+        """
+        with self.dispatch.dispatch(device):
+            return self.collect_attendances_of_one_device(device)
+
+    def __configure_store(self, store: AttendanceStore):
+        # Keep the open connection between runs unless the database changed
+        if store is not None and self.store is not None and store.path == self.store.path:
+            return
+        if self.store is not None:
+            self.store.close()
+        self.store = store
+
+    def __configure_analytics(self, config: configparser.ConfigParser):
+        try:
+            self.analytics = AttendanceAnalytics.from_config(config, self.store)
+        except (ValueError, sqlite3.Error) as e:
+            self.analytics = None
+            logging.error(f'Error al configurar los resumenes de asistencia: {e}')
+
+    def manage_individual_attendances(self, device: Device, attendances: list[Attendance]):
+        """
+        Persists the attendances of a device in its attendance files and, if enabled,
+        in the SQLite database (see `AttendanceStore`), where duplicates are dropped by
+        its unique index.
+
+        Args:
+            device (Device): The device the attendances come from.
+            attendances (list[Attendance]): The formatted attendances of the device.
+        """
+        result = super().manage_individual_attendances(device, attendances)
+        store_attendances(self.store, device, attendances)
+        return result
+
+    def manage_global_attendances(self, attendances: list[Attendance]):
+        """
+        Persists the attendances in the global attendance file, under the lock shared by
+        every site of the process (see `root_files`), then adds the punches stored
+        in the database since the last refresh to the attendance aggregates, if enabled (see
+        `AttendanceAnalytics`). Each refresh aggregates at most `batch_rows` punches, so a
+        first backfill of a large database is spread over the devices of the run.
+        """
+        with GLOBAL_ATTENDANCES_LOCK:
+            result = super().manage_global_attendances(attendances)
+        if self.analytics is not None:
+            refresh_analytics(self.analytics, self.analytics.batch_rows)
+        return result
+
+    def update_device_metadata(self, conn_manager: ConnectionManager, device: Device, sizes: dict = None):
+        """
+        Sets the model name of the device from the metadata cache, asking the device only
+        when its cache entry is older than `metadata_ttl_hours` (see `DeviceMetadataCache`).
+
+        The counters read by the probe are stored in the cache without extra requests.
+        Failures are ignored, as the model name is informative only.
+
+        Args:
+            conn_manager (ConnectionManager): The connected connection manager of the device.
+            device (Device): The device being processed.
+            sizes (dict, optional): The counters read by `read_device_sizes`, if probed.
+        """
+        try:
+            if self.metadata.is_fresh(device.ip):
+                device.model_name = self.metadata.model_name(device.ip)
+                self.metadata.record_sizes(device.ip, sizes)
+            else:
+                self.metadata.refresh(conn_manager, device, sizes)
+        except Exception as e:
+            logging.debug(f'{device.ip} - No se pudo actualizar el nombre del dispositivo: {e}')
+
+    def download_attendances(self, conn_manager: ConnectionManager, device: Device, sizes: dict = None, profile: TransportProfile = None) -> list[Attendance]:
+        """
+        Downloads the attendance records of a connected device.
+
+        Large logs (at least `chunked_download_min_bytes`, estimated from the probed record
+        count) and logs with an interrupted download pending are read in chunks spooled to
+        disk (see `ResumableAttendanceDownload`), so a dropped connection resumes where it
+        stopped instead of starting over. Other logs use the regular single-shot download.
+        The transport profile of the device may override the threshold, the chunk size
+        and the resume attempts (see `TransportProfiles`).
+
+        Args:
+            conn_manager (ConnectionManager): The connected connection manager of the device.
+            device (Device): The device being processed.
+            sizes (dict, optional): The counters read by `read_device_sizes`, if probed.
+            profile (TransportProfile, optional): The transport profile of the device.
+
+        Returns:
+            list[Attendance]: The records of the device.
+
+        Raises:
+            ChunkedDownloadError: If a chunked download fails after its resume attempts.
+        """
+        profile = profile or TransportProfile()
+        min_bytes = self.chunked_download_min_bytes if profile.chunked_min_bytes is None else profile.chunked_min_bytes
+        chunk_size = self.download_chunk_size if profile.chunk_size is None else profile.chunk_size
+        estimated_bytes = sizes['records'] * RECORD_SIZE if sizes and sizes.get('records') else 0
+        use_chunks = min_bytes > 0 and (
+            estimated_bytes >= min_bytes or ResumableAttendanceDownload.has_partial(device.ip, self.root)
+        )
+        if not use_chunks:
+            return conn_manager.get_attendances()
+        downloader = ResumableAttendanceDownload(conn_manager, device.ip, root=self.root, chunk_size=chunk_size or None,
+                                                 resume_attempts=profile.resume_attempts if profile.resume_attempts is not None else 2)
+        return downloader.get_attendances()
+
+    def collect_attendances_of_one_device(self, device: Device):
         """
         Manages the attendance records of a single device.
         This method handles the connection to a device, retrieves attendance records,
         processes and formats them, and updates the device's time and name if necessary.
         It also manages individual and global attendance records and handles errors
         during the process.
+        Before downloading, the number of records on the device is read (a single cheap
+        exchange). If it matches the cursor stored after the last successful collection,
+        and so does the last record (then read alone, see `read_last_record`), nothing changed:
+        the download, format and write phases are skipped and only the time is synchronized.
+        A device at its record capacity is always downloaded.
         Args:
             device (Device): The device object containing information such as IP address,
                              communication type, and other metadata.
@@ -90,64 +395,101 @@ class AttendancesManager(AttendancesManagerBase):
         Returns:
             None
         """
+        record = new_journal_record('attendances', device)
+        result = DeviceResult(device.ip)
+        capture = None
+        conn_manager = None
+        start_time = time.perf_counter()
         try:
             try:
-                conn_manager = ConnectionManager(device.ip, 4370, device.communication)
+                profile = self.transport.resolve(device)
+                conn_manager = ConnectionManager(device.ip, profile.port, profile.communication)
                 #import time
                 #start_time = time.time()
                 conn_manager.connect_with_retry()
+                apply_timeout(conn_manager, profile.timeout)
                 #end_time = time.time()
                 #logging.debug(f'{device.ip} - Tiempo de conexión total: {(end_time - start_time):2f}')
-                attendances: list[Attendance] = conn_manager.get_attendances()
-                #logging.info(f'{device.ip} - PREFORMATEO - Longitud marcaciones: {len(attendances)} - Marcaciones: {attendances}')
-                attendances, attendances_with_error = self.format_attendances(attendances, device.id)
-                if len(attendances_with_error) > 0:
-                    self.clear_attendance = False
-                    logging.debug(f'No se eliminaran las marcaciones correspondientes al dispositivo {device.ip}')
-                #logging.info(f'{device.ip} - POSTFORMATEO - Longitud marcaciones: {len(attendances)} - Marcaciones: {attendances}')
-                logging.debug(f'clear_attendance: {self.clear_attendance}')
-                conn_manager.clear_attendances(self.clear_attendance)
-            except (NetworkError, ObtainAttendancesError) as e:
-                with self.lock:
-                    self.attendances_count_devices[device.ip] = {
-                        "connection failed": True
-                    }
+                if self.capture_sessions:
+                    capture = start_capture(conn_manager, device, self.anonymizer if self.capture_anonymize else None)
+                sizes = read_device_sizes(conn_manager) if self.probe_before_download else None
+                if sizes:
+                    self.observe_capacity(device, sizes['records'], sizes.get('rec_cap'))
+                # Only a device whose count did not change can be skipped: read its last record too
+                last_record = None
+                if sizes and sizes['records'] == self.cursors.records(device.ip):
+                    last_record = read_last_record(conn_manager, sizes['records'])
+                if sizes and self.cursors.unchanged(device.ip, sizes['records'], sizes.get('rec_cap'), last_record):
+                    logging.debug(f'{device.ip} - Sin marcaciones nuevas ({sizes["records"]} registros), se omite la descarga')
+                    self.cursors.remember_last_record(device.ip, last_record)
+                    record['skipped'] = True
+                    record['bytes_saved'] = sizes['records'] * RECORD_SIZE
+                    attendances = []
+                else:
+                    attendances: list[Attendance] = self.download_attendances(conn_manager, device, sizes, profile)
+                    downloaded_count = len(attendances)
+                    #logging.info(f'{device.ip} - PREFORMATEO - Longitud marcaciones: {len(attendances)} - Marcaciones: {attendances}')
+                    device_records = getattr(getattr(conn_manager, 'conn', None), 'records', None)
+                    if device_records is None and sizes:
+                        device_records = sizes['records']
+                    if not sizes:
+                        self.observe_capacity(device, device_records, getattr(getattr(conn_manager, 'conn', None), 'rec_cap', None))
+                    attendances, attendances_with_error = self.format_attendances(attendances, device.id)
+                    #logging.info(f'{device.ip} - POSTFORMATEO - Longitud marcaciones: {len(attendances)} - Marcaciones: {attendances}')
+                    record['with_error'] = len(attendances_with_error)
+                    record['cleared'] = False
+            except (NetworkError, ObtainAttendancesError, ChunkedDownloadError) as e:
+                result.connection_failed = True
+                record['outcome'] = OUTCOME_CONNECTION_FAILED
+                record['error'] = 1001 if isinstance(e, NetworkError) else 2005
                 raise ConnectionFailedError(device.model_name, device.point, device.ip)
             except Exception as e:
                 raise BaseError(3000, str(e)) from e
                         
-            try:
-                logging.debug(find_root_directory())
-                device.model_name = conn_manager.update_device_name()
-            except Exception as e:
-                pass
+            if not record.get('skipped'):
+                self.update_device_metadata(conn_manager, device, sizes)
 
-            self.manage_individual_attendances(device, attendances)
-            self.manage_global_attendances(attendances)
+                self.manage_individual_attendances(device, attendances)
+                self.manage_global_attendances(attendances)
+                # Persisted: the next run can skip the device while its record count stays the same
+                self.cursors.advance(device.ip, downloaded_count,
+                                     last_record if sizes and sizes['records'] == downloaded_count else None)
+                if self.clear_attendance:
+                    self.verify_for_clear(device, device_records, downloaded_count, record)
 
+            if self.sample_drift:
+                sample_clock_drift(self.drift, conn_manager, device, record)
             try:
                 conn_manager.update_time()
+                self.drift.mark_synced(device.ip)
             except NetworkError as e:
                 NetworkError(f'{device.model_name}, {device.point}, {device.ip}')
             except OutdatedTimeError as e:
-                HourManager().update_battery_status(device.ip)
+                HourManager(self.root, self.config).update_battery_status(device.ip)
                 BatteryFailingError(device.model_name, device.point, device.ip)
+                record['error'] = 2001
 
-            with self.lock:
-                self.attendances_count_devices[device.ip] = {
-                    "attendance count": str(len(attendances))
-                }
+            result.connection_failed = False
+            result.attendance_count = len(attendances)
+            record['attendances'] = len(attendances)
         except ConnectionFailedError as e:
             pass
         except Exception as e:
+            record['outcome'] = OUTCOME_ERROR
+            record['error'] = 3000
             BaseError(3000, str(e), level="warning")
         finally:
-            if conn_manager.is_connected():
+            if conn_manager is not None and conn_manager.is_connected():
                 conn_manager.disconnect()
+            finish_capture(capture, self.capture_folder)
+            record['model'] = device.model_name
+            record['duration'] = round(time.perf_counter() - start_time, 3)
+            self.device_results.add(result)
+            self.run_records.add(record)
         return
         
 class HourManager(HourManagerBase):
-    def __init__(self):
+    def __init__(self, root: str = None, config_parser: configparser.ConfigParser = None):
         """
         Initializes the ServiceManager instance.
 
@@ -155,35 +497,109 @@ class HourManager(HourManagerBase):
         creating a shared state object and passing it to the parent class 
         initializer.
 
+        Args:
+            root (str, optional): Root directory of config.ini and of the stores. Defaults to
+                the root directory of the application.
+            config_parser (ConfigParser, optional): Parser config.ini is read into (see `AttendancesManager`).
+
         Attributes:
             state (SharedState): An instance of the SharedState class used to 
             manage shared data across the service.
+            points (set[str]): If set, only the devices of these points are ever processed.
+            shared_slots (callable): Session budget shared with the other sites (see `DispatchPolicy`).
         """
+        self.root = root or find_root_directory()
+        self.config = config_parser or config
+        self.points: set[str] = None
+        self.shared_slots = None
         self.state = SharedState()
+        self.journal = RunJournal(self.root)
+        self.journal_records: list[dict] = []
+        self.run_records = ResultBuffers()
+        self.device_results = ResultBuffers()
+        self.dispatch = DispatchPolicy()
+        self.drift = ClockDriftStore(self.root)
+        self.sample_drift = True
+        self.transport = TransportProfiles(self.root)
         super().__init__(self.state)
 
-    def manage_hour_devices(self):
+    @property
+    def devices_errors(self) -> dict:
+        """
+        Connection and battery outcome by IP of the devices of the run, merged from the
+        `DeviceResult` of each worker when read (see `AttendancesManager.attendances_count_devices`).
+        """
+        return merge_results(self.__dict__.setdefault('device_errors', {}), self.device_results.items(),
+                             DeviceResult.error_entry)
+
+    @devices_errors.setter
+    def devices_errors(self, value: dict):
+        self.device_errors = value
+
+    def update_battery_status(self, ip: str):
+        """
+        Marks the battery of a device as failing in the device inventory, under the lock
+        shared by every site of the process (see `root_files`).
+        """
+        with INVENTORY_LOCK:
+            return super().update_battery_status(ip)
+
+    def manage_hour_devices(self, ips=None, points=None, slot_seconds=None):
         """
         Manages the synchronization of time for active devices.
         This method retrieves information about all devices, filters the active ones,
         and updates their time settings by invoking the parent class's `update_devices_time` method.
+        Args:
+            ips (iterable[str], optional): If given, only the active devices with these IPs are processed.
+            points (iterable[str], optional): If given, only the active devices of these points are processed.
+            slot_seconds (float, optional): Seconds until the next scheduled job, used to keep
+                the staggered start of the devices inside the slot (see `DispatchPolicy`).
         Raises:
             BaseError: If there is an error while retrieving device information.
         Returns:
             Any: The result of the `update_devices_time` method from the parent class.
         """
+        config = self.config
+        config.read(os.path.join(self.root, 'config.ini'))
+        self.dispatch = DispatchPolicy.from_config(config)
+        self.dispatch.shared = self.shared_slots
+        self.dispatch.begin_run(slot_seconds)
+        self.sample_drift = config.getboolean('Battery_config', 'drift_sampling', fallback=True)
+        self.drift.configure(config)
+        self.transport.load()
         self.state.reset()
         all_devices: list[Device] = []
         try:
-            all_devices = get_devices_info()
+            all_devices = restrict_devices(get_devices_info(), self.points)
         except Exception as e:
             raise BaseError(3001, str(e))
 
         if len(all_devices) > 0:
-            selected_ips: list[str] = [device.ip for device in all_devices if device.active]
-            return super().update_devices_time(selected_ips)
+            selected_ips: list[str] = [device.ip for device in self.dispatch.order(select_devices(all_devices, ips, points))]
+            if not selected_ips:
+                logging.warning(f'Ningun dispositivo activo coincide con IPs {ips} o puntos {points}')
+                return
+            self.run_records.drain()
+            self.device_results.drain()
+            self.drift.load()
+            try:
+                return super().update_devices_time(selected_ips)
+            finally:
+                self.journal_records = self.run_records.drain()
+                write_journal(self.journal, self.journal_records)
+                save_drift(self.drift)
 
     def update_device_time_of_one_device(self, device: Device):
+        """
+        Updates the time on a single device once its dispatch slot is available.
+
+        Args:
+            device (Device): The device to synchronize (see `sync_time_of_one_device`).
+        """
+        with self.dispatch.dispatch(device):
+            return self.sync_time_of_one_device(device)
+
+    def sync_time_of_one_device(self, device: Device):
         """
         Updates the time on a single device by establishing a connection and synchronizing its clock.
 
@@ -198,115 +614,108 @@ class HourManager(HourManagerBase):
 
         Notes:
             - The method uses a connection manager to handle the connection to the device.
-            - Device-specific errors are tracked in the `devices_errors` dictionary, which is thread-safe.
+            - The outcome of the device is kept in a `DeviceResult` owned by this worker and
+              merged into `devices_errors` after the run, as a single entry with every field
+              determined ("connection failed" and "battery failing").
+            - The device clock is read once before it is set, to feed the battery failure
+              prediction of `ClockDriftStore`.
             - Ensures proper disconnection from the device in the `finally` block if connected.
         """
+        record = new_journal_record('hour', device)
+        result = DeviceResult(device.ip)
+        conn_manager = None
+        start_time = time.perf_counter()
         try:
             try:
-                conn_manager: ConnectionManager = ConnectionManager(device.ip, 4370, device.communication)
+                profile = self.transport.resolve(device)
+                conn_manager: ConnectionManager = ConnectionManager(device.ip, profile.port, profile.communication)
                 conn_manager.connect_with_retry()
-                with self.lock:
-                    self.devices_errors[device.ip] = { "connection failed": False }
+                apply_timeout(conn_manager, profile.timeout)
+                result.connection_failed = False
+                if self.sample_drift:
+                    sample_clock_drift(self.drift, conn_manager, device, record)
                 conn_manager.update_time()
-                with self.lock:
-                    self.devices_errors[device.ip] = { "battery failing": False }
+                self.drift.mark_synced(device.ip)
+                result.battery_failing = False
             except NetworkError as e:
-                with self.lock:
-                    self.devices_errors[device.ip] = { "connection failed": True }
+                result.connection_failed = True
+                record['outcome'] = OUTCOME_CONNECTION_FAILED
+                record['error'] = 1001
                 raise ConnectionFailedError(device.model_name, device.point, device.ip)
             except OutdatedTimeError as e:
-                with self.lock:
-                    self.devices_errors[device.ip] = { "battery failing": True }
-                HourManager().update_battery_status(device.ip)
+                result.battery_failing = True
+                record['outcome'] = OUTCOME_BATTERY_FAILING
+                record['error'] = 2001
+                self.update_battery_status(device.ip)
                 raise BatteryFailingError(device.model_name, device.point, device.ip)
         except ConnectionFailedError as e:
             pass
         except BatteryFailingError as e:
             pass
         except Exception as e:
+            record['outcome'] = OUTCOME_ERROR
+            record['error'] = 3000
             BaseError(3000, str(e), level="warning")
         finally:
-            if conn_manager.is_connected():
+            if conn_manager is not None and conn_manager.is_connected():
                 conn_manager.disconnect()
+            record['duration'] = round(time.perf_counter() - start_time, 3)
+            self.device_results.add(result)
+            self.run_records.add(record)
         return
     
-class ServiceManager:
-    svc_python_class = "schedulerService.SchedulerService"
-    svc_name = "GESTOR_RELOJ_ASISTENCIA"
-    svc_display_name = "GESTOR RELOJ DE ASISTENCIAS"
-    svc_description = "Servicio para sincronización de tiempo y recuperación de datos de asistencia."
-    
-    def __init__(self):
-        super().__init__()
+def select_devices(devices: list[Device], ips=None, points=None) -> list[Device]:
+    """
+    Returns the active devices targeted by a run.
 
-    def service_is_installed(self, service_name):
-        """
-        Checks if a Windows service is installed on the system.
+    Args:
+        devices (list[Device]): Every device of the inventory.
+        ips (iterable[str], optional): IP addresses of the target devices.
+        points (iterable[str], optional): Points of the target devices.
 
-        Args:
-            service_name (str): The name of the service to check.
+    Returns:
+        list[Device]: The active devices matching any IP or point, or every active
+        device if neither is given.
+    """
+    ips = set(ips or ())
+    points = set(points or ())
+    active_devices = [device for device in devices if device.active]
+    if not ips and not points:
+        return active_devices
+    return [device for device in active_devices if device.ip in ips or device.point in points]
 
-        Returns:
-            bool: True if the service is installed, False otherwise.
+def restrict_devices(devices: list[Device], points=None) -> list[Device]:
+    """
+    Returns the devices of the given points, or every device if `points` is None.
 
-        Notes:
-            - This function uses the `pywin32` library to interact with the Windows
-              Service Control Manager (SCM).
-            - If the service cannot be opened, it is assumed to be not installed.
-            - Logs a warning if the service is not installed.
-            - Handles exceptions and returns False in case of errors.
+    The inventory is read from the root directory of the application, so in multi-site
+    mode each site keeps the devices of its own points (see `multi_site`).
+    """
+    if points is None:
+        return devices
+    return [device for device in devices if device.point in points]
 
-        Raises:
-            None: All exceptions are caught and handled within the function.
-        """
-        try:
-            # Open the service control manager
-            scm = win32service.OpenSCManager(None, None, win32service.SC_MANAGER_ALL_ACCESS)
-            try:
-                # Try to open the service
-                service = win32service.OpenService(scm, service_name, win32service.SERVICE_QUERY_STATUS)
-                # If the service can be opened, it is installed
-                win32service.CloseServiceHandle(service)
-                return True
-            except win32service.error as e:
-                # If the error is ERROR_SERVICE_DOES_NOT_EXIST, the service is not installed
-                logging.warning("Servicio no instalado")
-                return False
-            finally:
-                win32service.CloseServiceHandle(scm)
-        except Exception as e:
-            print(f"Error al verificar el servicio: {e}")
-            return False
-        
-    def check_and_install_service(self):
-        """
-        Checks if a Windows service is installed, and installs it if it is not.
-        This method verifies whether the service specified by `self.svc_name` is installed.
-        If the service is not installed, it attempts to install it using the provided
-        service configuration details such as the Python class string, service name,
-        display name, executable name, description, and start type.
-        Installation involves locating the `schedulerService.exe` executable in the root
-        directory and using the `win32serviceutil.InstallService` function to register
-        the service with the Windows Service Manager.
-        Logs appropriate messages for success, failure, or if the service is already installed.
-        Raises:
-            Exception: Logs an error message if an exception occurs during the installation process.
-        Returns:
-            None
-        """
-        if not self.service_is_installed(self.svc_name):
-            # Install the service if it is not installed
-            try:
-                #logging.debug(os.path.join(find_marker_directory("schedulerService.exe"), 'schedulerService.exe'))
-                exe_name = None
-                if os.path.isfile(os.path.join(find_root_directory(), 'schedulerService.exe')):
-                    exe_name = os.path.join(find_root_directory(), 'schedulerService.exe')
-                    #logging.debug("EXE: "+exe_name)
-                win32serviceutil.InstallService(pythonClassString=self.svc_python_class, serviceName=self.svc_name, displayName=self.svc_display_name, exeName=exe_name, description=self.svc_description, startType=win32service.SERVICE_AUTO_START)
-                
-            except Exception as e:
-                logging.error(f'Error al instalar el servicio {self.svc_name}: {e}')
-                return
-            logging.info(f'Servicio {self.svc_name} instalado correctamente')
-        else:
-            logging.info(f'Servicio {self.svc_name} ya instalado')
\ No newline at end of file
+def save_drift(drift: ClockDriftStore):
+    """
+    Saves the clock drift history, logging instead of raising on errors.
+    """
+    try:
+        drift.save()
+    except Exception as e:
+        logging.error(f'Error al guardar la deriva de los relojes: {e}')
+
+def write_journal(journal: RunJournal, records: list[dict]):
+    """
+    Appends the records of a finished run to the run journal.
+
+    Failures are logged and never propagated, the journal must not
+    interrupt the collection or the time synchronization.
+
+    Args:
+        journal (RunJournal): The journal to write to.
+        records (list[dict]): The per-device records of the run.
+    """
+    try:
+        journal.append_run(journal.new_run_id(), records)
+    except Exception as e:
+        logging.error(f'Error al escribir el diario de ejecuciones: {e}')
@@ -0,0 +1,623 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import builtins
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from struct import pack, unpack
+from scripts.business_logic.chunked_download import CMD_ATTLOG_RRQ, CMD_PREPARE_BUFFER, RECORD_SIZES
+
+REPLAY_SECTION = 'Replay_config'
+CAPTURES_FOLDER = 'captures'
+CAPTURE_EXTENSION = '.zkr'
+MAGIC = b'ZKREPLAY1\n'
+
+CMD_USERTEMP_RRQ = 9  # Same value as zk.const
+USER_SIZES = (72, 28)
+
+# Methods of the pyzk connection that talk to the device. Only the outermost call is
+# recorded: what they do inside (pyzk's own parsing) runs again when replayed.
+RECORDED_METHODS = (
+    'connect', 'disconnect', 'enable_device', 'disable_device', 'read_sizes', 'read_with_buffer',
+    'free_data', 'get_time', 'set_time', 'clear_attendance', 'refresh_data', 'unlock',
+    'get_firmware_version', 'get_serialnumber', 'get_platform', 'get_mac', 'get_device_name',
+    'get_face_version', 'get_fp_version', 'get_extend_fmt', 'get_user_extend_fmt', 'get_face_fun_on',
+    'get_compat_old_firmware', 'get_network_params', 'get_pin_width',
+    '_ZK__send_command', '_ZK__read_chunk',
+)
+ARGS_IGNORED = ('set_time',)  # The local time differs on every run
+SIZE_ATTRIBUTES = (
+    'users', 'fingers', 'records', 'dummy', 'cards', 'fingers_cap', 'users_cap', 'rec_cap',
+    'faces', 'faces_cap', 'fingers_av', 'users_av', 'rec_av',
+)
+
+class ReplayError(Exception):
+    pass
+
+def encode_value(value):
+    """
+    Converts an argument or result of a pyzk call into JSON (bytes as hex, datetimes as ISO).
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return {'$b': bytes(value).hex()}
+    if isinstance(value, datetime):
+        return {'$dt': value.isoformat()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): encode_value(item) for key, item in value.items()}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+def decode_value(value):
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    if isinstance(value, dict):
+        if '$b' in value:
+            return bytes.fromhex(value['$b'])
+        if '$dt' in value:
+            return datetime.fromisoformat(value['$dt'])
+        return {key: decode_value(item) for key, item in value.items()}
+    return value
+
+def record_size(total_size: int, count: int, sizes: tuple) -> int:
+    """
+    Returns the record size of a buffer of `total_size` bytes holding about `count`
+    records, among the sizes of the protocol (None if none divides the buffer).
+    """
+    candidates = [size for size in sizes if total_size % size == 0]
+    if not candidates:
+        return None
+    if not count:
+        return candidates[0]
+    return min(candidates, key=lambda size: abs(total_size // size - count))
+
+class UserIdAnonymizer:
+    """
+    Replaces the user ids of the recorded buffers with sequential pseudonyms.
+
+    The same user gets the same pseudonym in every session captured by the process,
+    so the corpus keeps who punched where (duplicates across devices, daily punches of
+    a user) without real ids. The mapping lives in memory only and is never written.
+    Names, passwords and cards of the user table are blanked and fingerprint or face
+    templates are zeroed.
+    """
+
+    def __init__(self):
+        self.pseudonyms: dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def pseudonym(self, user_id: str) -> str:
+        if not user_id or user_id == '0':
+            return user_id
+        with self.lock:
+            pseudonym = self.pseudonyms.get(user_id)
+            if pseudonym is None:
+                pseudonym = self.pseudonyms[user_id] = str(len(self.pseudonyms) + 1)
+            return pseudonym
+
+    def attendances(self, buffer: bytearray, records: int):
+        """
+        Anonymizes in place an attendance buffer (4-byte size followed by the records).
+        8-byte records only hold the internal uid, resolved through the user table.
+        """
+        if len(buffer) < 4:
+            return
+        size = record_size(unpack('I', buffer[:4])[0], records, RECORD_SIZES)
+        if size not in (40, 16):
+            return
+        for offset in range(4, len(buffer) - size + 1, size):
+            if size == 40:
+                user_id = bytes(buffer[offset + 2:offset + 26]).split(b'\x00')[0].decode(errors='ignore')
+                buffer[offset + 2:offset + 26] = self.pseudonym(user_id).encode().ljust(24, b'\x00')[:24]
+            elif size == 16:
+                user_id = unpack('<I', buffer[offset:offset + 4])[0]
+                buffer[offset:offset + 4] = pack('<I', int(self.pseudonym(str(user_id))))
+
+    def users(self, buffer: bytearray, users: int):
+        """
+        Anonymizes in place a user table buffer (4-byte size followed by the users).
+        """
+        if len(buffer) < 4:
+            return
+        size = record_size(unpack('I', buffer[:4])[0], users, USER_SIZES)
+        if size is None:
+            return
+        for offset in range(4, len(buffer) - size + 1, size):
+            if size == 28:
+                buffer[offset + 3:offset + 16] = bytes(13)  # Password and name
+                buffer[offset + 16:offset + 20] = bytes(4)  # Card
+                user_id = unpack('<I', buffer[offset + 24:offset + 28])[0]
+                buffer[offset + 24:offset + 28] = pack('<I', int(self.pseudonym(str(user_id))))
+            elif size == 72:
+                buffer[offset + 3:offset + 35] = bytes(32)
+                buffer[offset + 35:offset + 39] = bytes(4)
+                user_id = bytes(buffer[offset + 48:offset + 72]).split(b'\x00')[0].decode(errors='ignore')
+                buffer[offset + 48:offset + 72] = self.pseudonym(user_id).encode().ljust(24, b'\x00')[:24]
+
+    def buffer(self, command: int, buffer: bytes, sizes: dict) -> bytes:
+        data = bytearray(buffer)
+        if command == CMD_ATTLOG_RRQ:
+            self.attendances(data, sizes.get('records'))
+        elif command == CMD_USERTEMP_RRQ:
+            self.users(data, sizes.get('users'))
+        else:
+            data = bytearray(len(data))
+        return bytes(data)
+
+class SessionRecording:
+    """
+    The calls of one device session: a header (device, transport, counters when the
+    capture started) and one event per call, with its arguments, result, time offset
+    and duration. Byte results (buffers, chunks, the data of a command) are kept apart
+    from the JSON metadata.
+
+    File format: gzip of `MAGIC`, then per entry a 4-byte length and a JSON document,
+    each event followed by a 4-byte length and its raw payload. The header is the
+    first entry.
+    """
+
+    def __init__(self, header: dict, events: list = None):
+        self.header = header
+        self.events: list[tuple[dict, bytes]] = events if events is not None else []
+
+    @classmethod
+    def load(cls, path: str) -> 'SessionRecording':
+        with gzip.open(path, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ReplayError(f'{path} no es una grabacion de sesion')
+            header = json.loads(cls.__read_block(file))
+            events = []
+            while True:
+                meta = cls.__read_block(file)
+                if meta is None:
+                    break
+                payload = cls.__read_block(file)
+                events.append((json.loads(meta), payload if payload else None))
+        return cls(header, events)
+
+    @staticmethod
+    def __read_block(file) -> bytes:
+        length = file.read(4)
+        if len(length) < 4:
+            return None
+        return file.read(unpack('<I', length)[0])
+
+    def save(self, path: str):
+        """
+        Writes the recording atomically (temporary file + rename).
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        temp_path = f'{path}.tmp'
+        with gzip.open(temp_path, 'wb', compresslevel=6) as file:
+            file.write(MAGIC)
+            self.__write_block(file, json.dumps(self.header).encode('utf-8'))
+            for meta, payload in self.events:
+                self.__write_block(file, json.dumps(meta, separators=(',', ':')).encode('utf-8'))
+                self.__write_block(file, payload or b'')
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def __write_block(file, data: bytes):
+        file.write(pack('<I', len(data)))
+        file.write(data)
+
+    def summary(self) -> dict:
+        calls: dict[str, int] = {}
+        for meta, _ in self.events:
+            calls[meta['m']] = calls.get(meta['m'], 0) + 1
+        last = self.events[-1][0] if self.events else {'t': 0, 'd': 0}
+        return {
+            **self.header,
+            'events': len(self.events),
+            'bytes': sum(len(payload or b'') for _, payload in self.events),
+            'duration': round(last['t'] + last['d'], 3),
+            'calls': calls,
+        }
+
+class SessionCapture:
+    """
+    Records the calls made to the pyzk connection of a `ConnectionManager`.
+
+    Each method of `RECORDED_METHODS` is wrapped through an instance attribute of the
+    connection, which pyzk's own internal calls (e.g. `get_attendance` calling
+    `read_sizes` and `read_with_buffer`) also go through. Only the outermost call is
+    recorded, so a replay feeds pyzk the same responses and its parsing runs again.
+    The capture starts on a connected session: the handshake is not recorded.
+    """
+
+    def __init__(self, conn_manager, ip: str, communication: str = None, anonymizer: UserIdAnonymizer = None):
+        """
+        Args:
+            conn_manager (ConnectionManager): A connected connection manager.
+            ip (str): IP address of the device.
+            communication (str, optional): Transport of the device, informative.
+            anonymizer (UserIdAnonymizer, optional): Anonymizes the buffers when saving.
+        """
+        self.zk = conn_manager.conn
+        self.anonymizer = anonymizer
+        self.header = {
+            'ip': ip,
+            'communication': communication,
+            'tcp': bool(getattr(self.zk, 'tcp', True)),
+            'encoding': getattr(self.zk, 'encoding', 'UTF-8'),
+            'captured': datetime.now().isoformat(timespec='seconds'),
+            'anonymized': anonymizer is not None,
+            'sizes': {name: getattr(self.zk, name, None) for name in SIZE_ATTRIBUTES},
+        }
+        self.events: list[tuple[dict, bytes]] = []
+        self.previous: dict[str, object] = {}
+        self.depth = 0
+        self.started = time.perf_counter()
+
+    def attach(self) -> 'SessionCapture':
+        for name in RECORDED_METHODS:
+            original = getattr(self.zk, name, None)
+            if original is None:
+                continue
+            if name in vars(self.zk):
+                self.previous[name] = vars(self.zk)[name]
+            setattr(self.zk, name, self.__wrap(name, original))
+        return self
+
+    def detach(self):
+        for name in RECORDED_METHODS:
+            vars(self.zk).pop(name, None)
+        for name, value in self.previous.items():
+            setattr(self.zk, name, value)
+        self.previous = {}
+
+    def __wrap(self, name: str, original):
+        def recorded(*args):
+            if self.depth:
+                return original(*args)
+            self.depth += 1
+            start = time.perf_counter()
+            meta = {'m': name, 'a': encode_value(args), 't': round(start - self.started, 6)}
+            payload = None
+            try:
+                result = original(*args)
+            except Exception as e:
+                meta['e'] = [type(e).__name__, str(e)]
+                raise
+            else:
+                meta['r'], payload = self.__result(name, result)
+                return result
+            finally:
+                meta['d'] = round(time.perf_counter() - start, 6)
+                self.events.append((meta, payload))
+                self.depth -= 1
+        return recorded
+
+    def __result(self, name: str, result) -> tuple:
+        """
+        Splits a result into its JSON part and its byte payload, adding the connection
+        state the call leaves behind.
+        """
+        if name == 'read_with_buffer':
+            return result[1], result[0]
+        if name == '_ZK__read_chunk':
+            return None, result
+        if name == '_ZK__send_command':
+            return {'response': encode_value(result), 'data': self.zk._ZK__data is not None}, self.zk._ZK__data
+        if name == 'read_sizes':
+            return {'result': result, 'sizes': {attribute: getattr(self.zk, attribute, None) for attribute in SIZE_ATTRIBUTES}}, None
+        if name == 'connect':
+            return None, None
+        return encode_value(result), None
+
+    def close(self, path: str):
+        """
+        Stops recording and saves the session, anonymized if an anonymizer was given.
+        """
+        self.detach()
+        if self.anonymizer is not None:
+            self.__anonymize()
+        SessionRecording(self.header, self.events).save(path)
+
+    def __anonymize(self):
+        sizes = dict(self.header['sizes'])
+        chunks: list[int] = []
+        buffer_command = None
+        buffer_size = 0
+
+        def flush():
+            if not chunks:
+                return
+            buffer = bytearray(buffer_size)
+            for position in chunks:
+                meta, payload = self.events[position]
+                start = decode_value(meta['a'])[0]
+                buffer[start:start + len(payload)] = payload
+            anonymized = self.anonymizer.buffer(buffer_command, pack('I', buffer_size - 4) + bytes(buffer[4:]), sizes)
+            for position in chunks:
+                meta, payload = self.events[position]
+                start = decode_value(meta['a'])[0]
+                chunk = anonymized[start:start + len(payload)]
+                if start < 4:
+                    chunk = payload[:4 - start] + chunk[4 - start:]  # The size prefix stays as read
+                self.events[position] = (meta, chunk)
+            chunks.clear()
+
+        for position, (meta, payload) in enumerate(self.events):
+            name = meta['m']
+            if name == 'read_sizes' and meta.get('r'):
+                sizes = meta['r']['sizes']
+            elif name == 'read_with_buffer' and payload:
+                self.events[position] = (meta, self.anonymizer.buffer(decode_value(meta['a'])[0], payload, sizes))
+            elif name == '_ZK__send_command':
+                args = decode_value(meta['a'])
+                if args[0] == CMD_PREPARE_BUFFER and payload and len(payload) >= 5:
+                    flush()
+                    buffer_command = unpack('<bhii', args[1])[1]
+                    buffer_size = unpack('I', payload[1:5])[0]
+            elif name == '_ZK__read_chunk' and payload:
+                chunks.append(position)
+            elif name == 'free_data':
+                flush()
+        flush()
+
+def capture_path(folder: str, ip: str) -> str:
+    return os.path.join(folder, f'{datetime.now():%Y%m%d-%H%M%S}_{ip}{CAPTURE_EXTENSION}')
+
+def start_capture(conn_manager, device, anonymizer: UserIdAnonymizer = None) -> SessionCapture:
+    """
+    Starts recording the session of a connected device, logging instead of raising.
+
+    Returns:
+        SessionCapture: The capture, or None if the connection could not be wrapped.
+    """
+    try:
+        return SessionCapture(conn_manager, device.ip, getattr(device, 'communication', None), anonymizer).attach()
+    except Exception as e:
+        logging.warning(f'{device.ip} - No se pudo grabar la sesion: {e}')
+        return None
+
+def finish_capture(capture: SessionCapture, folder: str):
+    """
+    Saves a capture started by `start_capture`, logging instead of raising: a recording
+    must never make a collection fail.
+    """
+    if capture is None:
+        return
+    try:
+        path = capture_path(folder, capture.header['ip'])
+        capture.close(path)
+        logging.debug(f'{capture.header["ip"]} - Sesion grabada en {path}')
+    except Exception as e:
+        logging.warning(f'{capture.header["ip"]} - No se pudo guardar la grabacion de la sesion: {e}')
+
+class SessionPlayer:
+    """
+    Answers the calls of a pyzk connection from a recording.
+
+    Calls are matched in order by method and arguments. A call that does not match the
+    next event skips ahead to the next matching one (a caller may not repeat every
+    call of the capture, e.g. a cached device name); a call with no match left raises
+    `ReplayError`. With `speed` > 0 each answer is delayed until its original time
+    divided by `speed` (1 = original timing); 0 answers at full speed.
+    """
+
+    def __init__(self, recording: SessionRecording, speed: float = 0.0):
+        self.recording = recording
+        self.speed = speed
+        self.position = 0
+        self.skipped = 0
+        self.started = None
+
+    def install(self, zk):
+        for name in RECORDED_METHODS:
+            if hasattr(zk, name):
+                setattr(zk, name, self.__answer(zk, name))
+        for name, value in self.recording.header.get('sizes', {}).items():
+            if value is not None:
+                setattr(zk, name, value)
+
+    def start(self):
+        if self.started is None:
+            self.started = time.perf_counter()
+
+    def __answer(self, zk, name: str):
+        def replayed(*args):
+            meta, payload = self.__next(name, encode_value(args))
+            self.__wait(meta)
+            if 'e' in meta:
+                raise self.__error(*meta['e'])
+            return self.__apply(zk, name, meta.get('r'), payload)
+        return replayed
+
+    def __next(self, name: str, args) -> tuple:
+        events = self.recording.events
+        for position in range(self.position, len(events)):
+            meta = events[position][0]
+            if meta['m'] == name and (name in ARGS_IGNORED or meta['a'] == args):
+                self.skipped += position - self.position
+                self.position = position + 1
+                return events[position]
+        raise ReplayError(f'{self.recording.header.get("ip")} - {name}{tuple(decode_value(args))} no esta en la grabacion '
+                          f'(evento {self.position} de {len(events)})')
+
+    def __wait(self, meta: dict):
+        self.start()
+        if self.speed > 0:
+            delay = self.started + (meta['t'] + meta['d']) / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    @staticmethod
+    def __error(name: str, message: str) -> Exception:
+        try:
+            from zk import exception as zk_exception
+            error_class = getattr(zk_exception, name, None) or getattr(builtins, name, None)
+        except ImportError:
+            error_class = getattr(builtins, name, None)
+        if isinstance(error_class, type) and issubclass(error_class, Exception):
+            return error_class(message)
+        return ReplayError(f'{name}: {message}')
+
+    @staticmethod
+    def __apply(zk, name: str, result, payload: bytes):
+        if name == 'read_with_buffer':
+            return payload or b'', result
+        if name == '_ZK__read_chunk':
+            return payload or b''
+        if name == '_ZK__send_command':
+            zk._ZK__data = payload if result['data'] else None
+            return decode_value(result['response'])
+        if name == 'read_sizes':
+            for attribute, value in result['sizes'].items():
+                setattr(zk, attribute, value)
+            return result['result']
+        if name == 'connect':
+            zk.is_connect = True
+            return zk
+        if name == 'disconnect':
+            zk.is_connect = False
+        return decode_value(result)
+
+    def remaining(self) -> int:
+        return len(self.recording.events) - self.position
+
+class ReplayConnectionManager:
+    """
+    Stands in for `ConnectionManager` on a recorded session, without any network.
+
+    `conn` is a real pyzk connection whose device calls are answered by a
+    `SessionPlayer`, so `get_attendances`, the probe, the chunked download and the
+    formatting and writing that follow run exactly as on the live session.
+    """
+
+    def __init__(self, recording, speed: float = 0.0):
+        """
+        Args:
+            recording (SessionRecording | str): The recording, or the path of its file.
+            speed (float): 0 replays at full speed, 1 at the original timing, 2 twice as fast.
+        """
+        from zk import ZK
+        if isinstance(recording, str):
+            recording = SessionRecording.load(recording)
+        header = recording.header
+        self.ip = header['ip']
+        self.port = 4370
+        self.communication = header.get('communication')
+        self.player = SessionPlayer(recording, speed)
+        self.conn = ZK(self.ip, self.port, force_udp=not header.get('tcp', True), ommit_ping=True,
+                       encoding=header.get('encoding') or 'UTF-8')
+        self.player.install(self.conn)
+        self.connections = 0
+
+    def connect_with_retry(self):
+        # The capture starts on a connected session: only reconnections are recorded
+        self.player.start()
+        if self.connections:
+            self.conn.connect()
+        else:
+            self.conn.is_connect = True
+        self.connections += 1
+
+    def connect(self):
+        self.connect_with_retry()
+
+    def is_connected(self) -> bool:
+        return bool(self.conn.is_connect)
+
+    def disconnect(self):
+        self.conn.disconnect()
+
+    def get_attendances(self) -> list:
+        return self.conn.get_attendance()
+
+    def update_time(self):
+        self.conn.set_time(datetime.now())
+
+    def update_device_name(self) -> str:
+        return self.conn.get_device_name()
+
+    def clear_attendances(self, clear: bool = True):
+        if clear:
+            self.conn.clear_attendance()
+
+def find_captures(paths: list[str]) -> list[str]:
+    """
+    Expands folders into the recordings they contain, sorted.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(CAPTURE_EXTENSION)))
+        else:
+            found.append(path)
+    return found
+
+def main(argv=None):
+    """
+    Inspects and replays recorded device sessions.
+
+    Usage:
+        python -m scripts.business_logic.session_replay info captures
+        python -m scripts.business_logic.session_replay replay captures --speed 1
+    """
+    parser = argparse.ArgumentParser(description='Grabaciones de sesiones de dispositivos')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    info_parser = subparsers.add_parser('info', help='Resume las grabaciones')
+    info_parser.add_argument('paths', nargs='+', help='Grabaciones o carpetas de grabaciones')
+    info_parser.add_argument('--json', action='store_true')
+    replay_parser = subparsers.add_parser('replay', help='Reproduce las grabaciones y descarga sus marcaciones')
+    replay_parser.add_argument('paths', nargs='+', help='Grabaciones o carpetas de grabaciones')
+    replay_parser.add_argument('--speed', type=float, default=0.0, help='0: sin esperas (por defecto), 1: tiempos originales')
+    args = parser.parse_args(argv)
+
+    paths = find_captures(args.paths)
+    if not paths:
+        print('No se encontraron grabaciones', file=sys.stderr)
+        return 1
+    if args.command == 'info':
+        summaries = [dict(SessionRecording.load(path).summary(), path=path) for path in paths]
+        if args.json:
+            print(json.dumps(summaries, indent=2, ensure_ascii=False))
+            return 0
+        for summary in summaries:
+            print(f'{summary["path"]}\t{summary["ip"]}\t{summary["captured"]}\t{summary["events"]} llamadas\t'
+                  f'{summary["bytes"]} bytes\t{summary["duration"]} s\t{"anonimizada" if summary["anonymized"] else "SIN ANONIMIZAR"}')
+        return 0
+
+    status = 0
+    for path in paths:
+        try:
+            conn_manager = ReplayConnectionManager(path, args.speed)
+            start = time.perf_counter()
+            conn_manager.connect_with_retry()
+            attendances = conn_manager.get_attendances()
+            print(f'{path}\t{conn_manager.ip}\t{len(attendances)} marcaciones\t{time.perf_counter() - start:.3f} s\t'
+                  f'{conn_manager.player.skipped} llamadas omitidas')
+        except Exception as e:
+            print(f'{path}\terror: {e}', file=sys.stderr)
+            status = 1
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
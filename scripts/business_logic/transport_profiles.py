@@ -0,0 +1,467 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import configparser
+import ipaddress
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from struct import pack, unpack
+from scripts.business_logic.chunked_download import CMD_ATTLOG_RRQ, CMD_DATA, CMD_PREPARE_BUFFER, MAX_CHUNK_TCP, MAX_CHUNK_UDP
+from scripts.business_logic.device_state import DeviceStateStore
+from scripts.common.utils.file_manager import find_root_directory
+
+PROFILES_FILE = 'transport_profiles.ini'
+DEFAULT_SECTION = 'default'
+POINT_PREFIX = 'point:'
+DEFAULT_PORT = 4370
+DEFAULT_RESUME_ATTEMPTS = 2
+COMMUNICATIONS = ('TCP', 'UDP')
+
+# Candidates tried by the auto-tuning: smaller chunks suit lossy or high-latency links,
+# where a lost datagram costs a whole chunk
+CANDIDATE_CHUNKS = {'TCP': (MAX_CHUNK_TCP, 16384, 4096), 'UDP': (MAX_CHUNK_UDP, 8192, 4096, 1024)}
+TUNING_TIMEOUT = 20
+TIMEOUT_FACTOR = 5  # Timeout = slowest exchange seen while tuning x factor
+MIN_TIMEOUT = 3
+MAX_TIMEOUT = 60
+
+class TransportProfileError(ValueError):
+    """
+    Invalid section or option of the transport profiles file.
+    """
+
+    def __init__(self, section: str, reason: str):
+        self.section = section
+        self.reason = reason
+        super().__init__(f'[{section}]: {reason}')
+
+class TransportProfile:
+    """
+    How to talk to a device. A None field is inherited from the less specific level.
+
+    Fields:
+        communication: 'TCP' or 'UDP'; by default, the one of the device inventory.
+        port: Port of the device.
+        timeout: Seconds to wait for each answer once connected (None: pyzk's default).
+        chunk_size: Bytes per chunk of the chunked download (0: protocol maximum).
+        chunked_min_bytes: Logs of at least this size are downloaded in chunks.
+        resume_attempts: Reconnections tried after a failed chunk.
+    """
+
+    FIELDS = ('communication', 'port', 'timeout', 'chunk_size', 'chunked_min_bytes', 'resume_attempts')
+    __slots__ = FIELDS + ('sources',)
+
+    def __init__(self, communication: str = None, port: int = None, timeout: float = None, chunk_size: int = None,
+                 chunked_min_bytes: int = None, resume_attempts: int = None):
+        self.communication = communication
+        self.port = port
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.chunked_min_bytes = chunked_min_bytes
+        self.resume_attempts = resume_attempts
+        self.sources: dict[str, str] = {}
+
+    @classmethod
+    def from_mapping(cls, section: str, mapping) -> 'TransportProfile':
+        """
+        Builds a profile from the options of a section (strings or values).
+
+        Raises:
+            TransportProfileError: On an unknown option or an invalid value.
+        """
+        profile = cls()
+        for name, raw in mapping.items():
+            if name not in cls.FIELDS:
+                raise TransportProfileError(section, f'opcion desconocida {name!r}')
+            if raw is None or str(raw).strip() == '':
+                continue
+            try:
+                value = parse_field(name, str(raw).strip())
+            except ValueError as e:
+                raise TransportProfileError(section, f'{name}: {e}') from None
+            setattr(profile, name, value)
+        return profile
+
+    def overlay(self, other: 'TransportProfile', source: str) -> 'TransportProfile':
+        """
+        Returns a copy of this profile with the fields set in `other` replacing its own.
+        """
+        merged = TransportProfile(**{name: getattr(self, name) for name in self.FIELDS})
+        merged.sources = dict(self.sources)
+        for name in self.FIELDS:
+            value = getattr(other, name)
+            if value is not None:
+                setattr(merged, name, value)
+                merged.sources[name] = source
+        return merged
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS if getattr(self, name) is not None}
+
+def parse_field(name: str, text: str):
+    if name == 'communication':
+        value = text.upper()
+        if value not in COMMUNICATIONS:
+            raise ValueError(f'se esperaba TCP o UDP, no {text!r}')
+        return value
+    if name == 'timeout':
+        value = float(text)
+        if value <= 0:
+            raise ValueError('debe ser mayor que 0')
+        return value
+    value = int(text)
+    if name == 'port' and not 0 < value < 65536:
+        raise ValueError(f'puerto invalido {value}')
+    if value < 0:
+        raise ValueError('no puede ser negativo')
+    return value
+
+class TransportProfiles(DeviceStateStore):
+    """
+    Transport settings of each device, by level, from the least to the most specific:
+
+    1. The built-in defaults: communication of the device inventory, port 4370.
+    2. `[default]` of `transport_profiles.ini` (next to config.ini).
+    3. `[point:<name>]`: the devices of a point (e.g. the clocks behind a VPN).
+    4. The profile found by `tune` for the device (`state/transport_profiles.json`).
+    5. `[<ip>]`: a device, set by hand; it always wins over the tuned profile.
+
+    Fields left empty at every level keep the values of `[Device_config]`
+    (`download_chunk_size`, `chunked_download_min_bytes`).
+    """
+
+    def __init__(self, root: str = None):
+        self.file_path = os.path.join(root or find_root_directory(), PROFILES_FILE)
+        self.sections: dict[str, TransportProfile] = {}
+        self.errors: list[TransportProfileError] = []
+        self.save_lock = threading.Lock()
+        super().__init__('transport_profiles', root)
+
+    def load(self):
+        """
+        Loads the tuned profiles and the profiles file.
+        """
+        super().load()
+        self.load_file()
+
+    def load_file(self, strict: bool = False):
+        """
+        Reads `transport_profiles.ini`. Invalid sections are logged and ignored (or raised if `strict`).
+        """
+        self.sections = {}
+        self.errors = []
+        parser = configparser.ConfigParser(default_section='\x00', interpolation=None)
+        parser.optionxform = str.lower
+        try:
+            with open(self.file_path, encoding='utf-8') as file:
+                parser.read_file(file)
+        except FileNotFoundError:
+            return
+        except configparser.Error as e:
+            error = TransportProfileError(PROFILES_FILE, str(e).splitlines()[0])
+            if strict:
+                raise error
+            self.errors.append(error)
+            logging.warning(f'Perfiles de comunicacion: {error}')
+            return
+        for section in parser.sections():
+            try:
+                check_section_name(section)
+                self.sections[section] = TransportProfile.from_mapping(section, parser[section])
+            except TransportProfileError as e:
+                if strict:
+                    raise
+                self.errors.append(e)
+                logging.warning(f'Perfiles de comunicacion: {e}')
+
+    def resolve(self, device) -> TransportProfile:
+        """
+        Returns the transport profile of a device, every level applied.
+        """
+        profile = TransportProfile(communication=getattr(device, 'communication', None), port=DEFAULT_PORT,
+                                   resume_attempts=DEFAULT_RESUME_ATTEMPTS)
+        profile.sources = {'communication': 'inventario', 'port': 'predeterminado', 'resume_attempts': 'predeterminado'}
+        levels = [(DEFAULT_SECTION, self.sections.get(DEFAULT_SECTION))]
+        point = getattr(device, 'point', None)
+        if point:
+            levels.append((f'{POINT_PREFIX}{point}', self.sections.get(f'{POINT_PREFIX}{point}')))
+        tuned = self.get(device.ip)
+        if tuned:
+            levels.append(('tune', TransportProfile.from_mapping('tune', {name: tuned.get(name) for name in TransportProfile.FIELDS})))
+        levels.append((device.ip, self.sections.get(device.ip)))
+        for source, level in levels:
+            if level is not None:
+                profile = profile.overlay(level, source)
+        return profile
+
+    def save(self):
+        with self.save_lock:
+            super().save()
+
+def check_section_name(section: str):
+    if section == DEFAULT_SECTION:
+        return
+    if section.startswith(POINT_PREFIX):
+        if not section[len(POINT_PREFIX):].strip():
+            raise TransportProfileError(section, 'falta el nombre del punto')
+        return
+    try:
+        ipaddress.ip_address(section)
+    except ValueError:
+        raise TransportProfileError(section, 'se esperaba default, point:<punto> o una IP') from None
+
+def apply_timeout(conn_manager, timeout: float):
+    """
+    Sets the answer timeout of a connected session.
+
+    `ConnectionManager` does not take a timeout, so it is set on pyzk's connection and
+    its socket (private `_ZK__timeout` and `_ZK__sock`, as pyzk offers no setter).
+    """
+    if not timeout:
+        return
+    zk = getattr(conn_manager, 'conn', None)
+    if zk is None:
+        return
+    try:
+        zk._ZK__timeout = timeout
+        zk._ZK__sock.settimeout(timeout)
+    except AttributeError:
+        logging.debug(f'{getattr(conn_manager, "ip", "")} - No se pudo aplicar el tiempo de espera {timeout}')
+
+def read_log_sample(zk, chunk_size: int, limit: int) -> tuple:
+    """
+    Reads the first `limit` bytes of the attendance log with chunks of `chunk_size`, like
+    the chunked download does.
+
+    Returns:
+        tuple: (bytes read, seconds of the slowest exchange, size of the whole log).
+    """
+    start = time.perf_counter()
+    response = zk._ZK__send_command(CMD_PREPARE_BUFFER, pack('<bhii', 1, CMD_ATTLOG_RRQ, 0, 0), 1024)
+    slowest = time.perf_counter() - start
+    if not response.get('status'):
+        raise ConnectionError('el dispositivo no admite la lectura por bloques')
+    if response['code'] == CMD_DATA:
+        # Small log: the device sent it whole with the answer
+        read = len(zk._ZK__data or b'')
+        zk.free_data()
+        return read, slowest, read
+    size = unpack('I', zk._ZK__data[1:5])[0]
+    read = 0
+    try:
+        while read < min(size, limit):
+            exchange = time.perf_counter()
+            read += len(zk._ZK__read_chunk(read, min(chunk_size, size - read)))
+            slowest = max(slowest, time.perf_counter() - exchange)
+    finally:
+        zk.free_data()
+    return read, slowest, size
+
+def connect_with_profile(device, profile: TransportProfile):
+    from scripts.common.business_logic.connection_manager import ConnectionManager
+    conn_manager = ConnectionManager(device.ip, profile.port, profile.communication)
+    conn_manager.connect_with_retry()
+    apply_timeout(conn_manager, profile.timeout)
+    return conn_manager
+
+def measure_candidate(device, profile: TransportProfile, rounds: int, sample_bytes: int, connect) -> dict:
+    """
+    Connects `rounds` times with a candidate profile and measures the connection time and
+    the throughput of a chunked read of the attendance log.
+
+    Returns:
+        dict: `failures`, `connect_seconds` (mean), `throughput` (bytes/s, total over the
+        rounds), `log_bytes` (size of the device's log) and `slowest` (seconds of the
+        slowest exchange).
+    """
+    result = {'failures': 0, 'connect_seconds': 0.0, 'throughput': 0.0, 'log_bytes': 0, 'slowest': 0.0}
+    connect_total = transfer_total = transferred = 0.0
+    for _ in range(rounds):
+        conn_manager = None
+        try:
+            start = time.perf_counter()
+            conn_manager = connect(device, profile)
+            connected = time.perf_counter()
+            read, slowest, log_bytes = read_log_sample(conn_manager.conn, profile.chunk_size, sample_bytes)
+            transfer_total += time.perf_counter() - connected
+            connect_total += connected - start
+            transferred += read
+            result['log_bytes'] = log_bytes
+            result['slowest'] = max(result['slowest'], slowest, connected - start)
+        except Exception as e:
+            logging.debug(f'{device.ip} - Perfil {profile.to_dict()} fallo: {e}')
+            result['failures'] += 1
+        finally:
+            try:
+                if conn_manager is not None and conn_manager.is_connected():
+                    conn_manager.disconnect()
+            except Exception:
+                pass
+    succeeded = rounds - result['failures']
+    if succeeded:
+        result['connect_seconds'] = connect_total / succeeded
+        result['throughput'] = transferred / transfer_total if transfer_total else float('inf')
+    return result
+
+def tune_device(device, profiles: TransportProfiles, rounds: int = 2, sample_bytes: int = 256 * 1024, connect=None) -> dict:
+    """
+    Tries the candidate profiles on a device and returns the fastest reliable one.
+
+    A candidate is reliable if every round succeeded. The fastest is the one with the
+    shortest estimated collection time: connection plus the transfer of the device's
+    whole log at the measured throughput, so a device with a large log favors
+    throughput and one with a small log favors a quick connection. The timeout of the profile is
+    the slowest exchange seen, times `TIMEOUT_FACTOR`, between `MIN_TIMEOUT` and
+    `MAX_TIMEOUT`. An explicit `communication` or `port` of the profiles file is kept.
+
+    Args:
+        device (Device): The device.
+        profiles (TransportProfiles): The profiles, for the fixed fields of the device.
+        rounds (int): Connections per candidate.
+        sample_bytes (int): Bytes of the log read per connection.
+        connect (callable, optional): `connect(device, profile)` returning a connected
+            connection manager (e.g. on a simulator). Defaults to a `ConnectionManager`.
+
+    Returns:
+        dict: The tuned entry (profile fields plus measurements), or None if no candidate
+        was reliable.
+    """
+    connect = connect or connect_with_profile
+    base = profiles.resolve(device)
+    fixed_communication = base.sources.get('communication') not in ('inventario', 'tune')
+    communications = (base.communication,) if fixed_communication else COMMUNICATIONS
+    best = None
+    for communication in communications:
+        for chunk_size in CANDIDATE_CHUNKS.get(communication or 'TCP', CANDIDATE_CHUNKS['TCP']):
+            candidate = TransportProfile(communication=communication, port=base.port, timeout=TUNING_TIMEOUT, chunk_size=chunk_size)
+            measured = measure_candidate(device, candidate, rounds, sample_bytes, connect)
+            if measured['failures']:
+                continue
+            estimate = measured['connect_seconds']
+            if measured['throughput']:
+                estimate += measured['log_bytes'] / measured['throughput']
+            logging.debug(f'{device.ip} - {communication} bloques de {chunk_size}: {estimate:.3f} s estimados')
+            if best is None or estimate < best[0]:
+                best = (estimate, candidate, measured)
+    if best is None:
+        return None
+    estimate, candidate, measured = best
+    timeout = min(MAX_TIMEOUT, max(MIN_TIMEOUT, math.ceil(measured['slowest'] * TIMEOUT_FACTOR)))
+    return {
+        'communication': candidate.communication,
+        'chunk_size': candidate.chunk_size,
+        'timeout': timeout,
+        'throughput': round(measured['throughput']),
+        'connect_seconds': round(measured['connect_seconds'], 3),
+        'estimate_seconds': round(estimate, 3),
+        'tuned': datetime.now().isoformat(timespec='seconds'),
+    }
+
+def tune_devices(devices: list, profiles: TransportProfiles, workers: int = 1, save: bool = True, **options) -> dict:
+    """
+    Tunes several devices, `workers` at a time, and stores the profiles found.
+
+    Devices sharing a link (e.g. a VPN) compete for it when tuned at the same time,
+    which understates their throughput: keep `workers` at 1 unless they are independent.
+
+    Returns:
+        dict: The tuned entry by IP (None for the devices without a reliable candidate).
+    """
+    def tune_one(device):
+        try:
+            return device.ip, tune_device(device, profiles, **options)
+        except Exception as e:
+            logging.warning(f'{device.ip} - No se pudo ajustar la comunicacion: {e}')
+            return device.ip, None
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='tune') as executor:
+        for ip, entry in executor.map(tune_one, devices):
+            results[ip] = entry
+            if entry is not None:
+                profiles.set(ip, entry)
+    if save:
+        profiles.save()
+    return results
+
+def main(argv=None):
+    """
+    Shows, checks and tunes the transport profiles of the devices.
+
+    Usage:
+        python -m scripts.business_logic.transport_profiles check
+        python -m scripts.business_logic.transport_profiles show --point "Sucursal Norte"
+        python -m scripts.business_logic.transport_profiles tune --ip 192.168.1.50 --rounds 3
+    """
+    parser = argparse.ArgumentParser(description='Perfiles de comunicacion de los dispositivos')
+    parser.add_argument('--root', help='Directorio raiz (por defecto, el de la aplicacion)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('check', help=f'Valida {PROFILES_FILE}')
+    show_parser = subparsers.add_parser('show', help='Muestra el perfil resultante de cada dispositivo')
+    tune_parser = subparsers.add_parser('tune', help='Prueba perfiles candidatos y guarda el mas rapido confiable')
+    for subparser in (show_parser, tune_parser):
+        subparser.add_argument('--ip', action='append')
+        subparser.add_argument('--point', action='append')
+    show_parser.add_argument('--json', action='store_true')
+    tune_parser.add_argument('--rounds', type=int, default=2, help='Conexiones por candidato')
+    tune_parser.add_argument('--sample-kb', type=int, default=256, help='KiB del registro leidos por conexion')
+    tune_parser.add_argument('--workers', type=int, default=1)
+    tune_parser.add_argument('--dry-run', action='store_true', help='No guarda los perfiles encontrados')
+    args = parser.parse_args(argv)
+
+    root = args.root or find_root_directory()
+    profiles = TransportProfiles(root)
+    if args.command == 'check':
+        for error in profiles.errors:
+            print(f'Error: {error}')
+        print(f'{profiles.file_path}: {len(profiles.sections)} secciones validas, {len(profiles.errors)} con error')
+        return 1 if profiles.errors else 0
+
+    from scripts.business_logic.service_manager import select_devices
+    from scripts.common.business_logic.device_manager import get_devices_info
+    devices = select_devices(get_devices_info(), args.ip, args.point)
+    if args.command == 'show':
+        resolved = {device.ip: profiles.resolve(device) for device in devices}
+        if args.json:
+            print(json.dumps({ip: {'profile': profile.to_dict(), 'sources': profile.sources} for ip, profile in resolved.items()}, indent=2, ensure_ascii=False))
+            return 0
+        for ip, profile in resolved.items():
+            print(f'{ip}\t' + '\t'.join(f'{name}={value} ({profile.sources.get(name)})' for name, value in profile.to_dict().items()))
+        return 0
+
+    results = tune_devices(devices, profiles, args.workers, save=not args.dry_run,
+                           rounds=args.rounds, sample_bytes=args.sample_kb * 1024)
+    for ip, entry in results.items():
+        if entry is None:
+            print(f'{ip}\tsin perfil confiable, se mantiene el anterior')
+        else:
+            print(f'{ip}\t{entry["communication"]}\tbloques de {entry["chunk_size"]}\ttimeout {entry["timeout"]} s\t'
+                  f'{entry["throughput"] / 1024:.0f} KiB/s\tconexion {entry["connect_seconds"]} s')
+    return 1 if any(entry is None for entry in results.values()) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import os
+from scripts.common.utils.file_manager import find_root_directory
+
+# The win32 modules are imported inside each method so the tray application
+# can create the manager without paying their import cost at startup.
+class ServiceManager:
+    svc_python_class = "schedulerService.SchedulerService"
+    svc_name = "GESTOR_RELOJ_ASISTENCIA"
+    svc_display_name = "GESTOR RELOJ DE ASISTENCIAS"
+    svc_description = "Servicio para sincronización de tiempo y recuperación de datos de asistencia."
+    
+    def __init__(self):
+        super().__init__()
+
+    def service_is_installed(self, service_name):
+        """
+        Checks if a Windows service is installed on the system.
+
+        Args:
+            service_name (str): The name of the service to check.
+
+        Returns:
+            bool: True if the service is installed, False otherwise.
+
+        Notes:
+            - This function uses the `pywin32` library to interact with the Windows
+              Service Control Manager (SCM).
+            - If the service cannot be opened, it is assumed to be not installed.
+            - Logs a warning if the service is not installed.
+            - Handles exceptions and returns False in case of errors.
+
+        Raises:
+            None: All exceptions are caught and handled within the function.
+        """
+        import win32service
+
+        try:
+            # Open the service control manager
+            scm = win32service.OpenSCManager(None, None, win32service.SC_MANAGER_ALL_ACCESS)
+            try:
+                # Try to open the service
+                service = win32service.OpenService(scm, service_name, win32service.SERVICE_QUERY_STATUS)
+                # If the service can be opened, it is installed
+                win32service.CloseServiceHandle(service)
+                return True
+            except win32service.error as e:
+                # If the error is ERROR_SERVICE_DOES_NOT_EXIST, the service is not installed
+                logging.warning("Servicio no instalado")
+                return False
+            finally:
+                win32service.CloseServiceHandle(scm)
+        except Exception as e:
+            print(f"Error al verificar el servicio: {e}")
+            return False
+        
+    def check_and_install_service(self):
+        """
+        Checks if a Windows service is installed, and installs it if it is not.
+        This method verifies whether the service specified by `self.svc_name` is installed.
+        If the service is not installed, it attempts to install it using the provided
+        service configuration details such as the Python class string, service name,
+        display name, executable name, description, and start type.
+        Installation involves locating the `schedulerService.exe` executable in the root
+        directory and using the `win32serviceutil.InstallService` function to register
+        the service with the Windows Service Manager.
+        Logs appropriate messages for success, failure, or if the service is already installed.
+        Raises:
+            Exception: Logs an error message if an exception occurs during the installation process.
+        Returns:
+            None
+        """
+        import win32service
+        import win32serviceutil
+
+        if not self.service_is_installed(self.svc_name):
+            # Install the service if it is not installed
+            try:
+                #logging.debug(os.path.join(find_marker_directory("schedulerService.exe"), 'schedulerService.exe'))
+                exe_name = None
+                if os.path.isfile(os.path.join(find_root_directory(), 'schedulerService.exe')):
+                    exe_name = os.path.join(find_root_directory(), 'schedulerService.exe')
+                    #logging.debug("EXE: "+exe_name)
+                win32serviceutil.InstallService(pythonClassString=self.svc_python_class, serviceName=self.svc_name, displayName=self.svc_display_name, exeName=exe_name, description=self.svc_description, startType=win32service.SERVICE_AUTO_START)
+                
+            except Exception as e:
+                logging.error(f'Error al instalar el servicio {self.svc_name}: {e}')
+                return
+            logging.info(f'Servicio {self.svc_name} instalado correctamente')
+        else:
+            logging.info(f'Servicio {self.svc_name} ya instalado')
@@ -0,0 +1,129 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import os
+from PyQt5.QtCore import QRectF, Qt
+from PyQt5.QtGui import QColor, QIcon, QPainter, QPen, QPixmap
+from scripts.common.utils.file_manager import find_marker_directory
+
+TRAY_ICON_PREFIX = 'circle-'
+BADGE_STEP = 5  # Progress is rounded to multiples of this value so the badge cache stays small
+
+class IconCache:
+    """
+    In-memory cache of the tray icons.
+
+    Every image in `resources/system_tray` is decoded once, when the cache is
+    created (after the QApplication exists). `circle-<color>.png` images are
+    available by color name and any other image by its file name without the
+    extension, so new variants only need to be dropped in the folder. Progress
+    badges are composited over the cached pixmaps in memory and memoized.
+    """
+
+    def __init__(self, resources_directory: str = None):
+        """
+        Locates the resources folder once and preloads every tray image.
+
+        Args:
+            resources_directory (str, optional): Folder that contains `resources`.
+                Defaults to the directory found by `find_marker_directory("resources")`.
+        """
+        self.resources_path = os.path.join(resources_directory or find_marker_directory("resources"), "resources")
+        self.pixmaps: dict[str, QPixmap] = {}
+        self.icons: dict[str, QIcon] = {}
+        self.badges: dict[tuple[str, int], QIcon] = {}
+        self.window_icon = QIcon(os.path.join(self.resources_path, "fingerprint.ico"))
+        self.__preload(os.path.join(self.resources_path, "system_tray"))
+
+    def __preload(self, folder: str):
+        try:
+            file_names = sorted(os.listdir(folder))
+        except OSError as e:
+            logging.error(f"Error al cargar los iconos de la bandeja del sistema: {e}")
+            return
+        for file_name in file_names:
+            name, extension = os.path.splitext(file_name)
+            if extension.lower() not in ('.png', '.ico'):
+                continue
+            if name.startswith(TRAY_ICON_PREFIX):
+                name = name[len(TRAY_ICON_PREFIX):]
+            pixmap = QPixmap(os.path.join(folder, file_name))
+            if pixmap.isNull():
+                logging.warning(f"No se pudo decodificar el icono {file_name}")
+                continue
+            self.pixmaps[name] = pixmap
+            self.icons[name] = QIcon(pixmap)
+
+    def icon(self, color: str) -> QIcon:
+        """
+        Returns the cached tray icon of a color.
+
+        Args:
+            color (str): The color identifier (e.g., "red", "green", "yellow", "grey").
+
+        Returns:
+            QIcon: The cached icon, or an empty icon if the color has no image.
+        """
+        icon = self.icons.get(color)
+        if icon is None:
+            logging.warning(f"Icono no disponible para el color {color}")
+            return QIcon()
+        return icon
+
+    def badge(self, color: str, progress: int) -> QIcon:
+        """
+        Returns the icon of a color with a progress ring drawn over it.
+
+        The badge is rendered in memory from the cached pixmap and memoized by
+        color and progress (rounded to `BADGE_STEP`).
+
+        Args:
+            color (str): The color identifier of the base icon.
+            progress (int): Progress percentage between 0 and 100.
+
+        Returns:
+            QIcon: The composited icon.
+        """
+        progress = max(0, min(100, int(round(progress / BADGE_STEP) * BADGE_STEP)))
+        key = (color, progress)
+        icon = self.badges.get(key)
+        if icon is None:
+            base = self.pixmaps.get(color)
+            if base is None:
+                return self.icon(color)
+            icon = QIcon(self.__render_badge(base, progress))
+            self.badges[key] = icon
+        return icon
+
+    def __render_badge(self, base: QPixmap, progress: int) -> QPixmap:
+        pixmap = QPixmap(base)
+        size = min(pixmap.width(), pixmap.height())
+        pen_width = max(2, size // 8)
+        margin = pen_width / 2
+        rect = QRectF(margin, margin, size - pen_width, size - pen_width)
+        painter = QPainter(pixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(QPen(QColor(0, 0, 0, 70), pen_width))
+        painter.drawEllipse(rect)
+        painter.setPen(QPen(QColor(255, 255, 255), pen_width, Qt.SolidLine, Qt.RoundCap))
+        # Angles are in 1/16th of a degree, starting at 12 o'clock and going clockwise
+        painter.drawArc(rect, 90 * 16, -int(360 * 16 * progress / 100))
+        painter.end()
+        return pixmap
@@ -17,24 +17,27 @@
     along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+import json
 import socket
-from scripts.business_logic.service_manager import ServiceManager
+from scripts.business_logic.windows_service import ServiceManager
 from scripts.common.utils.errors import BaseError
 import sys
-import win32serviceutil
 import logging
 import os
 import time
-import win32service
 from scripts import config
 from PyQt5.QtWidgets import QApplication
-from PyQt5.QtGui import QIcon
 from scripts.common.utils.add_to_startup import add_to_startup, is_startup_entry_exists, remove_from_startup
 from PyQt5.QtWidgets import QMainWindow, QSystemTrayIcon, QMenu, QAction, QMessageBox
 from PyQt5.QtCore import pyqtSlot
-from scripts.common.utils.file_manager import find_marker_directory, find_root_directory
+from scripts.common.utils.file_manager import find_root_directory
 from scripts.common.utils.system_utils import exit_duplicated_instance, is_user_admin, run_as_admin, verify_duplicated_instance
 from PyQt5.QtCore import QThread, pyqtSignal
+from scripts.business_logic.command_channel import send_command
+from scripts.business_logic.service_control import SERVICE_RUNNING, STATE_NAMES, WindowsServiceBackend
+from scripts.ui.icon_cache import IconCache
+from scripts.ui.service_worker import ServiceControlWorker
+from scripts.ui.startup_profiler import profiler
 
 config.read(os.path.join(find_root_directory(), 'config.ini'))  # Read the config.ini configuration file
 
@@ -103,10 +106,9 @@ class MainWindow(QMainWindow):
         - Initializes the base class.
         - Sets up the initial state of the application, including flags for automatic startup and attendance clearing.
         - Verifies if another instance of the application is already running and exits if a duplicate instance is detected.
+        - Initializes the system tray icon and user interface, before any slow operation.
         - Starts a socket listener in a separate thread to handle incoming messages.
-        - Manages the installation and verification of the required service.
-        - Initializes the system tray icon and user interface.
-        - Optionally starts the application's execution based on predefined conditions.
+        - Installs (if needed) and starts the service in a background worker, which reports its progress.
         Raises:
             Exception: If an error occurs during initialization, it logs the error message.
         """
@@ -127,18 +129,28 @@ class MainWindow(QMainWindow):
             if verify_duplicated_instance(sys.argv[0]):
                 exit_duplicated_instance()
 
+            self.service_manager = ServiceManager()
+
+            # Show the tray icon before any slow operation so the user gets feedback right away
+            self.tray_icon = None  # Variable to store the QSystemTrayIcon
+            self.__init_ui()  # Initialize the user interface
+            profiler.mark('icono visible')
+
             # Start the socket listener in a new thread.
             self.socket_listener_thread = SocketListenerThread(parent=self)
             self.socket_listener_thread.message_received.connect(self.handle_message_received)
             self.socket_listener_thread.start()
 
-            self.service_manager = ServiceManager()
-            self.service_manager.check_and_install_service()
+            # Every service operation runs in a worker thread, the UI only reacts to its signals
+            self.service_worker = ServiceControlWorker(WindowsServiceBackend(self.service_manager), self.service_manager.svc_name, max_retries=self.MAX_RETRIES, parent=self)
+            self.service_worker.progress.connect(self.__handle_service_progress)
+            self.service_worker.state_changed.connect(self.__handle_service_state)
+            self.service_worker.operation_finished.connect(self.__handle_service_operation)
+            self.service_worker.start()
 
-            self.tray_icon = None  # Variable to store the QSystemTrayIcon
-            self.__init_ui()  # Initialize the user interface
-
-            self.__opt_start_execution()
+            # Install (if needed) and start the service in the background
+            self.tray_icon.showMessage("Notificación", 'Iniciando el servicio', QSystemTrayIcon.Information)
+            self.service_worker.request('install_start')
         except Exception as e:
             logging.error(f"Error al iniciar la aplicacion: {e}")
 
@@ -148,8 +160,29 @@ class MainWindow(QMainWindow):
 
         Args:
             message (str): The message received, which determines the color to set for the tray icon.
+                It may carry a progress percentage as `<color>:<progress>` (e.g., "yellow:40"),
+                or be a JSON notification (e.g., a capacity alert) shown as a balloon message.
+        """
+        if message.startswith('{'):
+            self.show_notification(message)
+            return
+        color, _, progress = message.partition(':')
+        if progress.isdigit():
+            self.set_icon_progress(self.tray_icon, color, int(progress))
+        else:
+            self.set_icon_color(self.tray_icon, color)
+
+    def show_notification(self, message):
+        """
+        Shows a JSON notification of the service ({"level": ..., "title": ..., "text": ...}).
         """
-        self.set_icon_color(self.tray_icon, message)
+        try:
+            notification = json.loads(message)
+        except ValueError as e:
+            logging.error(f"Notificacion invalida: {e}")
+            return
+        level = QSystemTrayIcon.Critical if notification.get('level') == 'critical' else QSystemTrayIcon.Warning
+        self.tray_icon.showMessage(notification.get('title', 'Notificación'), notification.get('text', ''), level)
 
     def __init_ui(self):
         """
@@ -159,6 +192,7 @@ class MainWindow(QMainWindow):
         calls the necessary function to create and configure the tray icon.
         """
         # Create and configure the system tray icon
+        self.icon_cache = IconCache()  # Decode every tray icon once
         self.color_icon = "red"  # Initial icon color
         self.__create_tray_icon()  # Create the system tray icon        
 
@@ -173,6 +207,7 @@ class MainWindow(QMainWindow):
         - Restart service
         - Reinstall service
         - Uninstall service
+        - Collect attendances now (on-demand run through the command channel)
         - Toggle "Eliminar marcaciones" (clear attendance) checkbox
         - Toggle "Iniciar automáticamente" (automatic start) checkbox
         - Exit the application
@@ -182,11 +217,8 @@ class MainWindow(QMainWindow):
         Attributes:
             tray_icon (QSystemTrayIcon): The system tray icon instance.
         """
-        file_path = os.path.join(find_marker_directory("resources"), "resources", "system_tray", f"circle-{self.color_icon}.png")  # Icon file path
-        #logging.debug(file_path)
-
         try:
-            self.tray_icon = QSystemTrayIcon(QIcon(file_path), self)  # Create QSystemTrayIcon with the icon and associated main window
+            self.tray_icon = QSystemTrayIcon(self.icon_cache.icon(self.color_icon), self)  # Create QSystemTrayIcon with the icon and associated main window
             self.tray_icon.showMessage("Notificación", 'Iniciando la aplicación', QSystemTrayIcon.Information)
             self.tray_icon.setToolTip("Servicio Reloj de Asistencias")  # Tooltip text
 
@@ -208,6 +240,10 @@ class MainWindow(QMainWindow):
             action_uninstall_service.setObjectName("actionUninstallService")
             menu.addAction(action_uninstall_service)  # Action to uninstall the service
             menu.addSeparator()  # Context menu separator
+            action_collect_now = self.__create_action("Obtener marcaciones ahora", lambda: self.__opt_collect_now())
+            action_collect_now.setObjectName("actionCollectNow")
+            menu.addAction(action_collect_now)  # Action to request an on-demand run
+            menu.addSeparator()  # Context menu separator
             # Checkbox as QAction with checkable state
             clear_attendance_action = QAction("Eliminar marcaciones", menu)
             clear_attendance_action.setCheckable(True)  # Make the QAction checkable
@@ -232,89 +268,43 @@ class MainWindow(QMainWindow):
     @pyqtSlot()
     def __opt_uninstall_service(self):
         """
-        Uninstalls the service managed by the application.
-
-        This method stops the service execution, removes the service from the system,
-        and updates the application's state and tray icon to reflect the uninstallation.
-        If the service is successfully uninstalled, a notification is displayed to the user.
+        Requests the uninstallation of the service managed by the application.
 
-        Raises:
-            Exception: If an error occurs during the uninstallation process, it is logged.
+        The service is stopped and removed by the service worker. Once it is no longer
+        installed, the tray icon turns grey and a notification is displayed to the user
+        (see `__handle_service_operation`).
+        """
+        self.service_worker.request('uninstall')
 
-        Side Effects:
-            - Stops the service execution.
-            - Removes the service from the system.
-            - Updates the tray icon color to grey.
-            - Displays a notification to the user.
-            - Updates the application's running state.
+    @pyqtSlot()
+    def __opt_collect_now(self):
+        """
+        Asks the running service to collect the attendances of every active device right away.
 
+        The request goes through the local command channel of the service; it is queued
+        next to the scheduled jobs and never runs twice if it was already pending.
         """
         try:
-            self.__opt_stop_execution()
-            win32serviceutil.RemoveService(self.service_manager.svc_name)
-            time.sleep(5)
-            if not self.check_service_running(self.service_manager.svc_name):
-                self.tray_icon.showMessage("Notificación", 'El servicio se desinstaló correctamente', QSystemTrayIcon.Information)
-                self.set_icon_color(self.tray_icon, "grey")  # Set the icon color to red
-                self.__update_running_service(False)  # Mark that the application is not running
-        except Exception as e:
-            logging.error(f"Error al desinstalar el servicio: {e}")
+            response = send_command({'command': 'collect', 'origin': 'tray'}, timeout=2.0)
+            if response.get('queued'):
+                text = 'Se solicitó la obtención de marcaciones'
+            else:
+                text = 'Ya hay una obtención de marcaciones pendiente'
+            self.tray_icon.showMessage("Notificación", text, QSystemTrayIcon.Information)
+        except OSError as e:
+            logging.error(f"Error al solicitar la obtencion de marcaciones: {e}")
+            self.tray_icon.showMessage("Notificación", 'El servicio no está en ejecución', QSystemTrayIcon.Warning)
 
     @pyqtSlot()
     def __opt_reinstall_service(self):
         """
-        Reinstalls the service managed by the application.
-        This method attempts to stop the currently running service, remove it, and then reinstall it.
-        It performs multiple retries to ensure the service is properly installed and running.
-        Steps:
-        1. Stops the execution of the service.
-        2. Removes the service using `win32serviceutil.RemoveService`.
-        3. Attempts to reinstall the service with retries.
-        4. Starts the service and verifies if it is running.
-        5. Displays a notification if the service is successfully reinstalled.
-        Retries are performed if the service fails to start, with a delay between attempts.
-        Exceptions:
-            - Logs errors if the service cannot be removed, installed, or started.
-            - Handles specific `win32service.error` exceptions, such as service not found (error 1060).
-        Attributes:
-            MAX_RETRIES (int): The maximum number of retries for reinstalling the service.
-        Raises:
-            Logs any unexpected exceptions encountered during the process.
-        """
-        try:
-            self.__opt_stop_execution()
-            win32serviceutil.RemoveService(self.service_manager.svc_name)
-            time.sleep(5)
-        except Exception as e:
-            logging.error(f"Error al remover el servicio: {e}")
+        Requests the reinstallation of the service managed by the application.
 
-        try:
-            retries = 0
-            success = False
-            while retries < self.MAX_RETRIES and not success:
-                try:
-                    logging.info(f"Intentando instalar el servicio... Intento {retries + 1}/{self.MAX_RETRIES}")
-                    #logging.debug(find_root_directory())
-                    
-                    self.service_manager.check_and_install_service()
-                    self.__opt_start_execution()
-                    if self.check_service_running(self.service_manager.svc_name):
-                        self.tray_icon.showMessage("Notificación", 'El servicio se reinstaló correctamente', QSystemTrayIcon.Information)
-                        success = True
-                        break
-                    time.sleep(1)  # Wait a moment for the service to change state
-                except win32service.error as e:
-                    if e.winerror == 1060:
-                        logging.error(f'Error al iniciar el servicio {self.service_manager.svc_name}: {e.strerror}')
-                    return
-                except Exception as e:
-                    logging.error(f"Error al intentar iniciar el servicio: {e}")
-                finally:
-                    retries += 1
-                    if not success:
-                        time.sleep(15)  # Wait before trying again
-        except Exception as e:
-            logging.error(f"Error al reinstalar el servicio: {e}")
+        The service worker stops and removes the service, installs it again and starts it
+        with up to `MAX_RETRIES` attempts. A notification is displayed once the service
+        is running again.
+        """
+        self.service_worker.request('reinstall')
 
     @pyqtSlot()
     def __opt_toggle_checkbox_clear_attendance(self):
@@ -366,12 +356,22 @@ class MainWindow(QMainWindow):
         
         Behavior:
             - Updates the `color_icon` attribute with the specified color.
-            - Constructs the file path for the icon image based on the specified color.
-            - Sets the system tray icon to the new icon with the specified color.
+            - Sets the system tray icon to the cached icon of the specified color.
         """
         self.color_icon = color  # Update the icon color
-        file_path = os.path.join(find_marker_directory("resources"), "resources", "system_tray", f"circle-{self.color_icon}.png")  # Icon file path with the new color
-        icon.setIcon(QIcon(file_path))  # Set the new icon with the specified color
+        icon.setIcon(self.icon_cache.icon(color))  # Set the new icon with the specified color
+
+    def set_icon_progress(self, icon: QSystemTrayIcon, color, progress):
+        """
+        Updates the system tray icon with a progress ring over the icon of a color.
+
+        Args:
+            icon (QSystemTrayIcon): The system tray icon object to update.
+            color (str): The color identifier of the base icon.
+            progress (int): Progress percentage between 0 and 100.
+        """
+        self.color_icon = color  # Update the icon color
+        icon.setIcon(self.icon_cache.badge(color, progress))  # Badge rendered in memory
 
     def start_timer(self):
         """
@@ -406,61 +406,62 @@ class MainWindow(QMainWindow):
     @pyqtSlot()
     def __opt_start_execution(self):
         """
-        Attempts to start a service with retries and updates the system tray icon accordingly.
-        This method tries to start a specified service using the service manager. It performs
-        multiple retries if the service fails to start initially. The system tray icon is updated
-        to reflect the service's status.
-        Raises:
-            Exception: If an unexpected error occurs during the service start process.
-        Side Effects:
-            - Displays notifications via the system tray icon.
-            - Logs information, warnings, and errors related to the service start process.
-            - Updates the system tray icon color based on the service status.
-        Workflow:
-            1. Displays a notification indicating the service is starting.
-            2. Attempts to start the service up to `MAX_RETRIES` times.
-            3. Logs the progress and any errors encountered during the process.
-            4. Updates the system tray icon to green if the service starts successfully.
-            5. Logs a critical error if the service fails to start after all retries.
-        Notes:
-            - The method uses `win32serviceutil.StartService` to start the service.
-            - If the service is already running, it logs success and skips further attempts.
-            - A delay is introduced between retries to allow the service to stabilize.
+        Requests the service worker to start the service.
+
+        The start sequence (with up to `MAX_RETRIES` attempts) runs outside the UI thread;
+        the tray icon turns green once the service is running.
         """
-        try:
-            self.tray_icon.showMessage("Notificación", 'Iniciando el servicio', QSystemTrayIcon.Information)
-            retries = 0
-            success = False
-
-            while retries < self.MAX_RETRIES and not success:
-                try:
-                    if self.check_service_running(self.service_manager.svc_name):
-                        logging.info("El servicio se inicio correctamente")
-                        success = True
-                        break
-
-                    logging.info(f"Intentando iniciar el servicio... Intento {retries + 1}/{self.MAX_RETRIES}")
-                    #logging.debug(find_root_directory())
-                    win32serviceutil.StartService(self.service_manager.svc_name, find_marker_directory(self.service_manager.svc_name))
-                    time.sleep(1)  # Wait a moment for the service to change state
-                except win32service.error as e:
-                    if e.winerror == 1060:
-                        logging.error(f'Error al iniciar el servicio {self.service_manager.svc_name}: {e.strerror}')
-                    return
-                except Exception as e:
-                    logging.error(f"Error al intentar iniciar el servicio: {e}")
-                finally:
-                    retries += 1
-                    if not success:
-                        time.sleep(5)  # Wait before trying again
+        self.tray_icon.showMessage("Notificación", 'Iniciando el servicio', QSystemTrayIcon.Information)
+        self.service_worker.request('start')
 
+    @pyqtSlot(str)
+    def __handle_service_progress(self, message):
+        """
+        Shows the progress of the current service operation in the tray icon tooltip.
+
+        Args:
+            message (str): The progress message emitted by the worker.
+        """
+        logging.debug(message)
+        self.tray_icon.setToolTip(f"Servicio Reloj de Asistencias - {message}")
+
+    @pyqtSlot(int)
+    def __handle_service_state(self, state):
+        """
+        Keeps the running flag in sync with the state reported by the service worker.
+
+        Args:
+            state (int): The new state of the service (SERVICE_* constant).
+        """
+        logging.debug(f"Estado del servicio: {STATE_NAMES.get(state, state)}")
+        self.__update_running_service(state == SERVICE_RUNNING)
+
+    @pyqtSlot(str, bool)
+    def __handle_service_operation(self, operation, success):
+        """
+        Updates the tray icon and notifies the user once a service operation finishes.
+
+        Args:
+            operation (str): The finished operation ('start', 'stop', 'reinstall', ...).
+            success (bool): True if the operation reached its expected state.
+        """
+        self.tray_icon.setToolTip("Servicio Reloj de Asistencias")
+        if operation in ('start', 'install_start', 'restart', 'reinstall'):
             if success:
-                self.__update_running_service(True)  # Mark that the application is running
                 self.set_icon_color(self.tray_icon, "green")  # Set the icon color to green
-            else:
-                logging.critical("No se pudo iniciar el servicio despues de multiples intentos")
-        except Exception as e:
-            logging.error(e)
+                if operation == 'reinstall':
+                    self.tray_icon.showMessage("Notificación", 'El servicio se reinstaló correctamente', QSystemTrayIcon.Information)
+            if operation == 'install_start':
+                profiler.mark('servicio verificado')
+                profiler.report(find_root_directory())
+        elif operation == 'stop':
+            if success:
+                self.tray_icon.showMessage("Notificación", 'El servicio se detuvo correctamente', QSystemTrayIcon.Information)
+            if self.color_icon != "yellow":
+                self.set_icon_color(self.tray_icon, "red")  # Set the icon color to red
+        elif operation == 'uninstall' and success:
+            self.tray_icon.showMessage("Notificación", 'El servicio se desinstaló correctamente', QSystemTrayIcon.Information)
+            self.set_icon_color(self.tray_icon, "grey")  # Set the icon color to grey
 
     def __update_running_service(self, is_running):
         """
@@ -487,8 +488,7 @@ class MainWindow(QMainWindow):
         msg_box.setWindowTitle(title)  # Set the dialog box title
         msg_box.setText(text)  # Set the message text
         msg_box.setIcon(QMessageBox.Information)  # Set the dialog box icon (information)
-        file_path = os.path.join(find_marker_directory("resources"), "resources", "fingerprint.ico")
-        msg_box.setWindowIcon(QIcon(file_path))
+        msg_box.setWindowIcon(self.icon_cache.window_icon)
         msg_box.exec_()  # Show the dialog box
 
         # Once the QMessageBox is closed, show the context menu again
@@ -498,105 +498,20 @@ class MainWindow(QMainWindow):
     @pyqtSlot()
     def __opt_stop_execution(self):
         """
-        Stops the execution of a running service.
-
-        This method updates the running service status to False, checks if the service is running,
-        and attempts to stop it. It provides notifications through the system tray icon and logs
-        the process of stopping the service. If the service stops successfully, it updates the
-        tray icon color to red if it is not already yellow.
-
-        Steps:
-        1. Update the running service status to False.
-        2. Check if the service is running.
-        3. If the service is running, stop it and notify the user.
-        4. Wait until the service is fully stopped, logging the progress.
-        5. Notify the user once the service has stopped successfully.
-        6. Change the tray icon color to red if it is not yellow.
-
-        Note:
-            This method interacts with Windows services and requires the `win32serviceutil` module.
-            It also uses a system tray icon for notifications.
+        Requests the service worker to stop the service.
 
-        Raises:
-            Any exceptions raised by `win32serviceutil.StopService` or other service-related operations
-            are not explicitly handled in this method.
+        The worker waits for the service to stop without blocking the UI thread. Once it is
+        stopped, the user is notified and the tray icon turns red if it is not yellow.
         """
         self.__update_running_service(False)
-        if self.check_service_running(self.service_manager.svc_name):
-            win32serviceutil.StopService(self.service_manager.svc_name)
-            self.tray_icon.showMessage("Notificación", 'Deteniendo el servicio', QSystemTrayIcon.Information)
-            logging.debug("Deteniendo el servicio")
-            while not self.check_service_stopped(self.service_manager.svc_name):
-                time.sleep(1)
-                logging.debug("Esperando a que el servicio se detenga...")
-                if self.check_service_stopped(self.service_manager.svc_name):
-                    logging.debug("Se detuvo el servicio")
-                    self.tray_icon.showMessage("Notificación", 'El servicio se detuvo correctamente', QSystemTrayIcon.Information)
-        if self.color_icon != "yellow":
-            self.set_icon_color(self.tray_icon, "red")  # Set the icon color to red
-
-    def check_service_stopped(self, service_name):
-        """
-        Checks if a Windows service is stopped.
-
-        Args:
-            service_name (str): The name of the Windows service to check.
-
-        Returns:
-            bool: True if the service is stopped, False otherwise.
-
-        Notes:
-            - This function uses the `win32serviceutil.QueryServiceStatus` method to query the status of the service.
-            - A service status of 1 indicates that the service is stopped.
-            - If an exception occurs during the query, the function will print an error message and return False.
-        """
-        try:
-            status = win32serviceutil.QueryServiceStatus(service_name)
-            #logging.debug(f"Estado del servicio {service_name}: {status[1]}")  # Debug log: service status
-            # State 4 means it is running
-            if status[1] == 1:
-                return True
-            return False
-        except Exception as e:
-            print(f"Error al verificar el estado del servicio: {e}")
-            return False
-        
-    def check_service_running(self, service_name):
-        """
-        Checks if a specified Windows service is currently running.
-
-        Args:
-            service_name (str): The name of the Windows service to check.
-
-        Returns:
-            bool: True if the service is running (state 4), False otherwise or if an error occurs.
-
-        Raises:
-            Exception: If an error occurs while querying the service status, it is caught and logged.
-        """
-        try:
-            status = win32serviceutil.QueryServiceStatus(service_name)
-            #logging.debug(f"Estado del servicio {service_name}: {status[1]}")  # Debug log: service status
-            #logging.debug(status[1] == 4)
-            # State 4 means it is running
-            if status[1] == 4:
-                return True
-            return False
-        except Exception as e:
-            print(f"Error al verificar el estado del servicio: {e}")
-            return False
+        self.service_worker.request('stop')
 
     @pyqtSlot()
     def __opt_restart_execution(self):
         """
-        Restarts the execution process by stopping the current execution and starting it again.
-
-        This method ensures that the execution process is reset by first invoking the 
-        `__opt_stop_execution` method to halt any ongoing execution, followed by calling 
-        the `__opt_start_execution` method to initiate a fresh execution.
+        Requests the service worker to restart the service (stop followed by start).
         """
-        self.__opt_stop_execution()  # Stop the current execution
-        self.__opt_start_execution()  # Start the execution again
+        self.service_worker.request('restart')
 
     @pyqtSlot()
     def __opt_toggle_checkbox_automatic_init(self):
@@ -640,6 +555,7 @@ class MainWindow(QMainWindow):
         Returns:
             None
         """
+        self.service_worker.shutdown()
         if self.tray_icon:
             self.tray_icon.hide()  # Hide the system tray icon
             QApplication.quit()  # Exit the application
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+import queue
+from PyQt5.QtCore import QThread, pyqtSignal
+from scripts.business_logic.service_control import ServiceBackend, ServiceController
+
+OPERATIONS = ('start', 'install_start', 'stop', 'restart', 'reinstall', 'uninstall')
+
+# Runs the service operations outside the UI thread, one at a time and in request order.
+class ServiceControlWorker(QThread):
+    progress = pyqtSignal(str)
+    state_changed = pyqtSignal(int)
+    operation_finished = pyqtSignal(str, bool)
+
+    def __init__(self, backend: ServiceBackend, service_name: str, max_retries=30, parent=None):
+        """
+        Initializes the worker that executes the service operations.
+
+        Args:
+            backend (ServiceBackend): Backend used to operate the service (Windows or fake).
+            service_name (str): The name of the service.
+            max_retries (int): Maximum number of attempts to start the service.
+            parent (QObject, optional): The parent object for this instance. Defaults to None.
+        """
+        super().__init__(parent)
+        self.operations = queue.Queue()
+        self.controller = ServiceController(
+            backend,
+            service_name,
+            max_retries=max_retries,
+            on_progress=self.progress.emit,
+            on_state=self.state_changed.emit
+        )
+
+    def request(self, operation: str):
+        """
+        Queues a service operation. Consecutive duplicates of a pending operation are ignored.
+
+        Args:
+            operation (str): One of `OPERATIONS`.
+        """
+        if operation not in OPERATIONS:
+            raise ValueError(f'Operacion desconocida: {operation}')
+        with self.operations.mutex:
+            if self.operations.queue and self.operations.queue[-1] == operation:
+                return
+        self.operations.put(operation)
+
+    def shutdown(self):
+        """
+        Cancels the operation in progress and stops the worker thread.
+        """
+        self.controller.cancel()
+        self.operations.put(None)
+        self.wait(2000)
+
+    def run(self):
+        """
+        Executes the queued operations until `shutdown` is called, emitting
+        `operation_finished(operation, success)` after each one.
+        """
+        while True:
+            operation = self.operations.get()
+            if operation is None:
+                return
+            success = False
+            try:
+                if operation == 'install_start':
+                    success = self.controller.start(install=True)
+                else:
+                    success = getattr(self.controller, operation)()
+            except Exception as e:
+                logging.error(f'Error al ejecutar la operacion {operation} del servicio: {e}')
+            self.operation_finished.emit(operation, success)
@@ -0,0 +1,102 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import importlib
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+PROFILE_FLAG = '--profile-startup'
+PROFILE_ENV = 'PYZK_PROFILE_STARTUP'
+
+class StartupProfiler:
+    """
+    Records the timing of each startup phase of the tray application.
+
+    The profiler is enabled with the `--profile-startup` argument or the
+    `PYZK_PROFILE_STARTUP=1` environment variable. When enabled, every mark and
+    every timed import is written to `logs/startup_profile.txt` once the report
+    is requested. For a per-module breakdown of the imports run the application
+    with `python -X importtime main.py`.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.enabled = PROFILE_FLAG in sys.argv or os.environ.get(PROFILE_ENV) == '1'
+        self.marks: list[tuple[str, float]] = []
+        self.imports: list[tuple[str, float]] = []
+        self.reported = False
+
+    def mark(self, name: str):
+        """
+        Records that the startup phase `name` finished at the current time.
+
+        Args:
+            name (str): Name of the startup phase.
+        """
+        elapsed = time.perf_counter() - self.start
+        self.marks.append((name, elapsed))
+        if self.enabled:
+            logging.debug(f'Inicio - {name}: {elapsed * 1000:.1f} ms')
+
+    def timed_import(self, module_name: str):
+        """
+        Imports a module and records how long the import took.
+
+        Args:
+            module_name (str): Dotted name of the module to import.
+
+        Returns:
+            module: The imported module.
+        """
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        self.imports.append((module_name, time.perf_counter() - start))
+        return module
+
+    def report(self, root_directory: str):
+        """
+        Writes the startup report to `logs/startup_profile.txt`.
+
+        Only the first call writes the report, and only if the profiler is enabled.
+
+        Args:
+            root_directory (str): Root directory of the application.
+        """
+        if not self.enabled or self.reported:
+            return
+        self.reported = True
+        try:
+            log_file_path = os.path.join(root_directory, 'logs', 'startup_profile.txt')
+            os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+            with open(log_file_path, 'a', encoding='utf-8') as report_file:
+                report_file.write(f'--- {datetime.now().isoformat(timespec="seconds")} ---\n')
+                previous = 0.0
+                for name, elapsed in self.marks:
+                    report_file.write(f'{name:<32} {elapsed * 1000:10.1f} ms  (+{(elapsed - previous) * 1000:.1f} ms)\n')
+                    previous = elapsed
+                for module_name, elapsed in self.imports:
+                    report_file.write(f'import {module_name:<25} {elapsed * 1000:10.1f} ms\n')
+        except Exception as e:
+            logging.error(f'Error al escribir el perfil de inicio: {e}')
+
+# Single profiler shared by main.py and the main window
+profiler = StartupProfiler()
@@ -0,0 +1,88 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import importlib.util
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+from scripts.business_logic.hub_monitor import HubBlockingDetector, offload
+
+requires_eventlet = pytest.mark.skipif(importlib.util.find_spec('eventlet') is None, reason='eventlet no instalado')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a separate interpreter, so eventlet's monkey patching does not leak into the
+# rest of the test session. Prints the stalls seen by the detector, one per line.
+SCENARIO = textwrap.dedent('''
+    import eventlet
+    eventlet.monkey_patch()
+    import sys
+    import time
+    from eventlet import patcher
+    from scripts.business_logic.hub_monitor import HubBlockingDetector
+
+    def block_hub():
+        patcher.original('time').sleep(0.5)  # Never yields: every green thread stops
+
+    def yield_to_hub():
+        time.sleep(0.5)  # Monkey patched: the other green threads keep running
+
+    detector = HubBlockingDetector(threshold=0.1)
+    assert detector.start()
+    eventlet.sleep(0.2)
+    {'blocking': block_hub, 'cooperative': yield_to_hub}[sys.argv[1]]()
+    eventlet.sleep(0.3)  # Lets the watchdog see the hub recover
+    detector.stop()
+    for duration, stack in detector.stalls:
+        print(f'{duration:.3f}', 'block_hub' in stack)
+''')
+
+def run_scenario(name: str) -> list[tuple[float, bool]]:
+    completed = subprocess.run([sys.executable, '-c', SCENARIO, name], cwd=ROOT, capture_output=True,
+                               text=True, timeout=60)
+    assert completed.returncode == 0, completed.stderr
+    stalls = []
+    for line in completed.stdout.splitlines():
+        duration, in_stack = line.split()
+        stalls.append((float(duration), in_stack == 'True'))
+    return stalls
+
+@requires_eventlet
+def test_blocking_call_is_reported_with_its_stack():
+    stalls = run_scenario('blocking')
+    assert len(stalls) == 1
+    duration, in_stack = stalls[0]
+    assert 0.3 <= duration < 1.0
+    assert in_stack
+
+@requires_eventlet
+def test_cooperative_call_is_not_reported():
+    assert run_scenario('cooperative') == []
+
+def test_start_requires_monkey_patching():
+    detector = HubBlockingDetector(threshold=0.1)
+    assert not detector.start()
+    assert not detector.running
+
+def test_offload_runs_directly_without_monkey_patching():
+    assert offload(sum, [1, 2, 3]) == 6
@@ -0,0 +1,119 @@
+"""
+    PyZKTecoClocks: GUI for managing ZKTeco clocks, enabling clock
+    time synchronization and attendance data retrieval.
+    Copyright (C) 2024  Paulo Sebastian Spaciuk (Darukio)
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import threading
+import time
+
+from scripts.business_logic.service_control import (
+    SERVICE_NOT_INSTALLED, SERVICE_RUNNING, SERVICE_STOPPED, FakeServiceBackend, ServiceController
+)
+
+SERVICE_NAME = 'GESTOR_RELOJ_ASISTENCIA'
+
+def controller(backend: FakeServiceBackend, **kwargs) -> tuple[ServiceController, list[int]]:
+    states = []
+    return ServiceController(backend, SERVICE_NAME, on_state=states.append, **kwargs), states
+
+def test_start_waits_for_running():
+    backend = FakeServiceBackend(start_delay=0.05)
+    service, states = controller(backend)
+    assert service.start()
+    assert backend.calls == ['start']
+    assert states == [SERVICE_STOPPED, SERVICE_RUNNING]
+
+def test_start_of_running_service_does_nothing():
+    backend = FakeServiceBackend(state=SERVICE_RUNNING)
+    service, _ = controller(backend)
+    assert service.start()
+    assert backend.calls == []
+
+def test_start_retries_ignored_requests():
+    backend = FakeServiceBackend(start_delay=0.01, fail_starts=2)
+    service, _ = controller(backend, retry_timeout=0.05)
+    assert service.start()
+    assert backend.calls == ['start'] * 3
+
+def test_start_gives_up_after_max_retries():
+    backend = FakeServiceBackend(fail_starts=100)
+    service, states = controller(backend, max_retries=3, retry_timeout=0.05)
+    begin = time.monotonic()
+    assert not service.start()
+    assert time.monotonic() - begin < 1
+    assert backend.calls == ['start'] * 3
+    assert states == [SERVICE_STOPPED]
+
+def test_start_of_missing_service():
+    backend = FakeServiceBackend(installed=False)
+    service, _ = controller(backend)
+    assert not service.start()
+    assert backend.calls == ['start']
+
+    backend = FakeServiceBackend(installed=False, start_delay=0.01)
+    service, _ = controller(backend)
+    assert service.start(install=True)
+    assert backend.calls == ['install', 'start']
+
+def test_stop_waits_for_stopped():
+    backend = FakeServiceBackend(state=SERVICE_RUNNING, stop_delay=0.05)
+    service, states = controller(backend)
+    assert service.stop()
+    assert backend.calls == ['stop']
+    assert states == [SERVICE_RUNNING, SERVICE_STOPPED]
+
+def test_stop_of_stopped_service_does_nothing():
+    backend = FakeServiceBackend()
+    service, _ = controller(backend)
+    assert service.stop()
+    assert backend.calls == []
+
+def test_stop_timeout():
+    backend = FakeServiceBackend(state=SERVICE_RUNNING, stop_delay=5)
+    service, _ = controller(backend, stop_timeout=0.1)
+    begin = time.monotonic()
+    assert not service.stop()
+    assert time.monotonic() - begin < 1
+
+def test_cancel_interrupts_the_wait():
+    backend = FakeServiceBackend(start_delay=10)
+    service, _ = controller(backend, retry_timeout=10)
+    threading.Timer(0.1, service.cancel).start()
+    begin = time.monotonic()
+    assert not service.start()
+    assert time.monotonic() - begin < 1
+    assert backend.calls == ['start']
+
+def test_restart():
+    backend = FakeServiceBackend(state=SERVICE_RUNNING, start_delay=0.01, stop_delay=0.01)
+    service, states = controller(backend)
+    assert service.restart()
+    assert backend.calls == ['stop', 'start']
+    assert states == [SERVICE_RUNNING, SERVICE_STOPPED, SERVICE_RUNNING]
+
+def test_reinstall():
+    backend = FakeServiceBackend(state=SERVICE_RUNNING, start_delay=0.01, stop_delay=0.01)
+    service, _ = controller(backend)
+    assert service.reinstall()
+    assert backend.calls == ['stop', 'remove', 'install', 'start']
+    assert backend.query_state(SERVICE_NAME) == SERVICE_RUNNING
+
+def test_uninstall():
+    backend = FakeServiceBackend(state=SERVICE_RUNNING, stop_delay=0.01)
+    service, states = controller(backend)
+    assert service.uninstall()
+    assert states[-1] == SERVICE_NOT_INSTALLED